@@ -1,14 +1,17 @@
 # --- agent.py ---
-import os
+import time
 import logging
 from datetime import datetime
 import dateparser
 
 from langchain.schema import SystemMessage, HumanMessage
 from langchain.tools import tool
-from langchain_openai import ChatOpenAI
 
-from conditional_agent import handle_condition, fetch_headlines, fetch_weather, build_vector_store, get_similar
+from conditional_agent import handle_conditions, condition_key, get_similar, NO_WEATHER_DATA
+from context_cache import context_cache
+from intent_cache import intent_cache
+from fast_path import fast_path
+from llm_gateway import llm_gateway
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -24,9 +27,6 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-_cached_headlines = []
-_cached_weather_report = ""
-
 # === Tool Definitions ===
 
 @tool
@@ -50,12 +50,11 @@ def control_lamp(room: str, action: str, time_description: str = ""):
     logger.info(f"✅ Lamp in {room} will be turned {action}. Time: {time_description}")
 
 @tool
-def get_news(filter: str = "") -> list[str]:
+async def get_news(filter: str = "") -> list[str]:
     """Return news headlines filtered by the given topic. Empty filter returns all."""
-    headlines = _cached_headlines
+    headlines = await context_cache.get_headlines()
     if filter:
-        vector_store = build_vector_store(headlines)
-        relevant_news = get_similar(filter, vector_store)
+        relevant_news = await get_similar(filter, headlines)
         logger.info(f"Filtered news by '{filter}': {relevant_news}")
         return relevant_news
     else:
@@ -63,9 +62,9 @@ def get_news(filter: str = "") -> list[str]:
         return headlines
 
 @tool
-def get_weather(description: str = "") -> str:
+async def get_weather(description: str = "") -> str:
     """Return weather info matching the description query."""
-    weather_report = _cached_weather_report
+    weather_report = await context_cache.get_weather()
     logger.info(f"Fetching weather info for description: '{description}'")
     return weather_report 
 
@@ -107,30 +106,12 @@ def parse_time_description(text: str, base: datetime = None) -> datetime | None:
 
 # === LLM Setup ===
 
-tg_llm  = ChatOpenAI(
-    model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-    base_url="https://api.together.xyz/v1",
-    api_key=os.getenv("TOGETHER_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
-
-groq_llm = ChatOpenAI(
-    model="llama3-70b-8192",
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.getenv("GROQ_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
-
 tools = list(TOOL_MAP.values())
-chat_with_tools = (groq_llm if os.getenv('API_AGENT') == 'GROQ' else tg_llm).bind_tools(tools)
+chat_with_tools = llm_gateway.chat("agent").bind_tools(tools)
 
 # === Main User Request Handler ===
 
-def handle_user_request(prompt: str):
-    global _cached_headlines, _cached_weather_report
-
-    messages = [
-SystemMessage(content="""
+SYSTEM_PROMPT = """
 You are a smart home assistant. Your job is to turn user commands into tool calls for smart devices or info retrieval.
 
 Available tools and valid arguments:
@@ -218,27 +199,37 @@ Examples:
 → control_ac(room='kitchen', action='off', time_description='now')
 → control_cooler(action='off', weather_description='', news_description='', time_description='now')
 → control_tv(action='off', weather_description='', news_description='', time_description='now')
-"""),
+"""
+
+async def handle_user_request(prompt: str):
+    fast_calls = fast_path.match(prompt)
+    if fast_calls is not None:
+        return await run_tool_calls(validate_tool_calls(fast_calls))
+
+    cached_calls = await intent_cache.lookup(prompt)
+    if cached_calls is not None:
+        return await run_tool_calls(cached_calls)
+
+    messages = [
+        SystemMessage(content=SYSTEM_PROMPT),
         HumanMessage(content=prompt)
     ]
 
     logger.info(f"Processing user prompt: {prompt}")
 
-    response = chat_with_tools.invoke(messages)
-    actions = []
-
-    news_api_key = os.getenv("NEWS_API_KEY")
-    weather_api_key = os.getenv("OPENWEATHER_API_KEY")
+    start = time.perf_counter()
+    response = await chat_with_tools.ainvoke(messages)
+    llm_ms = (time.perf_counter() - start) * 1000
 
-    _cached_headlines = fetch_headlines(news_api_key)
-    if not _cached_headlines:
-        logger.warning("No headlines fetched, condition may be inaccurate")
+    calls = validate_tool_calls(response.tool_calls)
+    await intent_cache.store(prompt, calls, llm_ms)
+    return await run_tool_calls(calls)
 
-    _cached_weather_report = fetch_weather(weather_api_key)
-    if _cached_weather_report == "No weather data available.":
-        logger.warning("Weather data unavailable, condition may be inaccurate")
+CONDITIONAL_TOOLS = {"control_tv", "control_cooler"}
 
-    for call in response.tool_calls:
+def validate_tool_calls(tool_calls: list[dict]) -> list[tuple[str, dict]]:
+    calls = []
+    for call in tool_calls:
         fn_name = call.get("name")
         args = call.get("args", {})
 
@@ -251,6 +242,35 @@ Examples:
             logger.warning(f"Missing required args for {fn_name}: {missing_args}. Skipping this call.")
             continue
 
+        calls.append((fn_name, args))
+    return calls
+
+async def resolve_conditions(calls: list[tuple[str, dict]]) -> dict[tuple[str, str], tuple[bool, bool]]:
+    conditions = [
+        (args.get("weather_description", ""), args.get("news_description", ""))
+        for fn_name, args in calls if fn_name in CONDITIONAL_TOOLS
+    ]
+    conditions = [(w, n) for w, n in conditions if w.strip() or n.strip()]
+    if not conditions:
+        return {}
+
+    # Only read the context the conditions actually need
+    needs_news = any(n.strip() for _, n in conditions)
+    needs_weather = any(w.strip() for w, _ in conditions)
+    headlines = await context_cache.get_headlines() if needs_news else []
+    weather_report = await context_cache.get_weather() if needs_weather else ""
+    if needs_news and not headlines:
+        logger.warning("No headlines available, condition may be inaccurate")
+    if needs_weather and weather_report == NO_WEATHER_DATA:
+        logger.warning("Weather data unavailable, condition may be inaccurate")
+
+    return await handle_conditions(conditions, headlines, weather_report)
+
+async def run_tool_calls(calls: list[tuple[str, dict]]) -> list[dict]:
+    actions = []
+    condition_results = await resolve_conditions(calls)
+
+    for fn_name, args in calls:
         if fn_name in ['get_news', 'get_weather']:
             logger.info(f"Running {fn_name} immediately with args: {args}")
             input_str = ""
@@ -259,7 +279,7 @@ Examples:
             elif fn_name == "get_weather":
                 input_str = args.get("description", "")
 
-            result = TOOL_MAP[fn_name].invoke(input_str)
+            result = await TOOL_MAP[fn_name].ainvoke(input_str)
             logger.info(f"result {fn_name} immediately with args: {args} = {result}")
             actions.append({
                 "function": fn_name,
@@ -279,18 +299,15 @@ Examples:
         weather_desc = args.get("weather_description", "")
         news_desc = args.get("news_description", "")
 
-        condition_met = [True, True]
-        if fn_name in {"control_tv", "control_cooler"}:
-            condition_met = handle_condition(weather_desc, news_desc, _cached_headlines, _cached_weather_report)
-            logger.info(f"Weather condition '{weather_desc}' evaluated to {condition_met[0]}")
-            logger.info(f"News condition '{news_desc}' evaluated to {condition_met[1]}")
-
-        if fn_name in {"control_tv", "control_cooler"}:
+        if fn_name in CONDITIONAL_TOOLS:
             weather_required = bool(weather_desc.strip())
             news_required = bool(news_desc.strip())
 
             # Only check conditions if a condition string is provided
+            condition_met = condition_results.get(condition_key(weather_desc, news_desc), (True, True))
             weather_ok, news_ok = condition_met
+            logger.info(f"Weather condition '{weather_desc}' evaluated to {weather_ok}")
+            logger.info(f"News condition '{news_desc}' evaluated to {news_ok}")
 
             if (weather_required and not weather_ok) or (news_required and not news_ok):
                 desc = " or ".join(
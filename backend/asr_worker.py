@@ -0,0 +1,166 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/asr_worker.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+ASR_MAX_BATCH = int(os.getenv("ASR_MAX_BATCH", "8"))
+# How long the first request of a batch waits for others to join it
+ASR_MAX_WAIT_MS = float(os.getenv("ASR_MAX_WAIT_MS", "50"))
+# Requests beyond this many waiting are rejected instead of queued
+ASR_QUEUE_SIZE = int(os.getenv("ASR_QUEUE_SIZE", "32"))
+# Intra-op threads for the single decoding thread; 0 keeps torch's default
+ASR_TORCH_THREADS = int(os.getenv("ASR_TORCH_THREADS", "0"))
+
+
+class ASRQueueFull(Exception):
+    """Raised when the transcription queue is full; callers should retry later."""
+
+
+class ASRWorkerStopped(RuntimeError):
+    """Raised for requests queued or made after the worker was stopped."""
+
+
+class TranscriptionWorker:
+    """Single consumer that batches concurrent transcription requests.
+
+    Requests are queued; the worker takes the first one, waits up to
+    max_wait_ms for up to max_batch - 1 more, and decodes them in one call
+    on its own thread. Only that thread ever touches the model, so
+    concurrent uploads no longer oversubscribe the CPU with competing
+    torch thread pools. A full queue rejects new requests with ASRQueueFull.
+    Once stopped, the worker fails whatever was still waiting and refuses
+    new requests with ASRWorkerStopped.
+    """
+
+    def __init__(self, transcribe_batch, max_batch: int = ASR_MAX_BATCH, max_wait_ms: float = ASR_MAX_WAIT_MS, queue_size: int = ASR_QUEUE_SIZE):
+        self._transcribe_batch = transcribe_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self._queue: asyncio.Queue[tuple[np.ndarray, asyncio.Future]] = asyncio.Queue(maxsize=queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr", initializer=self._init_thread)
+        self._task: asyncio.Task | None = None
+        self._in_flight: list[asyncio.Future] = []
+        self._stopped = False
+
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.transcribed = 0
+        self.largest_batch = 0
+        self._batch_ms: deque[float] = deque(maxlen=1000)
+
+    @staticmethod
+    def _init_thread():
+        if ASR_TORCH_THREADS > 0:
+            torch.set_num_threads(ASR_TORCH_THREADS)
+
+    def start(self):
+        if self._stopped:
+            raise ASRWorkerStopped("The ASR worker has been stopped")
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"🎧 ASR worker started (batch ≤ {self.max_batch}, wait ≤ {self.max_wait * 1000:.0f} ms).")
+
+    async def stop(self):
+        self._stopped = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+        # Nobody will decode these any more; don't leave their callers waiting
+        waiting = self._in_flight
+        while not self._queue.empty():
+            waiting.append(self._queue.get_nowait()[1])
+        for future in waiting:
+            if not future.done():
+                future.set_exception(ASRWorkerStopped("The ASR worker was stopped before this transcription ran"))
+        self._in_flight = []
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        """Queue a 16 kHz float32 waveform and wait for its transcription."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((audio, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ASRQueueFull(f"{self._queue.qsize()} transcriptions already queued")
+        self.requests += 1
+        return await future
+
+    async def _collect(self) -> list[tuple[np.ndarray, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        # Tracked from the moment they leave the queue, so stop() can fail them
+        self._in_flight = [batch[0][1]]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+            self._in_flight.append(batch[-1][1])
+        # Requests whose caller went away don't need decoding
+        return [(audio, future) for audio, future in batch if not future.cancelled()]
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            start = time.perf_counter()
+            try:
+                texts = await loop.run_in_executor(self._executor, self._transcribe_batch, [audio for audio, _ in batch])
+                if len(texts) != len(batch):
+                    raise RuntimeError(f"ASR backend returned {len(texts)} transcription(s) for {len(batch)} clip(s)")
+            except Exception as e:
+                logger.exception(f"❌ Batch of {len(batch)} transcription(s) failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+
+            self.batches += 1
+            self.transcribed += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self._batch_ms.append(elapsed_ms)
+            logger.info(f"🔤 Transcribed a batch of {len(batch)} in {elapsed_ms:.0f} ms.")
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "batches": self.batches,
+            "avg_batch_size": round(self.transcribed / self.batches, 2) if self.batches else None,
+            "largest_batch": self.largest_batch,
+            "avg_batch_ms": round(sum(self._batch_ms) / len(self._batch_ms), 1) if self._batch_ms else None,
+        }
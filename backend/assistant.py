@@ -1,96 +1,430 @@
-import torch
-import torchaudio
-import whisper
-import torch
-import logging
-import asyncio
-from gtts import gTTS
-import io
-import requests
-from unittest import mock
-
-from dotenv import load_dotenv
-load_dotenv()
-
-# --- Logging setup ---
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[
-        logging.FileHandler("log/voice_assistant.log"),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
-
-class VoiceAssistant:
-    def __init__(self, whisper_model_name="base"):
-        logger.info("🔧 Initializing VoiceAssistant...")
-
-        try:
-            self.vad_model, utils = torch.hub.load('snakers4/silero-vad', 'silero_vad', trust_repo=True)
-            (self.get_speech_timestamps, _, _, _, _) = utils
-            logger.info("✅ VAD model loaded.")
-        except Exception as e:
-            logger.exception(f"❌ Error during VAD initialization: {e}")
-
-        try:
-            self.whisper_model = whisper.load_model(whisper_model_name)
-            logger.info("✅ Whisper model loaded.")
-        except Exception as e:
-            logger.exception(f"❌ Error during Whisper initialization: {e}")
-
-    def transcribe_command(self, audio):
-        logger.info("🔤 Transcribing audio to text...")
-        try:
-            result = self.whisper_model.transcribe(audio, fp16=False, language="en")
-            text = result.get("text", "").strip()
-            logger.info(f"📄 Transcription result: {text}")
-            return text
-        except Exception as e:
-            logger.exception(f"❌ Error during transcription: {e}")
-            return ""
-
-    def vad_detect(self, audio_file):
-        logger.info("🧠 Running VAD detection...")
-        try:
-            wav, sr = torchaudio.load(audio_file)
-            print(sr)
-            assert sr == 16000, "Sample rate must be 16kHz for Silero VAD"
-
-            # Convert to mono if stereo
-            if wav.shape[0] > 1:
-                wav = wav.mean(dim=0, keepdim=True)
-                logger.info("🔉 Converted stereo to mono for VAD")
-
-            speech_timestamps = self.get_speech_timestamps(wav, self.vad_model, sampling_rate=sr)
-            logger.info(f"🔍 Detected {len(speech_timestamps)} speech segments")
-            return speech_timestamps
-        except Exception as e:
-            logger.exception(f"❌ Error during VAD detection: {e}")
-            return []
-            
-    async def async_vad_detect(self, audio_file):
-        return await asyncio.to_thread(self.vad_detect, audio_file)
-
-    def text_to_speech(self, text, lang='en'):
-        # Create a session with proxy
-        session = requests.Session()
-        session.proxies = {
-            'http': 'socks5h://127.0.0.1:2080',
-            'https': 'socks5h://127.0.0.1:2080'
-        }
-
-        # Patch `requests.get` inside gTTS to use this session
-        with mock.patch('requests.get', session.get):
-            tts = gTTS(text=text, lang=lang)
-            audio_bytes = io.BytesIO()
-            tts.write_to_fp(audio_bytes)
-            audio_bytes.seek(0)
-            return audio_bytes
-
-    async def async_transcribe_command(self, audio):
-        return await asyncio.to_thread(self.transcribe_command, audio)
-    
-    async def async_text_to_speech(self, text):
-        return await asyncio.to_thread(self.text_to_speech, text)
+import os
+import time
+import threading
+
+# Before torch/whisper, so MODELS_OFFLINE takes effect
+from model_registry import models, cache_path, MODELS_OFFLINE
+
+import torch
+import torchaudio
+import whisper
+import logging
+import asyncio
+import numpy as np
+import torch.nn.functional as F
+import io
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from asr_worker import TranscriptionWorker
+from tts import synthesize
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# --- Logging setup ---
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/voice_assistant.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Silero VAD and Whisper both expect 16 kHz mono
+SAMPLE_RATE = 16000
+# Concurrent /ws/voice streams; each needs its own Silero copy, all loaded at startup
+STREAM_VAD_POOL = int(os.getenv("STREAM_VAD_POOL", "4"))
+AUDIO_STAGES = ("decode", "resample", "vad", "concat", "transcribe")
+# Source rates whose resamplers are built at import: common device rates and the frontend recorder's 41 kHz
+RESAMPLE_PREWARM_RATES = [int(sr) for sr in os.getenv("RESAMPLE_PREWARM_RATES", "44100,48000,41000").split(",") if sr.strip()]
+
+# Speech recognition backend: whisper, whisper-int8 or faster-whisper (see ASR_BACKENDS)
+ASR_BACKEND = os.getenv("ASR_BACKEND", "whisper")
+ASR_MODEL = os.getenv("ASR_MODEL", "base")
+# CTranslate2 compute type for faster-whisper: int8, int8_float32, float32, ...
+ASR_COMPUTE_TYPE = os.getenv("ASR_COMPUTE_TYPE", "int8")
+
+# Command mode: vocabulary-primed greedy decoding with a token cap, for short device commands
+ASR_COMMAND_MODE = os.getenv("ASR_COMMAND_MODE", "false").lower() == "true"
+ASR_COMMAND_MAX_TOKENS = int(os.getenv("ASR_COMMAND_MAX_TOKENS", "48"))
+# Whisper only: encode just the speech plus this much silence instead of a padded 30 s window
+ASR_COMMAND_TRIM = os.getenv("ASR_COMMAND_TRIM", "true").lower() == "true"
+ASR_COMMAND_PADDING_MS = float(os.getenv("ASR_COMMAND_PADDING_MS", "300"))
+# Same devices and rooms as the agent system prompt and fast_path
+COMMAND_PROMPT = (
+    "Smart home commands: turn on, turn off, lamp, light, AC, air conditioner, cooler, TV, "
+    "kitchen, bathroom, living room, room 1, room 2, now, in 30 minutes, in 2 hours, at 7 pm, tomorrow, "
+    "if it's hot, if it rains, news, weather."
+)
+
+
+class AudioDecodeError(ValueError):
+    """The uploaded bytes aren't audio torchaudio can read."""
+
+
+def decode_audio(data: bytes, filename: str = "") -> tuple[torch.Tensor, int]:
+    """Decode an uploaded file from memory; the extension is only a format hint."""
+    fmt = os.path.splitext(filename)[1].lstrip(".").lower() or None
+    try:
+        return torchaudio.load(io.BytesIO(data), format=fmt)
+    except Exception as e:
+        raise AudioDecodeError(f"Could not decode {filename or 'audio'}: {e}") from e
+
+
+class AudioNormalizer:
+    """Downmix + resample to 16 kHz mono, with one cached Resample per source rate.
+
+    Building a Resample computes its windowed-sinc kernel, so instances are
+    kept and reused; the common rates are built up front. Channels are
+    averaged before resampling so the kernel runs over a single channel.
+    The output is a 1-D float32 tensor that VAD and Whisper both consume.
+    """
+
+    def __init__(self, prewarm_rates=RESAMPLE_PREWARM_RATES):
+        self._resamplers: dict[int, torchaudio.transforms.Resample] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        for sr in prewarm_rates:
+            if sr != SAMPLE_RATE:
+                self.resampler(sr)
+        self.misses = 0
+
+    def resampler(self, sr: int) -> torchaudio.transforms.Resample:
+        resampler = self._resamplers.get(sr)
+        if resampler is not None:
+            self.hits += 1
+            return resampler
+        with self._lock:
+            if sr not in self._resamplers:
+                logger.info(f"🧮 Building resampler {sr}Hz → {SAMPLE_RATE}Hz")
+                self._resamplers[sr] = torchaudio.transforms.Resample(orig_freq=sr, new_freq=SAMPLE_RATE)
+                self.misses += 1
+            return self._resamplers[sr]
+
+    def __call__(self, wav: torch.Tensor, sr: int) -> torch.Tensor:
+        wav = wav.to(torch.float32)
+        if wav.shape[0] > 1:
+            wav = wav.mean(dim=0, keepdim=True)
+        if sr != SAMPLE_RATE:
+            with torch.inference_mode():
+                wav = self.resampler(sr)(wav)
+        return wav.squeeze(0)
+
+    def stats(self) -> dict:
+        return {"rates": sorted(self._resamplers), "hits": self.hits, "misses": self.misses}
+
+
+audio_normalizer = AudioNormalizer()
+
+
+def whisper_checkpoint(model_name: str) -> str:
+    """Where whisper.load_model looks for a named model under MODEL_CACHE_DIR (or the path it was given)."""
+    if model_name in whisper._MODELS:
+        return os.path.join(cache_path("whisper"), os.path.basename(whisper._MODELS[model_name]))
+    return model_name
+
+
+class ASRBackend(ABC):
+    """Speech-to-text over 16 kHz mono float32 arrays."""
+
+    name = ""
+
+    @abstractmethod
+    def transcribe(self, audio: np.ndarray) -> str:
+        ...
+
+    def transcribe_batch(self, audios: list[np.ndarray]) -> list[str]:
+        return [self.transcribe(audio) for audio in audios]
+
+
+class _TrimmedDecodingTask(whisper.decoding.DecodingTask):
+    """DecodingTask that encodes mel shorter than Whisper's 30 s window.
+
+    The encoder's positional embedding is sliced to the input length instead
+    of padding the input to 1500 positions; the decoder cross-attends to
+    however many audio positions it is given.
+    """
+
+    def _get_audio_features(self, mel: torch.Tensor) -> torch.Tensor:
+        encoder = self.model.encoder
+        x = F.gelu(encoder.conv1(mel))
+        x = F.gelu(encoder.conv2(x)).permute(0, 2, 1)
+        x = x + encoder.positional_embedding[:x.shape[1]]
+        for block in encoder.blocks:
+            x = block(x)
+        return encoder.ln_post(x)
+
+
+class WhisperBackend(ASRBackend):
+    """openai-whisper in fp32, optionally with int8 dynamic quantization of its Linear layers.
+
+    In command mode, clips that fit the 30 s window are decoded greedily,
+    primed with COMMAND_PROMPT, capped at ASR_COMMAND_MAX_TOKENS, and (with
+    ASR_COMMAND_TRIM) encoded at their own length rather than padded to 30 s.
+    """
+
+    def __init__(self, model_name: str = ASR_MODEL, quantize: bool = False, command_mode: bool = ASR_COMMAND_MODE):
+        self.name = "whisper-int8" if quantize else "whisper"
+        self.command_mode = command_mode
+        checkpoint = whisper_checkpoint(model_name)
+        if MODELS_OFFLINE and not os.path.isfile(checkpoint):
+            # load_model would otherwise try to download it
+            raise FileNotFoundError(f"Whisper '{model_name}' is not cached at {checkpoint}; run `python -m model_registry` online first")
+        self.model = whisper.load_model(model_name, device="cpu", download_root=cache_path("whisper"))
+        if quantize:
+            # whisper's Linear subclass only adds a dtype cast, which fp32 doesn't need,
+            # and quantize_dynamic matches module types exactly
+            for module in self.model.modules():
+                if isinstance(module, whisper.model.Linear):
+                    module.__class__ = torch.nn.Linear
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        if self.command_mode and len(audio) <= whisper.audio.N_SAMPLES:
+            return self._decode([audio])[0]
+        return self.model.transcribe(audio, fp16=False, language="en").get("text", "").strip()
+
+    def transcribe_batch(self, audios: list[np.ndarray]) -> list[str]:
+        """Decode the clips that fit Whisper's 30 s window as one padded mel batch.
+
+        Longer clips go through transcribe() for its sliding-window decoding.
+        """
+        texts: list[str | None] = [None] * len(audios)
+        short = [i for i, audio in enumerate(audios) if len(audio) <= whisper.audio.N_SAMPLES]
+        if short:
+            for i, text in zip(short, self._decode([audios[i] for i in short])):
+                texts[i] = text
+        return [text if text is not None else self.model.transcribe(audio, fp16=False, language="en").get("text", "").strip()
+                for text, audio in zip(texts, audios)]
+
+    def _decode(self, audios: list[np.ndarray]) -> list[str]:
+        n_samples = whisper.audio.N_SAMPLES
+        trim = self.command_mode and ASR_COMMAND_TRIM
+        if trim:
+            # Longest clip plus a little silence, in whole encoder positions (2 mel frames each)
+            padding = int(ASR_COMMAND_PADDING_MS / 1000 * SAMPLE_RATE)
+            step = 2 * whisper.audio.HOP_LENGTH
+            n_samples = min(n_samples, -(-(max(len(audio) for audio in audios) + padding) // step) * step)
+        mels = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio), n_samples), self.model.dims.n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+
+        if not self.command_mode:
+            options = whisper.DecodingOptions(language="en", fp16=False, without_timestamps=True)
+            return [result.text.strip() for result in whisper.decode(self.model, mels, options)]
+
+        options = whisper.DecodingOptions(
+            language="en", fp16=False, without_timestamps=True, temperature=0.0,
+            prompt=COMMAND_PROMPT, sample_len=ASR_COMMAND_MAX_TOKENS
+        )
+        task = (_TrimmedDecodingTask if trim else whisper.decoding.DecodingTask)(self.model, options)
+        with torch.no_grad():
+            return [result.text.strip() for result in task.run(mels)]
+
+
+class FasterWhisperBackend(ASRBackend):
+    """CTranslate2 Whisper (faster-whisper), int8 on CPU by default. Optional dependency.
+
+    Command mode primes it with COMMAND_PROMPT, disables temperature fallback
+    and caps new tokens; it still pads each clip to 30 s internally.
+    """
+
+    name = "faster-whisper"
+
+    def __init__(self, model_name: str = ASR_MODEL, compute_type: str = ASR_COMPUTE_TYPE, command_mode: bool = ASR_COMMAND_MODE):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            model_name, device="cpu", compute_type=compute_type,
+            download_root=cache_path("faster-whisper"), local_files_only=MODELS_OFFLINE
+        )
+        self.command_mode = command_mode
+
+    def transcribe(self, audio: np.ndarray) -> str:
+        options = dict(
+            initial_prompt=COMMAND_PROMPT, temperature=0.0, max_new_tokens=ASR_COMMAND_MAX_TOKENS,
+            without_timestamps=True, condition_on_previous_text=False
+        ) if self.command_mode else {}
+        segments, _ = self.model.transcribe(audio, language="en", beam_size=1, **options)
+        return "".join(segment.text for segment in segments).strip()
+
+
+ASR_BACKENDS = {
+    "whisper": lambda model_name, command_mode: WhisperBackend(model_name, command_mode=command_mode),
+    "whisper-int8": lambda model_name, command_mode: WhisperBackend(model_name, quantize=True, command_mode=command_mode),
+    "faster-whisper": lambda model_name, command_mode: FasterWhisperBackend(model_name, command_mode=command_mode),
+}
+
+
+def load_asr_backend(name: str = ASR_BACKEND, model_name: str = ASR_MODEL, command_mode: bool = ASR_COMMAND_MODE) -> ASRBackend:
+    if name not in ASR_BACKENDS:
+        raise ValueError(f"Unknown ASR backend '{name}', expected one of {list(ASR_BACKENDS)}")
+    return ASR_BACKENDS[name](model_name, command_mode)
+
+
+def load_vad():
+    """Silero VAD from torch.hub, kept under MODEL_CACHE_DIR; returns (model, utils)."""
+    torch.hub.set_dir(cache_path("torch_hub"))
+    repo_dir = os.path.join(torch.hub.get_dir(), "snakers4_silero-vad_master")
+    if os.path.isdir(repo_dir):
+        return torch.hub.load(repo_dir, 'silero_vad', source='local', trust_repo=True)
+    if MODELS_OFFLINE:
+        raise FileNotFoundError(f"Silero VAD is not cached in {repo_dir}; run `python -m model_registry` online first")
+    return torch.hub.load('snakers4/silero-vad', 'silero_vad', trust_repo=True)
+
+
+class VADPoolExhausted(Exception):
+    """Raised when every streaming VAD copy is in use; callers should retry later."""
+
+
+models.register("vad", load_vad)
+models.register("stream_vad", lambda: [load_vad()[0] for _ in range(STREAM_VAD_POOL)])
+models.register("asr", lambda: load_asr_backend(ASR_BACKEND, ASR_MODEL))
+
+
+class VoiceAssistant:
+    def __init__(self, vad=None, asr_backend: ASRBackend | None = None, stream_vads: list | None = None):
+        """Built from already-loaded models; missing ones are taken from the registry, waiting if needed."""
+        logger.info("🔧 Initializing VoiceAssistant...")
+        self.vad_model, utils = vad or models.get("vad")
+        (self.get_speech_timestamps, _, _, self.VADIterator, _) = utils
+        self.asr_backend: ASRBackend = asr_backend or models.get("asr")
+        logger.info(f"✅ VAD and ASR backend '{self.asr_backend.name}' ready.")
+
+        self.asr = TranscriptionWorker(self.transcribe_batch)
+        # Silero keeps recurrent state inside the model, so each audio stream needs its own copy
+        self._stream_vad_models: list = list(stream_vads if stream_vads is not None else models.get("stream_vad"))
+        self.pipeline_runs = 0
+        self.last_timings: dict[str, float] = {}
+        self._stage_totals_ms = dict.fromkeys(AUDIO_STAGES, 0.0)
+
+    @contextmanager
+    def streaming_vad(self, min_silence_duration_ms: int):
+        """A Silero VADIterator on a pooled model copy, for one audio stream at a time.
+
+        Raises VADPoolExhausted rather than loading another copy on the caller's thread.
+        """
+        if not self._stream_vad_models:
+            raise VADPoolExhausted(f"All {STREAM_VAD_POOL} voice streams are in use")
+        model = self._stream_vad_models.pop()
+        iterator = self.VADIterator(model, sampling_rate=SAMPLE_RATE, min_silence_duration_ms=min_silence_duration_ms)
+        try:
+            yield iterator
+        finally:
+            iterator.reset_states()
+            self._stream_vad_models.append(model)
+
+    def transcribe_command(self, audio):
+        logger.info("🔤 Transcribing audio to text...")
+        try:
+            text = self.asr_backend.transcribe(audio)
+            logger.info(f"📄 Transcription result: {text}")
+            return text
+        except Exception as e:
+            logger.exception(f"❌ Error during transcription: {e}")
+            return ""
+
+    def transcribe_batch(self, audios: list[np.ndarray]) -> list[str]:
+        """Transcribe several 16 kHz waveforms in one backend call.
+
+        A lone request goes through transcribe_command so it keeps the
+        backend's full decoding (e.g. Whisper's temperature fallback).
+        """
+        if len(audios) > 1:
+            try:
+                texts = self.asr_backend.transcribe_batch(audios)
+                logger.info(f"📄 Batched transcription results: {texts}")
+                return texts
+            except Exception as e:
+                logger.exception(f"❌ Batched decoding failed, transcribing one by one: {e}")
+        return [self.transcribe_command(audio) for audio in audios]
+
+    def vad_detect(self, audio):
+        """Speech timestamps for a 16 kHz waveform (tensor) or audio file path."""
+        logger.info("🧠 Running VAD detection...")
+        try:
+            if isinstance(audio, str):
+                wav, sr = torchaudio.load(audio)
+                audio = audio_normalizer(wav, sr)
+
+            speech_timestamps = self.get_speech_timestamps(audio, self.vad_model, sampling_rate=SAMPLE_RATE)
+            logger.info(f"🔍 Detected {len(speech_timestamps)} speech segments")
+            return speech_timestamps
+        except Exception as e:
+            logger.exception(f"❌ Error during VAD detection: {e}")
+            return []
+
+    def prepare_speech(self, data: bytes, filename: str = "") -> tuple[np.ndarray | None, dict[str, float]]:
+        """Decode → mono/16 kHz → VAD → concat, entirely in memory.
+
+        Returns the speech as a float32 array (None when no speech was found)
+        and the time spent in each stage in milliseconds. Raises
+        AudioDecodeError if the audio can't be decoded.
+        """
+        timings = {}
+        start = time.perf_counter()
+
+        def lap(stage):
+            nonlocal start
+            now = time.perf_counter()
+            timings[stage] = (now - start) * 1000
+            start = now
+
+        wav, sr = decode_audio(data, filename)
+        lap("decode")
+        audio = audio_normalizer(wav, sr)
+        lap("resample")
+        speech_segments = self.vad_detect(audio)
+        lap("vad")
+
+        speech = None
+        if speech_segments:
+            # Whisper takes a float32 array directly, skipping its ffmpeg decode
+            speech = torch.cat([audio[seg['start']:seg['end']] for seg in speech_segments]).numpy()
+            lap("concat")
+        return speech, timings
+
+    async def process_audio(self, data: bytes, filename: str = "") -> tuple[str | None, dict[str, float]]:
+        """prepare_speech, then transcription through the batching ASR worker."""
+        speech, timings = await asyncio.to_thread(self.prepare_speech, data, filename)
+        text = None
+        if speech is not None:
+            start = time.perf_counter()
+            text = await self.asr.transcribe(speech)
+            timings["transcribe"] = (time.perf_counter() - start) * 1000
+
+        self.pipeline_runs += 1
+        self.last_timings = {stage: round(ms, 1) for stage, ms in timings.items()}
+        for stage, ms in timings.items():
+            self._stage_totals_ms[stage] += ms
+        logger.info(f"⏱️ Audio pipeline stages (ms): {self.last_timings}")
+        return text, timings
+
+    def stats(self) -> dict:
+        return {
+            "asr_backend": self.asr_backend.name,
+            "resamplers": audio_normalizer.stats(),
+            "asr": self.asr.stats(),
+            "runs": self.pipeline_runs,
+            "last_ms": self.last_timings,
+            "avg_ms": {
+                stage: round(total / self.pipeline_runs, 1) for stage, total in self._stage_totals_ms.items()
+            } if self.pipeline_runs else None,
+        }
+
+    async def async_vad_detect(self, audio_file):
+        return await asyncio.to_thread(self.vad_detect, audio_file)
+
+    def text_to_speech(self, text, lang='en'):
+        return io.BytesIO(synthesize(text, lang))
+
+    async def async_transcribe_command(self, audio):
+        return await asyncio.to_thread(self.transcribe_command, audio)
+    
+    async def async_text_to_speech(self, text):
+        return await asyncio.to_thread(self.text_to_speech, text)
@@ -0,0 +1,6 @@
+# Benchmarks are run from the backend directory, e.g.
+#   python -m benchmarks.bench_async_pipeline
+# The backend modules log to log/*.log, so make sure the directory exists.
+import os
+
+os.makedirs("log", exist_ok=True)
@@ -0,0 +1,97 @@
+"""Real-time factor and word error rate of each ASR backend.
+
+Transcribes the spoken-command corpus in asr_corpus.jsonl with every backend
+given (default: all of ASR_BACKENDS) and reports RTF (processing time /
+audio duration, lower is faster) and WER against the reference text.
+
+Audio for a corpus entry is read from <audio-dir>/<id>.wav (or .mp3) so real
+recordings can be dropped in; missing entries are synthesized once with
+gTTS and cached there as mp3.
+
+    python -m benchmarks.bench_asr_backends --backends whisper faster-whisper --model base
+"""
+import argparse
+import io
+import json
+import os
+import re
+import time
+
+import torchaudio
+from gtts import gTTS
+
+from assistant import ASR_BACKENDS, SAMPLE_RATE, audio_normalizer, load_asr_backend
+
+CORPUS = os.path.join(os.path.dirname(__file__), "asr_corpus.jsonl")
+AUDIO_DIR = os.path.join(os.path.dirname(__file__), "asr_corpus_audio")
+
+
+def load_corpus(audio_dir: str):
+    os.makedirs(audio_dir, exist_ok=True)
+    with open(CORPUS) as f:
+        entries = [json.loads(line) for line in f if line.strip()]
+
+    corpus = []
+    for entry in entries:
+        paths = [os.path.join(audio_dir, f"{entry['id']}.{ext}") for ext in ("wav", "mp3")]
+        path = next((p for p in paths if os.path.exists(p)), None)
+        if path is None:
+            path = paths[1]
+            buffer = io.BytesIO()
+            gTTS(text=entry["text"], lang="en").write_to_fp(buffer)
+            with open(path, "wb") as f:
+                f.write(buffer.getvalue())
+        corpus.append((entry["text"], audio_normalizer(*torchaudio.load(path)).numpy()))
+    return corpus
+
+
+def normalize(text: str) -> list[str]:
+    return re.sub(r"[^a-z0-9' ]+", " ", text.lower()).split()
+
+
+def word_errors(reference: list[str], hypothesis: list[str]) -> int:
+    """Levenshtein distance over words."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, start=1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1]
+
+
+def main(args):
+    corpus = load_corpus(args.audio_dir)
+    audio_seconds = sum(len(audio) for _, audio in corpus) / SAMPLE_RATE
+    reference_words = sum(len(normalize(text)) for text, _ in corpus)
+    print(f"{len(corpus)} commands, {audio_seconds:.1f}s of audio, model '{args.model}'")
+    print(f"{'backend':>15} {'load s':>7} {'RTF':>7} {'WER':>7}")
+
+    for name in args.backends:
+        start = time.perf_counter()
+        try:
+            backend = load_asr_backend(name, args.model)
+        except ImportError as e:
+            print(f"{name:>15}  skipped: {e}")
+            continue
+        load_s = time.perf_counter() - start
+
+        backend.transcribe(corpus[0][1])  # warm-up
+        errors, elapsed = 0, 0.0
+        for text, audio in corpus:
+            start = time.perf_counter()
+            hypothesis = backend.transcribe(audio)
+            elapsed += time.perf_counter() - start
+            errors += word_errors(normalize(text), normalize(hypothesis))
+            if args.verbose:
+                print(f"{'':>15}  {text!r} → {hypothesis!r}")
+        print(f"{name:>15} {load_s:>7.1f} {elapsed / audio_seconds:>7.3f} {errors / reference_words:>7.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", choices=list(ASR_BACKENDS), default=list(ASR_BACKENDS))
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--audio-dir", default=AUDIO_DIR)
+    parser.add_argument("--verbose", action="store_true")
+    main(parser.parse_args())
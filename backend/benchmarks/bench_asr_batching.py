@@ -0,0 +1,83 @@
+"""Whisper transcription: a thread per request vs. the batching ASR worker.
+
+Replays a directory of local WAV fixtures (short spoken commands) at several
+concurrency levels. The "per-request" side is the previous path, every
+upload calling transcribe() on its own asyncio.to_thread; the worker side
+queues them on TranscriptionWorker, which decodes up to --max-batch at once.
+Uses the real model of the chosen --backend.
+
+    python -m benchmarks.bench_asr_batching --fixtures path/to/wavs --requests 32
+"""
+import argparse
+import asyncio
+import glob
+import os
+import time
+
+import torchaudio
+
+from assistant import VoiceAssistant, ASR_BACKENDS, audio_normalizer, load_asr_backend
+from asr_worker import TranscriptionWorker
+
+
+def load_fixtures(path: str):
+    files = sorted(glob.glob(os.path.join(path, "*.wav")))
+    if not files:
+        raise SystemExit(f"No .wav fixtures found in {path}")
+    return [audio_normalizer(*torchaudio.load(f)).numpy() for f in files]
+
+
+def summarize(latencies: list[float], elapsed: float) -> str:
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    return f"{len(latencies) / elapsed:7.2f} req/s  p50 {p50:7.0f} ms  p95 {p95:7.0f} ms"
+
+
+async def run_level(transcribe, audios, concurrency: int, total: int) -> tuple[list[float], float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = time.perf_counter()
+            await transcribe(audios[i % len(audios)])
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, time.perf_counter() - start
+
+
+async def main(args):
+    audios = load_fixtures(args.fixtures)
+    assistant = object.__new__(VoiceAssistant)
+    assistant.asr_backend = load_asr_backend(args.backend, args.model)
+    worker = TranscriptionWorker(assistant.transcribe_batch, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms, queue_size=args.requests)
+
+    # Warm up both paths so model initialization isn't measured
+    await asyncio.to_thread(assistant.transcribe_command, audios[0])
+    await worker.transcribe(audios[0])
+
+    print(f"{len(audios)} fixture(s), {args.requests} requests per level, {args.backend} '{args.model}'")
+    for concurrency in args.levels:
+        latencies, elapsed = await run_level(
+            lambda audio: asyncio.to_thread(assistant.transcribe_command, audio), audios, concurrency, args.requests
+        )
+        print(f"concurrency {concurrency:>3}  per-request {summarize(latencies, elapsed)}")
+        latencies, elapsed = await run_level(worker.transcribe, audios, concurrency, args.requests)
+        print(f"concurrency {concurrency:>3}  batched     {summarize(latencies, elapsed)}")
+    print(f"worker stats: {worker.stats()}")
+    await worker.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", default="benchmarks/fixtures")
+    parser.add_argument("--backend", choices=list(ASR_BACKENDS), default="whisper")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--max-batch", type=int, default=8)
+    parser.add_argument("--max-wait-ms", type=float, default=50)
+    asyncio.run(main(parser.parse_args()))
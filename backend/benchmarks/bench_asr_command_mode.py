@@ -0,0 +1,65 @@
+"""Latency and command accuracy of ASR command mode vs. open-vocabulary decoding.
+
+Runs the spoken-command corpus (see bench_asr_backends) through one backend
+twice: as configured by default, and in command mode (vocabulary prompt,
+greedy decoding, token cap and, for Whisper, trimmed padding). A command
+counts as correct when the fast path parses the transcription into the same
+tool calls as the reference text, or, for commands the fast path doesn't
+handle, when the normalized words match exactly.
+
+    python -m benchmarks.bench_asr_command_mode --backend whisper --model base
+"""
+import argparse
+import statistics
+import time
+
+from assistant import ASR_BACKENDS, SAMPLE_RATE, load_asr_backend
+from benchmarks.bench_asr_backends import AUDIO_DIR, load_corpus, normalize, word_errors
+from fast_path import parse_command
+
+
+def is_correct(reference: str, hypothesis: str) -> bool:
+    expected = parse_command(reference)
+    if expected is not None:
+        return parse_command(hypothesis) == expected
+    return normalize(reference) == normalize(hypothesis)
+
+
+def run(backend, corpus, verbose: bool) -> tuple[list[float], int, int]:
+    backend.transcribe(corpus[0][1])  # warm-up
+    latencies, correct, errors = [], 0, 0
+    for text, audio in corpus:
+        start = time.perf_counter()
+        hypothesis = backend.transcribe(audio)
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += is_correct(text, hypothesis)
+        errors += word_errors(normalize(text), normalize(hypothesis))
+        if verbose:
+            print(f"    {text!r} → {hypothesis!r}")
+    return latencies, correct, errors
+
+
+def main(args):
+    corpus = load_corpus(args.audio_dir)
+    audio_seconds = sum(len(audio) for _, audio in corpus) / SAMPLE_RATE
+    reference_words = sum(len(normalize(text)) for text, _ in corpus)
+    print(f"{len(corpus)} commands, {audio_seconds:.1f}s of audio, {args.backend} '{args.model}'")
+    print(f"{'mode':>8} {'mean ms':>8} {'p95 ms':>8} {'RTF':>7} {'accuracy':>9} {'WER':>7}")
+
+    for mode, command_mode in (("default", False), ("command", True)):
+        backend = load_asr_backend(args.backend, args.model, command_mode=command_mode)
+        latencies, correct, errors = run(backend, corpus, args.verbose)
+        p95 = sorted(latencies)[int(len(latencies) * 0.95)]
+        print(
+            f"{mode:>8} {statistics.mean(latencies):>8.0f} {p95:>8.0f} {sum(latencies) / 1000 / audio_seconds:>7.3f}"
+            f" {correct / len(corpus):>9.1%} {errors / reference_words:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=list(ASR_BACKENDS), default="whisper")
+    parser.add_argument("--model", default="base")
+    parser.add_argument("--audio-dir", default=AUDIO_DIR)
+    parser.add_argument("--verbose", action="store_true")
+    main(parser.parse_args())
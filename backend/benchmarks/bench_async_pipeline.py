@@ -0,0 +1,80 @@
+"""Load benchmark for the async command pipeline.
+
+Runs scheduler.handle_user_command against stubbed LLM and HTTP backends
+and reports throughput for increasing concurrency. With a non-blocking
+pipeline throughput should grow roughly linearly with concurrency.
+
+    python -m benchmarks.bench_async_pipeline --requests 64 --llm-latency 0.3
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from benchmarks.stubs import FakeLLM, fake_fetch, HEADLINES, WEATHER_REPORT
+
+import agent
+import conditional_agent
+import context_cache
+from condition_cache import condition_cache
+import response_agent
+import scheduler
+import task_db
+from device_state import DeviceStates
+
+
+def install_stubs(llm_latency: float, http_latency: float):
+    agent.chat_with_tools = FakeLLM(llm_latency, tool_calls=[
+        {"name": "control_lamp", "args": {"room": "kitchen", "action": "on", "time_description": "in 2 hours"}},
+        {"name": "control_cooler", "args": {"action": "on", "weather_description": "hot", "news_description": "", "time_description": "now"}},
+    ])
+    context_cache.fetch_headlines = fake_fetch(http_latency, HEADLINES)
+    context_cache.fetch_weather = fake_fetch(http_latency, WEATHER_REPORT)
+
+    cond_llm = FakeLLM(llm_latency, content="1: WeatherCondition: True, NewsCondition: False")
+    conditional_agent.condition_llm = cond_llm
+
+    # Measure the full pipeline rather than the caches in front of it
+    condition_cache.max_size = 0
+
+    res_llm = FakeLLM(llm_latency, content="The kitchen lamp will turn on in 2 hours and the cooler is on.")
+    response_agent.response_llm = res_llm
+
+
+async def run_level(scheduler_, concurrency: int, total: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            # Distinct prompts so the intent cache never answers for the LLM
+            await scheduler.handle_user_command(f"turn on the kitchen lamp in 2 hours and the cooler if it's hot #{concurrency}-{i}", scheduler_)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    install_stubs(args.llm_latency, args.http_latency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = await task_db.TaskStore(os.path.join(tmp, "bench.db")).open()
+
+        print(f"{'concurrency':>11} {'seconds':>9} {'cmd/s':>8} {'speedup':>8}")
+        baseline = None
+        for concurrency in args.levels:
+            elapsed = await run_level(scheduler.Scheduler(store, await DeviceStates(store).load()), concurrency, args.requests)
+            throughput = args.requests / elapsed
+            baseline = baseline or throughput
+            print(f"{concurrency:>11} {elapsed:>9.2f} {throughput:>8.2f} {throughput / baseline:>7.1f}x")
+        await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--http-latency", type=float, default=0.1)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,131 @@
+"""/upload-audio/ preprocessing: temp-file chain vs. the in-memory pipeline.
+
+The "disk" side reproduces the previous upload path: save the upload, load
+it, save a resampled copy, reload it for VAD, save the speech segments and
+hand Whisper the file path. VAD and Whisper are stubbed so only decoding,
+resampling and file I/O are measured; the stub transcriber still decodes
+a path it is given, as Whisper's ffmpeg loader would.
+
+    python -m benchmarks.bench_audio_pipeline --uploads 20 --seconds 5
+"""
+import argparse
+import asyncio
+import io
+import os
+import tempfile
+import time
+
+import torch
+import torchaudio
+
+from assistant import VoiceAssistant, ASRBackend, SAMPLE_RATE, AUDIO_STAGES
+
+
+def make_upload(seconds: float, sr: int) -> bytes:
+    """Stereo WAV with one second of tone and one of near-silence, alternating."""
+    t = torch.arange(int(seconds * sr)) / sr
+    tone = 0.3 * torch.sin(2 * torch.pi * 220 * t) * ((t.floor() % 2) == 0)
+    wav = torch.stack([tone, tone]) + 0.001 * torch.randn(2, len(t))
+    buffer = io.BytesIO()
+    torchaudio.save(buffer, wav, sr, format="wav")
+    return buffer.getvalue()
+
+
+def energy_vad(wav, model, sampling_rate):
+    """Stand-in for silero's get_speech_timestamps: 100 ms frames above an energy floor."""
+    wav = wav.reshape(-1)
+    frame = sampling_rate // 10
+    segments = []
+    for start in range(0, len(wav) - frame + 1, frame):
+        if wav[start:start + frame].abs().mean() > 0.01:
+            if segments and segments[-1]["end"] == start:
+                segments[-1]["end"] = start + frame
+            else:
+                segments.append({"start": start, "end": start + frame})
+    return segments
+
+
+class StubWhisper(ASRBackend):
+    name = "stub"
+
+    def transcribe(self, audio):
+        if isinstance(audio, str):
+            torchaudio.load(audio)
+        return "turn on the kitchen lamp"
+
+
+class StubASR:
+    async def transcribe(self, audio):
+        return "turn on the kitchen lamp"
+
+
+def make_assistant() -> VoiceAssistant:
+    assistant = object.__new__(VoiceAssistant)
+    assistant.vad_model = None
+    assistant.get_speech_timestamps = energy_vad
+    assistant.asr_backend = StubWhisper()
+    assistant.asr = StubASR()
+    assistant.pipeline_runs = 0
+    assistant.last_timings = {}
+    assistant._stage_totals_ms = dict.fromkeys(AUDIO_STAGES, 0.0)
+    return assistant
+
+
+def disk_pipeline(assistant: VoiceAssistant, data: bytes, filename: str, tmp: str) -> str:
+    audio_path = os.path.join(tmp, filename)
+    with open(audio_path, "wb") as f:
+        f.write(data)
+
+    wav, sr = torchaudio.load(audio_path)
+    if sr != SAMPLE_RATE:
+        wav = torchaudio.transforms.Resample(orig_freq=sr, new_freq=SAMPLE_RATE)(wav)
+        sr = SAMPLE_RATE
+        resampled_path = os.path.join(tmp, f"resampled_{filename}")
+        torchaudio.save(resampled_path, wav, sample_rate=sr)
+    else:
+        resampled_path = audio_path
+
+    speech_segments = assistant.vad_detect(resampled_path)
+    speech_audio = torch.cat([wav[:, seg['start']:seg['end']] for seg in speech_segments], dim=1)
+    vad_audio_path = os.path.join(tmp, f"vad_{filename}")
+    torchaudio.save(vad_audio_path, speech_audio, sample_rate=sr)
+    return assistant.transcribe_command(vad_audio_path)
+
+
+async def memory_pipeline(assistant: VoiceAssistant, data: bytes, uploads: int):
+    for _ in range(uploads):
+        await assistant.process_audio(data, "upload.wav")
+
+
+def dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+def main(args):
+    data = make_upload(args.seconds, args.sample_rate)
+    assistant = make_assistant()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        for i in range(args.uploads):
+            disk_pipeline(assistant, data, f"upload_{i}.wav", tmp)
+        disk = time.perf_counter() - start
+        written = dir_bytes(tmp)
+
+    start = time.perf_counter()
+    asyncio.run(memory_pipeline(assistant, data, args.uploads))
+    memory = time.perf_counter() - start
+
+    print(f"{args.uploads} uploads of {args.seconds:g}s stereo at {args.sample_rate} Hz ({len(data) / 1024:.0f} KiB each)")
+    print(f"temp-file chain : {disk / args.uploads * 1000:7.1f} ms/upload, {written / args.uploads / 1024:7.0f} KiB written/upload")
+    print(f"in-memory       : {memory / args.uploads * 1000:7.1f} ms/upload, {0:7.0f} KiB written/upload")
+    print(f"speedup         : {disk / memory:7.2f}x")
+    print(f"stage averages  : {assistant.stats()['avg_ms']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--sample-rate", type=int, default=44100)
+    main(parser.parse_args())
@@ -0,0 +1,80 @@
+"""Backend cold start: time to serve text commands and time until all models are ready.
+
+Each configuration runs in a fresh interpreter so imports and model loads
+are really cold (model files themselves come from MODEL_CACHE_DIR, so run
+`python -m model_registry` once first to keep downloads out of the numbers).
+For every run it reports how long `import main` takes, how long until the
+startup hook would hand control back (models.start() returning), and when
+each model finished loading.
+
+"eager" mimics the previous startup, loading every model one after another
+before serving; the other configurations return immediately and load in
+the background, serially or in parallel, with or without audio.
+
+    python -m benchmarks.bench_cold_start --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+CONFIGS = {
+    "eager": {"MODEL_LOAD_WORKERS": "1", "AUDIO_ENABLED": "true"},
+    "lazy, serial": {"MODEL_LOAD_WORKERS": "1", "AUDIO_ENABLED": "true"},
+    "lazy, parallel": {"MODEL_LOAD_WORKERS": "4", "AUDIO_ENABLED": "true"},
+    "text only": {"MODEL_LOAD_WORKERS": "4", "AUDIO_ENABLED": "false"},
+}
+
+
+def child(eager: bool):
+    start = time.perf_counter()
+    import main  # noqa: F401
+    from model_registry import models
+    imported = time.perf_counter() - start
+
+    models.start()
+    if eager:
+        for name in models.status():
+            models.get(name)
+    serving = time.perf_counter() - start
+
+    for name in models.status():
+        models.get(name)
+    ready = time.perf_counter() - start
+    loads = {name: model["seconds"] for name, model in models.status().items()}
+    print(json.dumps({"import": imported, "serving": serving, "ready": ready, "loads": loads}))
+    models.shutdown()
+
+
+def run(config: str) -> dict:
+    env = {**os.environ, **CONFIGS[config]}
+    args = [sys.executable, "-m", "benchmarks.bench_cold_start", "--child"] + (["--eager"] if config == "eager" else [])
+    output = subprocess.run(args, env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(args):
+    print(f"{'config':>15} {'import s':>9} {'serving s':>10} {'ready s':>8}  model load s")
+    for config in CONFIGS:
+        results = [run(config) for _ in range(args.runs)]
+
+        def median(key):
+            return statistics.median(result[key] for result in results)
+
+        loads = ", ".join(f"{name} {seconds:.1f}" for name, seconds in results[-1]["loads"].items())
+        print(f"{config:>15} {median('import'):>9.2f} {median('serving'):>10.2f} {median('ready'):>8.2f}  {loads}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--eager", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.eager)
+    else:
+        main(args)
@@ -0,0 +1,76 @@
+"""Perceived latency of /send-command/ vs. its streaming variant.
+
+Runs a command that schedules a device action and asks for news through
+scheduler.handle_user_command (the reply arrives all at once) and
+scheduler.stream_user_command (actions first, then the reply token by
+token), with stubbed LLMs and HTTP fetches. Reports time to the actions,
+to the first reply token and to the complete reply.
+
+    python -m benchmarks.bench_command_stream --commands 20 --llm-latency 0.6
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from benchmarks.stubs import FakeLLM, fake_fetch, HEADLINES, WEATHER_REPORT
+
+import agent
+import context_cache
+import response_agent
+import scheduler
+import task_db
+from device_state import DeviceStates
+
+REPLY = "The kitchen lamp will turn on in 2 hours. In the news: the Champions League final kicks off tonight in Istanbul."
+
+
+def install_stubs(args):
+    agent.chat_with_tools = FakeLLM(args.llm_latency, tool_calls=[
+        {"name": "control_lamp", "args": {"room": "kitchen", "action": "on", "time_description": "in 2 hours"}},
+        {"name": "get_news", "args": {"filter": ""}},
+    ])
+    context_cache.fetch_headlines = fake_fetch(0, HEADLINES)
+    context_cache.fetch_weather = fake_fetch(0, WEATHER_REPORT)
+    response_agent.response_llm = FakeLLM(args.llm_latency, content=REPLY, token_interval=args.token_interval)
+
+
+async def main(args):
+    install_stubs(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        store = await task_db.TaskStore(os.path.join(tmp, "bench.db")).open()
+        scheduler_ = scheduler.Scheduler(store, await DeviceStates(store).load())
+
+        blocking, actions_ms, first_ms, done_ms = [], [], [], []
+        for i in range(args.commands):
+            # Distinct prompts so the intent cache never answers for the LLM
+            prompt = f"turn on the kitchen lamp in 2 hours and tell me the news #{i}"
+            start = time.perf_counter()
+            await scheduler.handle_user_command(prompt, scheduler_)
+            blocking.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            async for event in scheduler.stream_user_command(prompt + " (streamed)", scheduler_):
+                elapsed = (time.perf_counter() - start) * 1000
+                if event["type"] == "actions":
+                    actions_ms.append(elapsed)
+                elif event["type"] == "token" and len(first_ms) < len(actions_ms):
+                    first_ms.append(elapsed)
+            done_ms.append((time.perf_counter() - start) * 1000)
+        await store.close()
+
+    print(f"{args.commands} commands, LLM latency {args.llm_latency}s, {args.token_interval * 1000:.0f} ms/token")
+    print(f"blocking  reply        median {statistics.median(blocking):7.0f} ms")
+    print(f"streaming actions      median {statistics.median(actions_ms):7.0f} ms")
+    print(f"streaming first token  median {statistics.median(first_ms):7.0f} ms")
+    print(f"streaming done         median {statistics.median(done_ms):7.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--commands", type=int, default=20)
+    parser.add_argument("--llm-latency", type=float, default=0.6)
+    parser.add_argument("--token-interval", type=float, default=0.03)
+    asyncio.run(main(parser.parse_args()))
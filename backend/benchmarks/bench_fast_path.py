@@ -0,0 +1,117 @@
+"""Accuracy and latency of the rule-based fast path.
+
+Checks fast_path.parse_command against the labelled corpus in
+fast_path_corpus.jsonl. Prompts labelled null must fall back to the LLM.
+With --llm it also sends every prompt to the tool-calling LLM. It then
+reports how often the LLM agrees with the labels and with the fast path,
+and compares their latencies.
+
+    python -m benchmarks.bench_fast_path [--llm]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import datetime
+
+from langchain.schema import SystemMessage, HumanMessage
+
+from fast_path import parse_command
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fast_path_corpus.jsonl")
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def call_keys(calls, base: datetime):
+    """Comparable form of a call list: device, room, action and resolved minute."""
+    from agent import parse_time_description
+
+    keys = []
+    for name, room, action, time_description in calls:
+        run_at = parse_time_description(time_description, base=base) or base
+        keys.append((name, room, action.lower(), run_at.replace(second=0, microsecond=0)))
+    return sorted(keys)
+
+
+def as_rows(tool_calls):
+    return [
+        [c["name"], c["args"].get("room", ""), c["args"].get("action", ""), c["args"].get("time_description", "")]
+        for c in tool_calls
+    ]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def main(args):
+    corpus = load_corpus()
+    base = datetime.now()
+
+    simple = [c for c in corpus if c["expected"] is not None]
+    correct = handled = false_accepts = 0
+    latencies = []
+    for case in corpus:
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            calls = parse_command(case["prompt"])
+        latencies.append((time.perf_counter() - start) * 1000 / args.repeat)
+
+        case["fast"] = as_rows(calls) if calls is not None else None
+        if calls is None:
+            if case["expected"] is not None:
+                print(f"  fallback : {case['prompt']}")
+            continue
+        if case["expected"] is None:
+            false_accepts += 1
+            print(f"  FALSE ACCEPT: {case['prompt']} → {case['fast']}")
+            continue
+        handled += 1
+        if call_keys(case["fast"], base) == call_keys(case["expected"], base):
+            correct += 1
+        else:
+            print(f"  MISMATCH : {case['prompt']} → {case['fast']}")
+
+    print(f"fast path coverage of simple commands: {handled}/{len(simple)}")
+    print(f"fast path accuracy on handled commands: {correct}/{handled}")
+    print(f"fast path false accepts (should use LLM): {false_accepts}")
+    print(f"fast path latency: median {statistics.median(latencies):.3f} ms, p95 {percentile(latencies, 0.95):.3f} ms")
+
+    if not args.llm:
+        return
+
+    import agent
+
+    llm_latencies = []
+    llm_correct = agree = compared = 0
+    for case in simple:
+        start = time.perf_counter()
+        response = await agent.chat_with_tools.ainvoke([
+            SystemMessage(content=agent.SYSTEM_PROMPT),
+            HumanMessage(content=case["prompt"])
+        ])
+        llm_latencies.append((time.perf_counter() - start) * 1000)
+
+        llm_rows = as_rows(response.tool_calls)
+        llm_correct += call_keys(llm_rows, base) == call_keys(case["expected"], base)
+        if case["fast"] is not None:
+            compared += 1
+            agree += call_keys(llm_rows, base) == call_keys(case["fast"], base)
+
+    print(f"LLM accuracy on simple commands: {llm_correct}/{len(simple)}")
+    print(f"LLM agrees with fast path: {agree}/{compared}")
+    print(f"LLM latency: median {statistics.median(llm_latencies):.0f} ms, p95 {percentile(llm_latencies, 0.95):.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also run the corpus through the tool-calling LLM")
+    parser.add_argument("--repeat", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
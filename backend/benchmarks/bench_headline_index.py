@@ -0,0 +1,73 @@
+"""Per-call FAISS rebuilds vs. the incremental headline index.
+
+Simulates a stream of commands that each run a news condition against the
+current headline snapshot, with a fraction of headlines replaced between
+refreshes. Uses the real MiniLM embeddings from conditional_agent.
+
+    python -m benchmarks.bench_headline_index --headlines 50 --queries 30
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from langchain.schema import Document
+from langchain_community.vectorstores import FAISS
+
+from conditional_agent import embeddings
+from headline_index import HeadlineIndex
+
+TOPICS = ["football", "election", "heatwave", "war", "technology", "markets", "tennis", "storm", "vaccine", "film"]
+QUERIES = ["football match", "important war news", "extreme heat", "stock market crash", "new phone launch"]
+
+
+def build_vector_store(texts: list[str]) -> FAISS:
+    """What get_similar did per call before the incremental index."""
+    return FAISS.from_documents([Document(page_content=text) for text in texts], embeddings)
+
+
+def make_headline(i: int) -> str:
+    return f"{TOPICS[i % len(TOPICS)].title()} update #{i}: developments continue as officials respond"
+
+
+async def main(args):
+    rng = random.Random(0)
+    next_id = args.headlines
+    snapshots = []
+    current = [make_headline(i) for i in range(args.headlines)]
+    for _ in range(args.refreshes):
+        snapshots.append(list(current))
+        for slot in rng.sample(range(len(current)), int(len(current) * args.churn)):
+            current[slot] = make_headline(next_id)
+            next_id += 1
+
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        for q in range(args.queries):
+            store = build_vector_store(snapshot)
+            store.similarity_search(QUERIES[q % len(QUERIES)], k=5)
+    rebuild = time.perf_counter() - start
+
+    index = HeadlineIndex(embeddings)
+    start = time.perf_counter()
+    for snapshot in snapshots:
+        await index.update(snapshot)
+        for q in range(args.queries):
+            await index.search(QUERIES[q % len(QUERIES)], k=5)
+    incremental = time.perf_counter() - start
+
+    total = args.refreshes * args.queries
+    print(f"{args.refreshes} refreshes x {args.queries} queries, {args.headlines} headlines, {args.churn:.0%} churn")
+    print(f"per-call rebuild : {rebuild:8.2f} s  ({rebuild / total * 1000:7.1f} ms/query)")
+    print(f"incremental index: {incremental:8.2f} s  ({incremental / total * 1000:7.1f} ms/query)")
+    print(f"speedup          : {rebuild / incremental:8.1f}x")
+    print(f"index stats      : {index.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--headlines", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--refreshes", type=int, default=5)
+    parser.add_argument("--churn", type=float, default=0.2)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,81 @@
+"""LLM gateway: a single provider vs. failover vs. failover with hedged requests.
+
+Replays calls against two simulated free-tier providers, each with a
+heavy latency tail (--slow-rate of calls take --slow-latency seconds) and
+a share of rate-limit errors. "single" is the previous setup, one fixed
+provider per role with no fallback; "failover" retries failed calls on the
+other provider; "hedged" also re-sends slow calls after --hedge-delay-ms.
+Reports success rate, latency percentiles and provider calls per request,
+the price of hedging.
+
+    python -m benchmarks.bench_llm_gateway --requests 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.stubs import FlakyLLM
+from llm_gateway import LLMGateway, Provider, percentile
+
+
+def make_gateway(args, names: list[str], hedge_delay_ms: float) -> LLMGateway:
+    providers = {
+        name: Provider(
+            name,
+            FlakyLLM(args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency, error_rate=args.error_rate, seed=seed, content="ok"),
+            cooldown_seconds=args.cooldown,
+        )
+        for seed, name in enumerate(names)
+    }
+    return LLMGateway(providers, hedge_delay_ms=hedge_delay_ms, preference=lambda role: names[0])
+
+
+async def run(gateway: LLMGateway, args) -> tuple[list[float], int, float]:
+    chat = gateway.chat("agent")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, failures = [], 0
+
+    async def one():
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await chat.ainvoke([])
+            except Exception:
+                failures += 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    provider_calls = sum(provider.calls for provider in gateway.providers.values())
+    return latencies, failures, provider_calls / args.requests
+
+
+async def main(args):
+    configs = {
+        "single": (["TOGETHER"], 0),
+        "failover": (["TOGETHER", "GROQ"], 0),
+        "hedged": (["TOGETHER", "GROQ"], args.hedge_delay_ms),
+    }
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {args.error_rate:.0%} errors, "
+          f"{args.slow_rate:.0%} slow ({args.slow_latency}s) per provider")
+    print(f"{'config':>9} {'success':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'calls/req':>10}")
+    for config, (names, hedge_delay_ms) in configs.items():
+        latencies, failures, calls = await run(make_gateway(args, names, hedge_delay_ms), args)
+        print(
+            f"{config:>9} {1 - failures / args.requests:>8.1%} {percentile(latencies, 0.5) or 0:>8.0f}"
+            f" {percentile(latencies, 0.95) or 0:>8.0f} {percentile(latencies, 0.99) or 0:>8.0f} {calls:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--hedge-delay-ms", type=float, default=800)
+    parser.add_argument("--cooldown", type=float, default=2.0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,75 @@
+"""Reply wording: template rendering vs. the make_response LLM round trip.
+
+Renders representative device action sets (single device, grouped rooms,
+"all lamps", everything, scheduled and conditional actions, a rejected
+schedule) both ways and reports the time per reply. Without --llm the LLM
+side is a stub answering after --llm-latency seconds; with --llm it calls
+the real response LLM through the gateway and prints both replies so the
+wording can be compared.
+
+    python -m benchmarks.bench_response_render [--llm] [--repeat 1000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.stubs import FakeLLM
+import response_agent
+from response_templates import render_device_actions
+
+LAMP_ROOMS = ["kitchen", "bathroom", "room1", "room2"]
+
+
+def action(function: str, state: str, run_at: datetime, result: str = "", **args) -> dict:
+    return {"function": function, "args": {"action": state, **args}, "scheduled_for": run_at.isoformat(), "result": result}
+
+
+def action_sets(now: datetime) -> dict[str, list[dict]]:
+    later = now + timedelta(hours=2)
+    evening = now.replace(hour=21, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return {
+        "one lamp, scheduled": [action("control_lamp", "on", later, room="kitchen")],
+        "two lamps, now": [action("control_lamp", "off", now, room=room) for room in ("kitchen", "bathroom")],
+        "all lamps + cooler": [action("control_lamp", "on", now, room=room) for room in LAMP_ROOMS]
+        + [action("control_cooler", "on", now)],
+        "everything off": [action("control_lamp", "off", evening, room=room) for room in LAMP_ROOMS]
+        + [action("control_ac", "off", evening, room=room) for room in ("room1", "kitchen")]
+        + [action("control_cooler", "off", evening), action("control_tv", "off", evening)],
+        "conditional": [action("control_cooler", "on", now, weather_description="hot", news_description="")],
+        "mixed times": [action("control_ac", "on", now + timedelta(minutes=30), room="room1"),
+                        action("control_lamp", "off", later, room="room2")],
+        "rejected": [action("control_tv", "on", later, result="Not scheduled: TV already has a task at that time")],
+    }
+
+
+async def main(args):
+    if not args.llm:
+        response_agent.response_llm = FakeLLM(args.llm_latency, content="(stubbed LLM reply)")
+
+    now = datetime.now()
+    print(f"{'action set':>22} {'template ms':>12} {'LLM ms':>8}")
+    template_ms, llm_ms = [], []
+    for name, actions in action_sets(now).items():
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            text = render_device_actions(actions, now)
+        template_ms.append((time.perf_counter() - start) * 1000 / args.repeat)
+
+        start = time.perf_counter()
+        llm_text = await response_agent.make_response(actions, use_llm=True)
+        llm_ms.append((time.perf_counter() - start) * 1000)
+        print(f"{name:>22} {template_ms[-1]:>12.3f} {llm_ms[-1]:>8.0f}")
+        if args.llm:
+            print(f"{'':>22}   template: {text}\n{'':>22}   LLM:      {llm_text}")
+
+    print(f"median: template {statistics.median(template_ms):.3f} ms, LLM {statistics.median(llm_ms):.0f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="call the real response LLM instead of a stub")
+    parser.add_argument("--llm-latency", type=float, default=0.8)
+    parser.add_argument("--repeat", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,88 @@
+"""Task database ops/sec: connection per call vs. the shared TaskStore.
+
+The "per-call" side reproduces the previous task_db access pattern, where
+every operation opened its own aiosqlite connection. The mix mirrors a
+running backend: scheduler polls, device updates/reads and task inserts.
+
+    python -m benchmarks.bench_task_db --ops 2000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import aiosqlite
+
+from task_db import TaskStore, to_epoch_ms, encode_task
+
+DEVICES = ["lamp_kitchen", "lamp_bathroom", "lamp_room1", "lamp_room2", "AC_room1", "AC_kitchen", "Cooler", "TV"]
+
+
+class PerCallStore:
+    def __init__(self, path):
+        self.path = path
+
+    async def add_task(self, function_name, run_at, kwargs=None):
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute(
+                "INSERT INTO tasks (run_at, status, function_name, device, room, action, kwargs_json) VALUES (?, 'pending', ?, ?, ?, ?, ?)",
+                (to_epoch_ms(run_at), function_name, *encode_task(function_name, kwargs or {}))
+            )
+            await db.commit()
+
+    async def get_due_tasks(self):
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute(
+                "SELECT id, run_at, function_name, kwargs_json FROM tasks "
+                "WHERE status = 'pending' AND run_at <= ? ORDER BY run_at, id LIMIT 500",
+                (to_epoch_ms(datetime.now()),)
+            )
+            return await cursor.fetchall()
+
+    async def set_device_status(self, device_name, new_status):
+        async with aiosqlite.connect(self.path) as db:
+            await db.execute('UPDATE device_status SET status = ? WHERE device_name = ?', (new_status, device_name))
+            await db.commit()
+
+    async def get_all_device_statuses(self):
+        async with aiosqlite.connect(self.path) as db:
+            cursor = await db.execute('SELECT device_name, status FROM device_status')
+            return dict(await cursor.fetchall())
+
+
+async def run_mix(store, ops: int) -> float:
+    future = datetime.now() + timedelta(days=1)
+    start = time.perf_counter()
+    for i in range(ops):
+        kind = i % 4
+        if kind == 0:
+            await store.get_due_tasks()
+        elif kind == 1:
+            await store.set_device_status(DEVICES[i % len(DEVICES)], "on" if i % 8 < 4 else "off")
+        elif kind == 2:
+            await store.get_all_device_statuses()
+        else:
+            await store.add_task("control_lamp", future, kwargs={"room": "kitchen", "action": "on"})
+    return ops / (time.perf_counter() - start)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        shared = await TaskStore(path).open()
+
+        per_call = await run_mix(PerCallStore(path), args.ops)
+        pooled = await run_mix(shared, args.ops)
+        await shared.close()
+
+    print(f"per-call connections: {per_call:8.0f} ops/s")
+    print(f"shared TaskStore    : {pooled:8.0f} ops/s")
+    print(f"speedup             : {pooled / per_call:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ops", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
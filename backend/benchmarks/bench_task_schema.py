@@ -0,0 +1,88 @@
+"""Due-task query latency as future tasks pile up: legacy schema vs. current.
+
+The legacy side is the old tasks table (ISO text run_at, no index, no
+status, pickled arguments) queried the way the polling scheduler did. The current side is
+TaskStore.get_due_tasks on the migrated schema. Both tables get the same
+handful of due tasks plus a growing backlog of tasks scheduled days ahead.
+
+    python -m benchmarks.bench_task_schema --sizes 0 1000 10000 100000
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from task_db import TaskStore, to_epoch_ms, encode_task
+
+DUE_TASKS = 5
+KWARGS = {"room": "kitchen", "action": "on"}
+
+
+def legacy_rows(count: int, start: datetime):
+    return [((start + timedelta(seconds=i)).isoformat(), "control_lamp", pickle.dumps([]), pickle.dumps(KWARGS)) for i in range(count)]
+
+
+def current_rows(count: int, start: datetime):
+    columns = encode_task("control_lamp", KWARGS)
+    return [(to_epoch_ms(start + timedelta(seconds=i)), "control_lamp", *columns) for i in range(count)]
+
+
+async def time_query(query, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        await query()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = sqlite3.connect(os.path.join(tmp, "legacy.db"))
+        legacy.execute("CREATE TABLE tasks (id INTEGER PRIMARY KEY AUTOINCREMENT, run_at TEXT, function_name TEXT, args_blob BLOB, kwargs_blob BLOB)")
+        legacy_insert = "INSERT INTO tasks (run_at, function_name, args_blob, kwargs_blob) VALUES (?, ?, ?, ?)"
+        legacy.executemany(legacy_insert, legacy_rows(DUE_TASKS, datetime.now() - timedelta(hours=1)))
+        legacy.commit()
+
+        store = await TaskStore(os.path.join(tmp, "current.db")).open()
+        current = sqlite3.connect(store.path)
+        current_insert = (
+            "INSERT INTO tasks (run_at, status, function_name, device, room, action, kwargs_json) "
+            "VALUES (?, 'pending', ?, ?, ?, ?, ?)"
+        )
+        current.executemany(current_insert, current_rows(DUE_TASKS, datetime.now() - timedelta(hours=1)))
+        current.commit()
+
+        async def legacy_due():
+            rows = legacy.execute(
+                'SELECT id, run_at, function_name, args_blob, kwargs_blob FROM tasks WHERE run_at <= ?',
+                (datetime.now().isoformat(),)
+            ).fetchall()
+            return [pickle.loads(row[4]) for row in rows]
+
+        print(f"{'future tasks':>12} {'legacy ms':>10} {'current ms':>11}")
+        queued = 0
+        for size in sorted(args.sizes):
+            future = datetime.now() + timedelta(days=2)
+            legacy.executemany(legacy_insert, legacy_rows(size - queued, future))
+            legacy.commit()
+            current.executemany(current_insert, current_rows(size - queued, future))
+            current.commit()
+            queued = size
+
+            legacy_ms = await time_query(legacy_due, args.repeat)
+            current_ms = await time_query(store.get_due_tasks, args.repeat)
+            print(f"{size:>12} {legacy_ms:>10.3f} {current_ms:>11.3f}")
+
+        current.close()
+        legacy.close()
+        await store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,69 @@
+"""Time to first audio byte: one gTTS call per reply vs. sentence-level streaming.
+
+The previous voice path synthesized the whole reply before sending
+anything; tts.stream_speech synthesizes sentences concurrently and sends
+each as soon as it and the ones before it are ready. By default gTTS is
+replaced by a stub taking --base-latency seconds per request plus
+--char-latency per character; --gtts uses the real service.
+
+    python -m benchmarks.bench_tts_stream [--gtts] [--replies 5]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import tts
+
+REPLIES = [
+    "The kitchen lamp will turn on in 2 hours.",
+    "All lamps and the cooler are now on. Both ACs will turn off at 11 PM.",
+    "The lamps in the kitchen and room 2 are now on. The AC in room 1 will turn on tomorrow at 7 AM. The TV is now off.",
+    "Here are the latest headlines: the Champions League final kicks off tonight in Istanbul. "
+    "A heatwave is expected to push temperatures above 40°C. The central bank held interest rates steady.",
+]
+
+
+class StubTTS:
+    def __init__(self, text: str, lang: str = "en"):
+        self.text = text
+
+    def write_to_fp(self, fp):
+        time.sleep(ARGS.base_latency + ARGS.char_latency * len(self.text))
+        fp.write(b"\xff\xf3" * len(self.text))
+
+
+async def measure(reply: str) -> tuple[float, float, float]:
+    start = time.perf_counter()
+    await asyncio.to_thread(tts.synthesize, reply)
+    whole = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    first = None
+    async for _ in tts.stream_speech(reply):
+        first = first or (time.perf_counter() - start) * 1000
+    return whole, first, (time.perf_counter() - start) * 1000
+
+
+async def main(args):
+    if not args.gtts:
+        tts.ProxiedTTS = StubTTS
+    print(f"{'sentences':>9} {'whole ms':>9} {'stream first ms':>16} {'stream total ms':>16}")
+    firsts, wholes = [], []
+    for reply in REPLIES:
+        runs = [await measure(reply) for _ in range(args.replies)]
+        whole, first, total = (statistics.median(run[i] for run in runs) for i in range(3))
+        wholes.append(whole)
+        firsts.append(first)
+        print(f"{len(tts.split_sentences(reply)):>9} {whole:>9.0f} {first:>16.0f} {total:>16.0f}")
+    print(f"time to first audio: {statistics.median(wholes):.0f} ms whole vs. {statistics.median(firsts):.0f} ms streamed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gtts", action="store_true", help="use the real gTTS service")
+    parser.add_argument("--replies", type=int, default=5, help="runs per reply")
+    parser.add_argument("--base-latency", type=float, default=0.25)
+    parser.add_argument("--char-latency", type=float, default=0.003)
+    ARGS = parser.parse_args()
+    asyncio.run(main(ARGS))
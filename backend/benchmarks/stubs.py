@@ -0,0 +1,81 @@
+import asyncio
+import itertools
+import random
+
+from langchain.schema import AIMessage
+from langchain_core.messages import AIMessageChunk
+
+
+class FakeLLM:
+    """Stand-in for a ChatOpenAI client that answers after a fixed delay.
+
+    With a token_interval the content takes that long per word after the
+    first, whether it is returned whole or streamed.
+    """
+
+    def __init__(self, latency: float, content: str = "", tool_calls=None, token_interval: float = 0.0):
+        self.latency = latency
+        self.token_interval = token_interval
+        self.content = content
+        self.tool_calls = tool_calls or []
+        self.calls = 0
+        self._ids = itertools.count()
+
+    def bind_tools(self, tools):
+        return self
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency + self.token_interval * (len(self.content.split()) - 1 if self.content else 0))
+        tool_calls = [dict(call, id=f"call_{next(self._ids)}") for call in self.tool_calls]
+        return AIMessage(content=self.content, tool_calls=tool_calls)
+
+    async def astream(self, messages, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for i, word in enumerate(self.content.split(" ")):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield AIMessageChunk(content=word if i == 0 else " " + word)
+
+
+def fake_fetch(latency: float, value):
+    async def fetch(*args, **kwargs):
+        await asyncio.sleep(latency)
+        return value
+    return fetch
+
+
+HEADLINES = [
+    "Champions League final kicks off tonight in Istanbul",
+    "Heatwave expected to push temperatures above 40°C",
+    "Central bank holds interest rates steady",
+    "New smartphone launch breaks preorder records",
+    "Peace talks resume after weeks of deadlock",
+]
+
+WEATHER_REPORT = "\n".join(
+    f"2025-07-01 {h:02d}:00:00: {30 + h % 5}°C, clear sky" for h in range(0, 48, 3)
+)
+
+
+class FlakyLLM(FakeLLM):
+    """FakeLLM with a heavy latency tail and a share of rate-limit errors, like a free-tier provider."""
+
+    def __init__(self, latency: float, slow_rate: float = 0.1, slow_latency: float = 3.0, error_rate: float = 0.0, seed: int = 0, **kwargs):
+        super().__init__(latency, **kwargs)
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+
+    async def ainvoke(self, messages, **kwargs):
+        roll = self._rng.random()
+        if roll < self.error_rate:
+            await asyncio.sleep(self.latency / 10)
+            raise RuntimeError("429 Too Many Requests")
+        if roll < self.error_rate + self.slow_rate:
+            self.calls += 1
+            await asyncio.sleep(self.slow_latency)
+            return AIMessage(content=self.content)
+        return await super().ainvoke(messages, **kwargs)
@@ -0,0 +1,106 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import List
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/condition_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+CONDITION_CACHE_SIZE = int(os.getenv("CONDITION_CACHE_SIZE", "256"))
+CONDITION_CACHE_TTL_SECONDS = float(os.getenv("CONDITION_CACHE_TTL_SECONDS", "600"))
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+class ConditionCache:
+    """LRU/TTL memo of condition evaluation results.
+
+    Entries are keyed on the normalized (weather, news) condition plus a hash
+    of the context it was evaluated against: the relevant headlines for the
+    news part and the forecast for the weather part. A changed context
+    therefore never hits a stale result.
+    """
+
+    def __init__(self, max_size: int = CONDITION_CACHE_SIZE, ttl: float = CONDITION_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple, tuple[tuple[bool, bool], float]] = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def make_key(condition: tuple[str, str], relevant_news: List[str], weather_report: str) -> tuple:
+        weather_description, news_description = condition
+        return (
+            weather_description,
+            news_description,
+            _digest(weather_report) if weather_description else "",
+            _digest("\n".join(relevant_news)) if news_description else "",
+        )
+
+    def get(self, key: tuple) -> tuple[bool, bool] | None:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] < time.time():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: tuple, result: tuple[bool, bool]):
+        self._entries[key] = (result, time.time() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, part: str | None = None):
+        """Drop cached results. `part` is "weather" or "news" to drop only entries that depend on it."""
+        if part is None:
+            dropped = len(self._entries)
+            self._entries.clear()
+        else:
+            index = 0 if part == "weather" else 1
+            stale = [key for key in self._entries if key[index]]
+            for key in stale:
+                del self._entries[key]
+            dropped = len(stale)
+        self.invalidations += dropped
+        if dropped:
+            logger.info(f"🧹 Invalidated {dropped} cached condition result(s) ({part or 'all'})")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+condition_cache = ConditionCache()
@@ -1,13 +1,20 @@
 import os
-import requests
+import re
+import asyncio
+import httpx
 import logging
 from typing import List
 
-from langchain.schema import Document, SystemMessage, HumanMessage
-from langchain_openai import ChatOpenAI
-from langchain_community.vectorstores import FAISS
+# Before any Hugging Face import, so MODELS_OFFLINE takes effect
+from model_registry import models, cache_path
+
+from langchain.schema import SystemMessage, HumanMessage
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
-from newsapi import NewsApiClient
+
+from headline_index import HeadlineIndex
+from condition_cache import condition_cache
+from llm_gateway import llm_gateway
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -28,39 +35,63 @@ proxies = {
     "https": "socks5h://127.0.0.1:2080"
 }
 
+NEWS_API_URL = "https://newsapi.org/v2/top-headlines"
+WEATHER_API_URL = "http://api.openweathermap.org/data/2.5/forecast"
+NO_WEATHER_DATA = "No weather data available."
 
-tg_llm  = ChatOpenAI(
-    model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-    base_url="https://api.together.xyz/v1",
-    api_key=os.getenv("TOGETHER_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
+_http_client: httpx.AsyncClient | None = None
+
+condition_llm = llm_gateway.chat("condition")
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
-groq_llm = ChatOpenAI(
-    model="llama3-70b-8192",
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.getenv("GROQ_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
 
-embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
+class RegistryEmbeddings(Embeddings):
+    """Embeddings backed by a registry model, so importing this module doesn't load it.
 
-def fetch_headlines(api_key: str, query: str = "") -> List[str]:
+    The first embedding call waits for the model if it is still loading.
+    """
+
+    def __init__(self, name: str, model_name: str):
+        self.name = name
+        self.model_name = model_name
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return models.get(self.name).embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return models.get(self.name).embed_query(text)
+
+
+models.register(
+    "embeddings",
+    lambda: HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL, cache_folder=cache_path("sentence-transformers"))
+)
+embeddings = RegistryEmbeddings("embeddings", EMBEDDING_MODEL)
+headline_index = HeadlineIndex(embeddings, path=os.getenv("HEADLINE_INDEX_PATH") or None)
+
+def get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(proxy=proxies["https"], timeout=10)
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+async def fetch_headlines(api_key: str, query: str = "") -> List[str]:
     try:
         logger.debug(f"Fetching news headlines with query: '{query}'")
 
-        # Patch requests to use SOCKS5 proxy
-        session = requests.Session()
-        session.proxies = {
-            'http': 'socks5h://127.0.0.1:2080',
-            'https': 'socks5h://127.0.0.1:2080'
-        }
+        params = {"language": "en", "pageSize": 50}
+        if query:
+            params["q"] = query
 
-        # Monkey-patch NewsApiClient's internal session
-        client = NewsApiClient(api_key=api_key)
-        client.session = session
-
-        articles = client.get_top_headlines(language="en", page_size=50, q=query or None).get("articles", [])
+        res = await get_http_client().get(NEWS_API_URL, params=params, headers={"X-Api-Key": api_key or ""})
+        articles = res.json().get("articles", [])
         headlines = [a["title"] for a in articles if a.get("title")]
 
         logger.info(f"Fetched {len(headlines)} headlines")
@@ -70,15 +101,15 @@ def fetch_headlines(api_key: str, query: str = "") -> List[str]:
         logger.error(f"Failed to fetch headlines: {e}")
         return []
 
-def fetch_weather(api_key: str, city_id: str = "418863") -> str:
+async def fetch_weather(api_key: str, city_id: str = "418863") -> str:
     try:
         logger.debug(f"Fetching weather for city_id={city_id}")
-        res = requests.get("http://api.openweathermap.org/data/2.5/forecast", params={
+        res = (await get_http_client().get(WEATHER_API_URL, params={
             "id": city_id, "appid": api_key, "units": "metric"
-        }, proxies=proxies, timeout=10).json()
+        })).json()
         if "list" not in res:
             logger.warning("No weather data found in response")
-            return "No weather data available."
+            return NO_WEATHER_DATA
         weather_report = "\n".join(
             f"{e['dt_txt']}: {e['main']['temp']}°C, {e['weather'][0]['description']}"
             for e in res["list"][:16]
@@ -87,80 +118,120 @@ def fetch_weather(api_key: str, city_id: str = "418863") -> str:
         return weather_report
     except Exception as e:
         logger.error(f"Failed to fetch weather data: {e}")
-        return "No weather data available."
-
-def build_vector_store(texts: List[str]):
-    logger.debug(f"Building vector store for {len(texts)} documents")
-    docs = [Document(page_content=text) for text in texts]
-    store = FAISS.from_documents(docs, embeddings)
-    logger.info("Vector store created")
-    return store
-
-def get_similar(query: str, store, k: int = 5) -> List[str]:
-    logger.debug(f"Searching for top {k} documents similar to: '{query}'")
-    results = [doc.page_content for doc in store.similarity_search(query, k=k)]
+        return NO_WEATHER_DATA
+
+async def get_similar(query: str, headlines: List[str], k: int = 5) -> List[str]:
+    logger.debug(f"Searching for top {k} headlines similar to: '{query}'")
+    # No-op unless the headline snapshot changed since the last call
+    await headline_index.update(headlines)
+    results = await headline_index.search(query, k=k)
     logger.info(f"Found {len(results)} similar documents")
     return results
 
-def evaluate_condition(weather_description: str, news_description: str, news: List[str], weather: str) -> tuple[bool, bool]:
-    logger.debug(f"Evaluating conditions: weather='{weather_description}', news='{news_description}'")
+def condition_key(weather_description: str, news_description: str) -> tuple[str, str]:
+    return " ".join(weather_description.lower().split()), " ".join(news_description.lower().split())
+
+_RESULT_LINE = re.compile(r"(\d+)\W+weathercondition:\W*(true|false)\W+newscondition:\W*(true|false)")
+
+async def evaluate_conditions(conditions: List[tuple[str, str]], relevant_news: dict[str, List[str]], weather: str) -> dict[tuple[str, str], tuple[bool, bool]]:
+    logger.debug(f"Evaluating {len(conditions)} condition(s) in one request: {conditions}")
+
+    blocks = []
+    for i, (weather_description, news_description) in enumerate(conditions, start=1):
+        headlines = relevant_news.get(news_description, [])
+        blocks.append(f"""{i}. Weather condition: {weather_description or 'none'}
+   News condition: {news_description or 'none'}
+   Relevant news headlines:
+{chr(10).join(f"   - {n}" for n in headlines) or "   (none)"}""")
 
     messages = [
         SystemMessage(content="""
 You are an AI condition evaluator for a smart home system.
 
-You will receive two independent conditions:
+You will receive a numbered list of conditions. Each one has two independent parts:
 1. A weather-related condition (e.g. "if temperature > 30°C")
 2. A news-related condition (e.g. "if football match is happening")
 
 You will also receive:
-- A list of recent news headlines
 - A weather forecast report
+- For each condition, a list of relevant news headlines
 
 ❗Your task:
-Evaluate each condition separately.
-Return exactly two lines:
-- `WeatherCondition: True` or `WeatherCondition: False`
-- `NewsCondition: True` or `NewsCondition: False`
+Evaluate each part of each condition separately.
+Return exactly one line per condition, using its number:
+- `<number>: WeatherCondition: True|False, NewsCondition: True|False`
 
 ⚠️ Do NOT explain anything.
 """),
-        HumanMessage(content=f"""Weather condition: {weather_description or 'none'}
-News condition: {news_description or 'none'}
-
-News headlines:
-{chr(10).join(f"- {n}" for n in news)}
+        HumanMessage(content=f"""Weather forecast:
+{weather or 'none'}
 
-Weather forecast:
-{weather}
+Conditions:
+{chr(10).join(blocks)}
 """)
     ]
 
     try:
-        reply = (groq_llm if os.getenv('API_COND') == 'GROQ' else tg_llm).invoke(messages).content.strip().lower()
+        reply = (await condition_llm.ainvoke(messages)).content.strip().lower()
         logger.debug(f"Raw model reply:\n{reply}")
 
-        weather_result = "weathercondition: true" in reply
-        news_result = "newscondition: true" in reply
-
-        logger.info(f"Weather condition result: {weather_result}")
-        logger.info(f"News condition result: {news_result}")
-
-        return weather_result, news_result
+        parsed = {}
+        for line in reply.splitlines():
+            match = _RESULT_LINE.search(line)
+            if match:
+                parsed[int(match[1])] = (match[2] == "true", match[3] == "true")
+
+        results = {}
+        for i, condition in enumerate(conditions, start=1):
+            if i not in parsed:
+                logger.warning(f"No result for condition {i} {condition} in model reply")
+                continue
+            results[condition] = parsed[i]
+            logger.info(f"Condition {condition} result: weather={parsed[i][0]}, news={parsed[i][1]}")
+
+        return results
     except Exception as e:
         logger.error(f"Error during condition evaluation: {e}")
-        return False, False
-
-def handle_condition(weather_description: str, news_description: str, headlines, weather_report) -> tuple[bool, bool]:
-    logger.info(f"Handling condition — weather: '{weather_description}', news: '{news_description}'")
+        return {}
+
+async def handle_conditions(conditions: List[tuple[str, str]], headlines, weather_report) -> dict[tuple[str, str], tuple[bool, bool]]:
+    """Resolve all (weather, news) conditions of a command with a single LLM call.
+
+    Results are keyed by condition_key, so identical conditions are only evaluated once.
+    """
+    unique = list(dict.fromkeys(condition_key(w, n) for w, n in conditions))
+    logger.info(f"Handling {len(conditions)} condition(s), {len(unique)} unique: {unique}")
+
+    news_queries = list(dict.fromkeys(n for _, n in unique if n))
+    relevant_news = dict(zip(news_queries, await asyncio.gather(
+        *(get_similar(n, headlines) for n in news_queries)
+    )))
+
+    # Without headlines (e.g. NewsAPI is down) a news condition can't be confirmed, so it is not met;
+    # the evaluator isn't asked to guess and the result isn't cached
+    results = {condition: (not condition[0], False) for condition in unique if condition[1] and not relevant_news[condition[1]]}
+    if results:
+        logger.warning(f"No headlines to check {len(results)} news condition(s) against, treating them as not met")
+
+    keys = {}
+    for condition in unique:
+        if condition in results:
+            continue
+        keys[condition] = condition_cache.make_key(condition, relevant_news.get(condition[1], []), weather_report)
+        cached = condition_cache.get(keys[condition])
+        if cached is not None:
+            results[condition] = cached
+
+    pending = [condition for condition in unique if condition not in results]
+    if len(keys) > len(pending):
+        logger.info(f"Reusing {len(keys) - len(pending)} cached condition result(s)")
+
+    if pending:
+        evaluated = await evaluate_conditions(pending, relevant_news, weather_report)
+        for condition in pending:
+            if condition in evaluated:
+                condition_cache.put(keys[condition], evaluated[condition])
+            # Unanswered conditions count as not met and are not cached
+            results[condition] = evaluated.get(condition, (False, False))
 
-    relevant_news = []
-    if len(news_description) > 0:
-        vector_store = build_vector_store(headlines)
-        relevant_news = get_similar(news_description, vector_store)
-
-    cond = True
-    if len(weather_report) > 0 or len(relevant_news) > 0:
-        cond = evaluate_condition(weather_description, news_description, relevant_news, weather_report)
-
-    return cond
+    return results
@@ -0,0 +1,186 @@
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime
+
+from conditional_agent import fetch_headlines, fetch_weather, headline_index, NO_WEATHER_DATA
+from condition_cache import condition_cache
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/context_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+NEWS_TTL_SECONDS = float(os.getenv("NEWS_TTL_SECONDS", "900"))
+WEATHER_TTL_SECONDS = float(os.getenv("WEATHER_TTL_SECONDS", "1800"))
+# A failed fetch keeps the previous snapshot but is retried sooner than the TTL
+RETRY_SECONDS = float(os.getenv("CONTEXT_RETRY_SECONDS", "60"))
+
+
+class CachedSource:
+    """A single stale-while-revalidate snapshot (headlines or weather).
+
+    Readers get the current snapshot immediately, even when it is past its
+    TTL; an expired snapshot only triggers a refresh in the background.
+    Readers block only while the very first snapshot is being fetched.
+    """
+
+    def __init__(self, name: str, fetch, ttl: float, is_valid):
+        self.name = name
+        self.ttl = ttl
+        self._fetch = fetch
+        self._is_valid = is_valid
+        self._refresh_task: asyncio.Task | None = None
+        self._listeners = []
+
+        self.value = None
+        self.fetched_at: float | None = None
+        self.expires_at = 0.0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.errors = 0
+        self.last_fetch_ms = 0.0
+        self.total_fetch_ms = 0.0
+
+    def add_listener(self, callback):
+        """Register a callback (sync or async) called with each new valid snapshot."""
+        self._listeners.append(callback)
+
+    def is_stale(self) -> bool:
+        return time.time() >= self.expires_at
+
+    async def get(self):
+        if self.fetched_at is None:
+            self.misses += 1
+            logger.info(f"🕳️ No {self.name} snapshot yet, fetching on the request path")
+            await self.refresh()
+        else:
+            self.hits += 1
+            if self.is_stale():
+                self.stale_hits += 1
+                self.refresh_in_background()
+        return self.value
+
+    def refresh_in_background(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def refresh(self):
+        # Shielded so a cancelled request doesn't abort a refresh other readers wait on
+        await asyncio.shield(self.refresh_in_background())
+
+    async def _refresh(self):
+        start = time.perf_counter()
+        value = await self._fetch()
+        self.last_fetch_ms = (time.perf_counter() - start) * 1000
+        self.total_fetch_ms += self.last_fetch_ms
+        self.refreshes += 1
+
+        if self._is_valid(value):
+            self.value = value
+            self.fetched_at = time.time()
+            self.expires_at = self.fetched_at + self.ttl
+            logger.info(f"🔄 Refreshed {self.name} in {self.last_fetch_ms:.0f} ms")
+            for callback in self._listeners:
+                try:
+                    result = callback(value)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.exception(f"❌ {self.name} refresh listener failed: {e}")
+            return
+
+        self.errors += 1
+        self.expires_at = time.time() + min(self.ttl, RETRY_SECONDS)
+        if self.fetched_at is None:
+            # Nothing better to serve; keep the fallback so requests stop blocking
+            self.value = value
+            self.fetched_at = time.time()
+        logger.warning(f"⚠️ Refreshing {self.name} failed, serving previous snapshot")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(max(0.0, self.expires_at - time.time()))
+            try:
+                await self.refresh()
+            except Exception as e:
+                self.errors += 1
+                self.expires_at = time.time() + RETRY_SECONDS
+                logger.exception(f"❌ Background refresh of {self.name} failed: {e}")
+
+    def stats(self) -> dict:
+        now = time.time()
+        return {
+            "ttl_seconds": self.ttl,
+            "last_refresh": datetime.fromtimestamp(self.fetched_at).isoformat() if self.fetched_at else None,
+            "age_seconds": round(now - self.fetched_at, 1) if self.fetched_at else None,
+            "stale": self.is_stale(),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+            "last_fetch_ms": round(self.last_fetch_ms, 1),
+            "avg_fetch_ms": round(self.total_fetch_ms / self.refreshes, 1) if self.refreshes else None,
+        }
+
+
+class ContextCache:
+    def __init__(self):
+        self.headlines = CachedSource(
+            "headlines",
+            lambda: fetch_headlines(os.getenv("NEWS_API_KEY")),
+            NEWS_TTL_SECONDS,
+            is_valid=lambda headlines: bool(headlines)
+        )
+        self.weather = CachedSource(
+            "weather",
+            lambda: fetch_weather(os.getenv("OPENWEATHER_API_KEY")),
+            WEATHER_TTL_SECONDS,
+            is_valid=lambda report: report != NO_WEATHER_DATA
+        )
+        self._tasks: list[asyncio.Task] = []
+
+    async def get_headlines(self) -> list[str]:
+        return await self.headlines.get()
+
+    async def get_weather(self) -> str:
+        return await self.weather.get()
+
+    def start(self):
+        self._tasks = [asyncio.create_task(source.run()) for source in (self.headlines, self.weather)]
+        logger.info(f"📰 Context refresh started (news TTL {self.headlines.ttl:.0f}s, weather TTL {self.weather.ttl:.0f}s)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "headlines": {**self.headlines.stats(), "count": len(self.headlines.value or [])},
+            "weather": self.weather.stats(),
+        }
+
+
+context_cache = ContextCache()
+# Embed new headlines as soon as they arrive instead of on the first query
+context_cache.headlines.add_listener(headline_index.update)
+# Results evaluated against the old snapshot can never hit again; free them
+context_cache.headlines.add_listener(lambda _: condition_cache.invalidate("news"))
+context_cache.weather.add_listener(lambda _: condition_cache.invalidate("weather"))
@@ -0,0 +1,209 @@
+import os
+import json
+import time
+import asyncio
+import itertools
+import logging
+from collections import deque
+
+from task_db import TaskStore
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/device_state.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Changes are collected for this long before they are written to SQLite in one transaction
+DEVICE_FLUSH_SECONDS = float(os.getenv("DEVICE_FLUSH_SECONDS", "1"))
+# Change events kept for resuming streams; a client further behind gets a full snapshot
+DEVICE_EVENT_BACKLOG = int(os.getenv("DEVICE_EVENT_BACKLOG", "1000"))
+# Idle streams get a comment line this often so proxies keep them open
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+
+
+class DeviceStates:
+    """Authoritative in-process map of device statuses.
+
+    Loaded once from the device_status table at startup and served from
+    memory afterwards. Every change bumps a monotonic version; changes are
+    written back to SQLite in write-behind batches, and flushed one last
+    time on shutdown. The ETag combines the version with the load time, so
+    a version seen before a restart never matches one issued after it.
+
+    Each change is also published as a server-sent event whose id is that
+    same (load time, version) cursor. Events are encoded once and kept in a
+    bounded backlog that every subscriber reads from, and all subscribers
+    wait on one shared asyncio.Event, so a change costs the same no matter
+    how many streams are open.
+    """
+
+    def __init__(self, store: TaskStore, flush_interval: float = DEVICE_FLUSH_SECONDS):
+        self.store = store
+        self.flush_interval = flush_interval
+        self._states: dict[str, str] = {}
+        self._dirty: set[str] = set()
+        self._changed = asyncio.Event()
+        self._flush_task: asyncio.Task | None = None
+        self._epoch = 0
+        self.version = 0
+        self._events: deque[tuple[int, str]] = deque(maxlen=DEVICE_EVENT_BACKLOG)
+        self._published = asyncio.Event()
+        self.subscribers = 0
+
+        self.reads = 0
+        self.not_modified = 0
+        self.updates = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.resyncs = 0
+
+    async def load(self):
+        statuses = await self.store.get_all_device_statuses()
+        self._epoch = int(time.time())
+        self._states = dict(statuses)
+        logger.info(f"📥 Loaded {len(self._states)} device status(es) into memory.")
+        return self
+
+    def cursor(self, version: int | None = None) -> str:
+        return f"{self._epoch:x}-{self.version if version is None else version}"
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.cursor()}"'
+
+    def all(self) -> dict[str, str]:
+        self.reads += 1
+        return dict(self._states)
+
+    def update(self, statuses: dict[str, str]):
+        """Apply status changes at once under one new version and queue them for writing."""
+        changed = {
+            device_name: status for device_name, status in statuses.items()
+            if device_name in self._states and self._states[device_name] != status
+        }
+        unknown = set(statuses) - set(self._states)
+        if unknown:
+            logger.warning(f"⚠️ Ignoring status for unknown device(s): {sorted(unknown)}")
+        if not changed:
+            return
+
+        self.version += 1
+        self._states.update(changed)
+        self._dirty.update(changed)
+        self._changed.set()
+        self.updates += 1
+        logger.info(f"🔧 Device status version {self.version}: {changed}")
+        self._publish("change", changed)
+
+    def _publish(self, event: str, data: dict):
+        self._events.append((self.version, self._frame(event, data)))
+        # Wake every waiting stream at once, then arm a fresh event for the next change
+        published, self._published = self._published, asyncio.Event()
+        published.set()
+
+    def _frame(self, event: str, data: dict) -> str:
+        return f"id: {self.cursor()}\nevent: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+    def _resume_version(self, last_event_id: str | None) -> int | None:
+        """The version a client has seen, or None if it needs a full snapshot."""
+        epoch, _, version = (last_event_id or "").partition("-")
+        if epoch != f"{self._epoch:x}" or not version.isdigit():
+            return None
+        version = int(version)
+        oldest = self._events[0][0] if self._events else self.version + 1
+        if version > self.version or version < oldest - 1:
+            return None
+        return version
+
+    async def stream(self, last_event_id: str | None = None, heartbeat: float = STREAM_HEARTBEAT_SECONDS):
+        """Server-sent events: a snapshot (unless resuming), then one event per change.
+
+        A subscriber that falls more than DEVICE_EVENT_BACKLOG changes behind
+        gets a fresh snapshot instead of the events it can no longer read.
+        """
+        self.subscribers += 1
+        try:
+            seen = self._resume_version(last_event_id)
+            if seen is None:
+                seen = self.version
+                yield self._frame("snapshot", self.all())
+            while True:
+                published = self._published
+                if seen < self.version and seen < self._events[0][0] - 1:
+                    # Fell further behind than the backlog reaches; start over from a snapshot
+                    self.resyncs += 1
+                    seen = self.version
+                    yield self._frame("snapshot", self.all())
+                    continue
+                if seen < self.version:
+                    # Walk back from the newest event only as far as this client has read
+                    frames = list(itertools.takewhile(lambda event: event[0] > seen, reversed(self._events)))
+                    seen = self.version
+                    yield "".join(frame for _, frame in reversed(frames))
+                    continue
+                try:
+                    await asyncio.wait_for(published.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.subscribers -= 1
+
+    async def flush(self):
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        batch = {device_name: self._states[device_name] for device_name in dirty}
+        try:
+            await self.store.set_device_statuses(batch)
+        except Exception:
+            # Keep them queued for the next flush; anything changed since wins
+            self._dirty |= dirty
+            self.flush_errors += 1
+            raise
+        self.flushes += 1
+
+    async def _run(self):
+        while True:
+            await self._changed.wait()
+            # Let a burst of changes accumulate into one transaction
+            await asyncio.sleep(self.flush_interval)
+            self._changed.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                self._changed.set()
+                logger.exception(f"❌ Writing device statuses failed: {e}")
+
+    def start(self):
+        self._flush_task = asyncio.create_task(self._run())
+        logger.info(f"💾 Device status write-behind started (every {self.flush_interval:g}s).")
+
+    async def stop(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "devices": len(self._states),
+            "version": self.version,
+            "reads": self.reads,
+            "not_modified": self.not_modified,
+            "updates": self.updates,
+            "subscribers": self.subscribers,
+            "resyncs": self.resyncs,
+            "pending_writes": len(self._dirty),
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+        }
@@ -0,0 +1,219 @@
+import re
+import time
+import logging
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/fast_path.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Same rooms/devices as the agent system prompt and task_db.init_db
+LAMP_ROOMS = ["kitchen", "bathroom", "room1", "room2"]
+AC_ROOMS = ["room1", "kitchen"]
+TV_ROOMS = ["livingroom"]
+
+DEVICE_WORDS = {
+    "lamp": "lamp", "lamps": "lamp", "light": "lamp", "lights": "lamp",
+    "ac": "ac", "acs": "ac",
+    "tv": "tv", "tvs": "tv",
+    "cooler": "cooler", "coolers": "cooler",
+}
+ROOM_WORDS = {"kitchen", "bathroom", "room1", "room2", "livingroom"}
+ALL_WORDS = {"all", "every", "both"}
+EVERYTHING_WORDS = {"everything", "devices"}
+FILLER_WORDS = {
+    "turn", "switch", "shut", "power", "put", "set", "reset", "please", "can", "could", "would", "you",
+    "the", "a", "an", "in", "of", "to", "my", "and", "then", "also", "too", "device",
+}
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "fifteen": 15, "twenty": 20, "thirty": 30,
+}
+_NUMBER = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+
+
+def _in_time(match) -> str | None:
+    n = NUMBER_WORDS.get(match[1]) or int(match[1])
+    if n == 0:
+        return None
+    return f"in {n} {match[2]}{'s' if n != 1 else ''}"
+
+
+def _at_time(match) -> str | None:
+    hour, minute = re.match(r"(\d+):?(\d*)", match[2]).groups()
+    hour, minute = int(hour), int(minute or 0)
+    # 1-12 with am/pm, 0-23 without
+    if minute > 59 or (not 1 <= hour <= 12 if match[4] else hour > 23):
+        return None
+    return f"{match[1] or ''}at {match[2]}"
+
+
+# Only times dateparser resolves reliably; "at 9" without am/pm falls back to the LLM.
+# A render returning None marks an impossible time ("at 13 pm", "in 0 hours").
+TIME_PATTERNS = [
+    (re.compile(r"\b(right now|immediately|now)\b"), lambda m: "now"),
+    (re.compile(rf"\bin {_NUMBER} (second|minute|hour)s?\b"), _in_time),
+    (re.compile(r"\b(tomorrow )?at (\d{1,2}(:\d{2})? ?(am|pm)|\d{1,2}:\d{2})\b"), _at_time),
+]
+
+
+def normalize(text: str) -> str:
+    text = text.lower()
+    text = re.sub(r"\broom (\d)\b", r"room\1", text)
+    text = re.sub(r"\bliving ?room\b", "livingroom", text)
+    text = re.sub(r"\b(a/c|a\.c\.?|air ?conditioners?)\b", "ac", text)
+    text = re.sub(r"\btelevision\b", "tv", text)
+    text = re.sub(r"\b(\d{1,2}) ?([ap])\.?m\.?", r"\1 \2m", text)
+    text = re.sub(r"[^a-z0-9:]+", " ", text)
+    return " ".join(text.split())
+
+
+def _extract_time(text: str) -> tuple[str, str] | None:
+    """Pull the single time expression out of the text. None if there is more than one or it is invalid."""
+    found = []
+    for pattern, render in TIME_PATTERNS:
+        for match in pattern.finditer(text):
+            found.append(render(match))
+        text = pattern.sub(" ", text)
+    if len(found) > 1 or None in found:
+        return None
+    return (found[0] if found else "now"), " ".join(text.split())
+
+
+def _targets(device: str | None, rooms: list[str], every: bool) -> list[tuple[str, str]] | None:
+    if device == "lamp":
+        valid = LAMP_ROOMS
+    elif device == "ac":
+        valid = AC_ROOMS
+    elif device in ("tv", "cooler"):
+        # Single devices; only the TV has a room to name
+        if any(room not in (TV_ROOMS if device == "tv" else []) for room in rooms):
+            return None
+        return [(device, "")]
+    else:
+        return None
+
+    if every and not rooms:
+        return [(device, room) for room in valid]
+    if not rooms or any(room not in valid for room in rooms):
+        return None
+    return [(device, room) for room in rooms]
+
+
+def parse_command(prompt: str) -> list[dict] | None:
+    """Parse an unambiguous on/off command into LLM-style tool calls.
+
+    Returns None for anything that needs the LLM: conditions, news/weather
+    questions, unknown words, devices without a room, invalid rooms or
+    times, or a clause with both "on" and "off".
+    """
+    extracted = _extract_time(normalize(prompt))
+    if extracted is None:
+        return None
+    time_description, text = extracted
+
+    # Split into clauses; a clause can name rooms, a device, or both
+    clauses = [clause.split() for clause in re.split(r"\band\b|\bthen\b", text) if clause.strip()]
+    if not clauses:
+        return None
+
+    targets: list[tuple[str, str, str]] = []
+    action = None
+    pending_rooms: list[str] = []
+    last_device = None
+    for words in clauses:
+        device, rooms, every, everything = None, [], False, False
+        clause_action = None
+        for word in words:
+            if word in ("on", "off"):
+                if clause_action and clause_action != word:
+                    return None
+                action = clause_action = word
+            elif word in DEVICE_WORDS:
+                if device and device != DEVICE_WORDS[word]:
+                    return None
+                device = DEVICE_WORDS[word]
+            elif word in ROOM_WORDS:
+                rooms.append(word)
+            elif word in ALL_WORDS:
+                every = True
+            elif word in EVERYTHING_WORDS:
+                everything = True
+            elif word not in FILLER_WORDS:
+                logger.debug(f"Fast path: unknown word '{word}' in '{prompt}'")
+                return None
+
+        if everything:
+            if device or rooms:
+                return None
+            clause_targets = [(d, r) for d in ("lamp", "ac") for r in (LAMP_ROOMS if d == "lamp" else AC_ROOMS)]
+            clause_targets += [("cooler", ""), ("tv", "")]
+        elif device is None:
+            # "kitchen and bathroom lamps" / "the lamps in the kitchen and bathroom"
+            if not rooms or every:
+                return None
+            if last_device:
+                clause_targets = _targets(last_device, rooms, False)
+            else:
+                pending_rooms.extend(rooms)
+                continue
+        else:
+            clause_targets = _targets(device, pending_rooms + rooms, every)
+            pending_rooms = []
+            last_device = device
+
+        if clause_targets is None or action is None:
+            return None
+        targets.extend((d, r, action) for d, r in clause_targets)
+
+    if pending_rooms or not targets:
+        return None
+
+    calls = []
+    for device, room, act in dict.fromkeys(targets):
+        if device in ("lamp", "ac"):
+            args = {"room": room, "action": act, "time_description": time_description}
+        else:
+            args = {"action": act, "weather_description": "", "news_description": "", "time_description": time_description}
+        calls.append({"name": f"control_{device}", "args": args})
+    return calls
+
+
+class FastPath:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.total_ms = 0.0
+
+    def match(self, prompt: str) -> list[dict] | None:
+        start = time.perf_counter()
+        calls = parse_command(prompt)
+        self.total_ms += (time.perf_counter() - start) * 1000
+        if calls is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        logger.info(f"⚡ Fast path matched '{prompt}' → {len(calls)} call(s)")
+        return calls
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "fallbacks": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "avg_parse_ms": round(self.total_ms / lookups, 3) if lookups else None,
+        }
+
+
+fast_path = FastPath()
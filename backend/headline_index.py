@@ -0,0 +1,155 @@
+import os
+import time
+import asyncio
+import logging
+from functools import lru_cache
+from typing import List
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/headline_index.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Vectors of headlines that dropped out of the feed are kept this long in case they return
+HEADLINE_MAX_AGE_SECONDS = float(os.getenv("HEADLINE_MAX_AGE_SECONDS", "86400"))
+
+
+class HeadlineIndex:
+    """Long-lived embedding index over the current headline snapshot.
+
+    Vectors are cached by headline text, so a refresh only embeds headlines
+    that are new since the previous one. The FAISS store is rebuilt from the
+    cached vectors whenever the set of headlines changes.
+    """
+
+    def __init__(self, embeddings, path: str | None = None, max_age: float = HEADLINE_MAX_AGE_SECONDS):
+        self.embeddings = embeddings
+        self.path = path
+        self.max_age = max_age
+        self.model_name = getattr(embeddings, "model_name", type(embeddings).__name__)
+
+        self._vectors: dict[str, np.ndarray] = {}
+        self._last_seen: dict[str, float] = {}
+        self._current: tuple[str, ...] = ()
+        self._store = None
+        self._lock = asyncio.Lock()
+        self._embed_query = lru_cache(maxsize=256)(self._embed_query_uncached)
+
+        self.embedded = 0
+        self.reused = 0
+        self.evicted = 0
+        self.queries = 0
+
+        if path:
+            self._load()
+
+    def __len__(self):
+        return len(self._current)
+
+    async def update(self, headlines: List[str]):
+        headlines = tuple(dict.fromkeys(h for h in headlines if h))
+        if headlines == self._current:
+            return
+
+        async with self._lock:
+            if headlines == self._current:
+                return
+
+            new = [h for h in headlines if h not in self._vectors]
+            if new:
+                vectors = await asyncio.to_thread(self.embeddings.embed_documents, new)
+                for text, vector in zip(new, vectors):
+                    self._vectors[text] = np.asarray(vector, dtype=np.float32)
+            self.embedded += len(new)
+            self.reused += len(headlines) - len(new)
+
+            now = time.time()
+            for text in headlines:
+                self._last_seen[text] = now
+            expired = [t for t, seen in self._last_seen.items() if now - seen > self.max_age]
+            for text in expired:
+                self._vectors.pop(text, None)
+                self._last_seen.pop(text, None)
+            self.evicted += len(expired)
+
+            self._store = await asyncio.to_thread(self._build_store, headlines)
+            self._current = headlines
+            logger.info(f"🗂️ Headline index updated: {len(new)} embedded, {len(headlines) - len(new)} reused, {len(expired)} evicted")
+
+            if self.path:
+                await asyncio.to_thread(self._save)
+
+    def _build_store(self, headlines: tuple[str, ...]):
+        if not headlines:
+            return None
+        return FAISS.from_embeddings(
+            text_embeddings=[(text, self._vectors[text].tolist()) for text in headlines],
+            embedding=self.embeddings
+        )
+
+    def _embed_query_uncached(self, query: str) -> tuple[float, ...]:
+        return tuple(self.embeddings.embed_query(query))
+
+    async def search(self, query: str, k: int = 5) -> List[str]:
+        store = self._store
+        if store is None:
+            return []
+        self.queries += 1
+        vector = await asyncio.to_thread(self._embed_query, query)
+        docs = await asyncio.to_thread(store.similarity_search_by_vector, list(vector), k)
+        return [doc.page_content for doc in docs]
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with np.load(self.path) as data:
+                if str(data["model"]) != self.model_name:
+                    logger.info(f"Ignoring headline index at {self.path}: built with {data['model']}")
+                    return
+                for text, vector, seen in zip(data["texts"], data["vectors"], data["last_seen"]):
+                    self._vectors[str(text)] = vector
+                    self._last_seen[str(text)] = float(seen)
+            logger.info(f"📂 Loaded {len(self._vectors)} headline vectors from {self.path}")
+        except Exception as e:
+            logger.error(f"Failed to load headline index from {self.path}: {e}")
+
+    def _save(self):
+        texts = list(self._vectors)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    model=np.array(self.model_name),
+                    texts=np.array(texts, dtype=str),
+                    vectors=np.stack([self._vectors[t] for t in texts]) if texts else np.zeros((0, 0), dtype=np.float32),
+                    last_seen=np.array([self._last_seen.get(t, 0.0) for t in texts])
+                )
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Failed to persist headline index to {self.path}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "indexed": len(self._current),
+            "cached_vectors": len(self._vectors),
+            "embedded": self.embedded,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "queries": self.queries,
+            "query_cache_hits": self._embed_query.cache_info().hits,
+            "persisted_to": self.path,
+        }
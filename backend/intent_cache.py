@@ -0,0 +1,184 @@
+import os
+import re
+import copy
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+
+import numpy as np
+
+from conditional_agent import embeddings
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/intent_cache.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+INTENT_CACHE_SIZE = int(os.getenv("INTENT_CACHE_SIZE", "512"))
+INTENT_CACHE_THRESHOLD = float(os.getenv("INTENT_CACHE_THRESHOLD", "0.9"))
+
+# Words that change what a command does. Two prompts only match semantically
+# when they agree on all of these, so "lamp on" never replays "lamp off".
+SLOT_SYNONYMS = {
+    "lamp": "lamp", "lamps": "lamp", "light": "lamp", "lights": "lamp",
+    "ac": "ac", "acs": "ac", "conditioner": "ac", "conditioning": "ac",
+    "tv": "tv", "television": "tv",
+    "cooler": "cooler",
+    "kitchen": "kitchen", "bathroom": "bathroom", "living": "living",
+    "room1": "room1", "room2": "room2",
+    "on": "on", "off": "off",
+    "all": "all", "every": "all", "everything": "all",
+    "am": "am", "pm": "pm", "noon": "noon", "midnight": "midnight",
+    "second": "second", "seconds": "second", "minute": "minute", "minutes": "minute",
+    "hour": "hour", "hours": "hour", "tomorrow": "tomorrow", "tonight": "tonight",
+    "morning": "morning", "evening": "evening",
+    "half": "half", "quarter": "quarter", "couple": "couple", "few": "few",
+    "not": "not", "no": "not", "never": "not", "dont": "not",
+}
+# Spelled-out numbers become digits, so "in two hours" and "in three hours" differ
+NUMBER_WORDS = {
+    word: str(i) for i, word in enumerate([
+        "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+        "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen", "seventeen", "eighteen", "nineteen", "twenty",
+    ])
+} | {"thirty": "30", "forty": "40", "fifty": "50", "sixty": "60", "ninety": "90"}
+STOP_WORDS = {"please", "can", "could", "you", "would", "the", "a", "an"}
+CONTROL_TOOLS = {"control_lamp", "control_ac", "control_tv", "control_cooler"}
+
+
+def normalize_prompt(prompt: str) -> str:
+    text = prompt.lower().replace("room 1", "room1").replace("room 2", "room2")
+    # "don't" → "do not" rather than "don t", so negations stay a slot
+    text = re.sub(r"n['’]t\b", " not", text)
+    text = re.sub(r"['’]", "", text)
+    words = re.sub(r"[^a-z0-9: ]+", " ", text).split()
+    return " ".join(NUMBER_WORDS.get(w, w) for w in words if w not in STOP_WORDS)
+
+
+def extract_slots(normalized: str) -> frozenset:
+    return frozenset(
+        SLOT_SYNONYMS.get(word, word)
+        for word in normalized.split()
+        if word in SLOT_SYNONYMS or any(ch.isdigit() for ch in word)
+    )
+
+
+def _replay_safe(calls: list[tuple[str, dict]]) -> bool:
+    # Conditions and info queries carry free text copied from the prompt,
+    # so only plain device commands may be reused for a differently worded prompt
+    return all(
+        fn_name in CONTROL_TOOLS
+        and not args.get("weather_description", "").strip()
+        and not args.get("news_description", "").strip()
+        for fn_name, args in calls
+    )
+
+
+class IntentEntry:
+    def __init__(self, prompt: str, calls: list[tuple[str, dict]], slots: frozenset, vector, llm_ms: float):
+        self.prompt = prompt
+        self.calls = calls
+        self.slots = slots
+        self.vector = vector
+        self.llm_ms = llm_ms
+
+
+class IntentCache:
+    """Prompt → validated tool-call cache in front of the tool-calling LLM.
+
+    Lookups try the exact normalized prompt first, then the nearest cached
+    prompt by MiniLM cosine similarity. Only the tool calls are cached; time
+    descriptions stay relative and are re-resolved when the calls are replayed.
+    """
+
+    def __init__(self, embeddings, threshold: float = INTENT_CACHE_THRESHOLD, max_size: int = INTENT_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_size = max_size
+        self._entries: OrderedDict[str, IntentEntry] = OrderedDict()
+        self._matrix = None
+        self._matrix_keys: list[str] = []
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+        self.lookup_ms = 0.0
+
+    async def _embed(self, text: str):
+        vector = np.asarray(await asyncio.to_thread(self.embeddings.embed_query, text), dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def _semantic_matrix(self):
+        if self._matrix is None:
+            self._matrix_keys = [key for key, entry in self._entries.items() if entry.vector is not None]
+            self._matrix = np.stack([self._entries[key].vector for key in self._matrix_keys]) if self._matrix_keys else None
+        return self._matrix
+
+    async def lookup(self, prompt: str) -> list[tuple[str, dict]] | None:
+        start = time.perf_counter()
+        key = normalize_prompt(prompt)
+        entry = self._entries.get(key)
+        kind = "exact"
+
+        matrix, matrix_keys = self._semantic_matrix(), self._matrix_keys
+        if entry is None and matrix is not None:
+            vector = await self._embed(key)
+            scores = matrix @ vector
+            best = int(np.argmax(scores))
+            candidate = self._entries.get(matrix_keys[best])
+            if candidate and scores[best] >= self.threshold and candidate.slots == extract_slots(key):
+                entry, kind = candidate, f"semantic ({scores[best]:.3f})"
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.lookup_ms += elapsed_ms
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(normalize_prompt(entry.prompt))
+        if kind == "exact":
+            self.exact_hits += 1
+        else:
+            self.semantic_hits += 1
+        self.saved_ms += max(0.0, entry.llm_ms - elapsed_ms)
+        logger.info(f"🎯 Intent cache {kind} hit: '{prompt}' → '{entry.prompt}'")
+        return copy.deepcopy(entry.calls)
+
+    async def store(self, prompt: str, calls: list[tuple[str, dict]], llm_ms: float):
+        if not calls:
+            return
+        key = normalize_prompt(prompt)
+        vector = await self._embed(key) if _replay_safe(calls) else None
+        self._entries[key] = IntentEntry(prompt, copy.deepcopy(calls), extract_slots(key), vector, llm_ms)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+        self._matrix = None
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "threshold": self.threshold,
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 3) if lookups else None,
+            "saved_ms": round(self.saved_ms, 1),
+            "avg_lookup_ms": round(self.lookup_ms / lookups, 2) if lookups else None,
+        }
+
+
+intent_cache = IntentCache(embeddings)
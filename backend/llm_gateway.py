@@ -0,0 +1,352 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/llm_gateway.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# In-flight requests per provider; also the size of its keep-alive pool
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# Send the same request to the other provider if the first hasn't answered by then (0 = never)
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "1500"))
+# A provider that just failed (e.g. 429) is only used as a fallback for this long
+LLM_COOLDOWN_SECONDS = float(os.getenv("LLM_COOLDOWN_SECONDS", "30"))
+# Route away from the preferred provider once it is this many times slower than the other
+LLM_SLOWER_FACTOR = float(os.getenv("LLM_SLOWER_FACTOR", "2"))
+# Latency older than this no longer steers routing, so a provider routed away from gets tried again
+LLM_LATENCY_TTL_SECONDS = float(os.getenv("LLM_LATENCY_TTL_SECONDS", "60"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+
+# Weight of the newest sample in a provider's latency average
+LATENCY_EWMA_ALPHA = 0.2
+
+PROVIDERS = {
+    "TOGETHER": dict(
+        model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
+        base_url="https://api.together.xyz/v1",
+        api_key_env="TOGETHER_API_KEY",
+    ),
+    "GROQ": dict(
+        model="llama3-70b-8192",
+        base_url="https://api.groq.com/openai/v1",
+        api_key_env="GROQ_API_KEY",
+    ),
+}
+
+# Each role picks its preferred provider with its own variable, as before
+ROLE_PREFERENCE_ENV = {
+    "agent": "API_AGENT",
+    "condition": "API_COND",
+    "response": "API_RES",
+}
+
+
+def preferred_provider(role: str) -> str:
+    return "GROQ" if os.getenv(ROLE_PREFERENCE_ENV.get(role, ""), "") == "GROQ" else "TOGETHER"
+
+
+def percentile(values, q: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 1)
+
+
+class Provider:
+    """One LLM endpoint: its client, a concurrency limit and its recent health."""
+
+    def __init__(self, name: str, llm, max_concurrency: int = LLM_MAX_CONCURRENCY, cooldown_seconds: float = LLM_COOLDOWN_SECONDS,
+                 http_client: httpx.AsyncClient | None = None):
+        self.name = name
+        self.llm = llm
+        self.cooldown_seconds = cooldown_seconds
+        self.http_client = http_client
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.latency_ms: float | None = None
+        self.latency_at = 0.0
+        self.cooldown_until = 0.0
+        self.last_error: str | None = None
+
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() < self.cooldown_until
+
+    @property
+    def recent_latency_ms(self) -> float | None:
+        """The latency average, unless no call has updated it for LLM_LATENCY_TTL_SECONDS."""
+        if time.monotonic() - self.latency_at > LLM_LATENCY_TTL_SECONDS:
+            return None
+        return self.latency_ms
+
+    def _record_latency(self, ms: float):
+        self.latency_ms = ms if self.latency_ms is None else (1 - LATENCY_EWMA_ALPHA) * self.latency_ms + LATENCY_EWMA_ALPHA * ms
+        self.latency_at = time.monotonic()
+
+    async def ainvoke(self, llm, messages, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.calls += 1
+            start = time.perf_counter()
+            try:
+                result = await llm.ainvoke(messages, **kwargs)
+            except asyncio.CancelledError:
+                # Usually the losing side of a hedge; it took at least this long
+                ms = (time.perf_counter() - start) * 1000
+                if self.latency_ms is None or ms > self.latency_ms:
+                    self._record_latency(ms)
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.cooldown_until = time.monotonic() + self.cooldown_seconds
+                raise
+            finally:
+                self.in_flight -= 1
+            self._record_latency((time.perf_counter() - start) * 1000)
+            return result
+
+    async def astream(self, llm, messages, **kwargs):
+        async with self._semaphore:
+            self.in_flight += 1
+            self.calls += 1
+            try:
+                async for chunk in llm.astream(messages, **kwargs):
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+                self.cooldown_until = time.monotonic() + self.cooldown_seconds
+                raise
+            finally:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "avg_latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "cooling_down": self.cooling_down,
+            "last_error": self.last_error,
+        }
+
+
+class RoleStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.failovers = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.served_by: dict[str, int] = {}
+        self._latency_ms: deque[float] = deque(maxlen=1000)
+        self._first_token_ms: deque[float] = deque(maxlen=1000)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "served_by": self.served_by,
+            "p50_ms": percentile(self._latency_ms, 0.5),
+            "p95_ms": percentile(self._latency_ms, 0.95),
+            "p50_first_token_ms": percentile(self._first_token_ms, 0.5),
+            "p95_first_token_ms": percentile(self._first_token_ms, 0.95),
+        }
+
+
+class LLMGateway:
+    """Every LLM call goes through here, whichever agent makes it.
+
+    Providers share one pooled HTTP client each instead of one per agent.
+    A call goes to the role's preferred provider unless that provider is
+    cooling down after an error or has recently been much slower than the
+    other; latency older than LLM_LATENCY_TTL_SECONDS is ignored, so a
+    provider routed away from is tried again. If the first provider fails,
+    the call fails over to the next; if it is merely slow, the same request
+    is hedged to the next provider after hedge_delay_ms and whichever
+    answers first wins.
+    """
+
+    def __init__(self, providers: dict[str, Provider], hedge_delay_ms: float = LLM_HEDGE_DELAY_MS, preference=preferred_provider):
+        self.providers = providers
+        self.hedge_delay_ms = hedge_delay_ms
+        self._preference = preference
+        self._roles: dict[str, RoleStats] = {}
+
+    def chat(self, role: str) -> "GatewayChat":
+        return GatewayChat(self, role)
+
+    def route(self, role: str) -> list[Provider]:
+        """Providers in the order a call for `role` should try them."""
+        preferred = self._preference(role)
+        providers = sorted(self.providers.values(), key=lambda p: (p.cooling_down, p.name != preferred))
+        first, rest = providers[0], providers[1:]
+        faster = [p for p in rest if not p.cooling_down and p.recent_latency_ms is not None]
+        if first.recent_latency_ms is not None and faster:
+            fastest = min(faster, key=lambda p: p.recent_latency_ms)
+            if first.recent_latency_ms > LLM_SLOWER_FACTOR * fastest.recent_latency_ms:
+                return [fastest] + [p for p in providers if p is not fastest]
+        return providers
+
+    async def ainvoke(self, role: str, llms: dict[str, object], messages, **kwargs):
+        stats = self._roles.setdefault(role, RoleStats())
+        stats.calls += 1
+        order = self.route(role)
+        start = time.perf_counter()
+
+        pending: dict[asyncio.Task, Provider] = {}
+
+        def launch(provider: Provider):
+            pending[asyncio.create_task(provider.ainvoke(llms[provider.name], messages, **kwargs))] = provider
+
+        launch(order[0])
+        remaining = order[1:]
+        hedged = False
+        error: Exception | None = None
+        try:
+            while pending:
+                hedge = self.hedge_delay_ms > 0 and remaining and len(pending) == 1
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_delay_ms / 1000 if hedge else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    stats.hedges += 1
+                    hedged = True
+                    logger.info(f"⏳ {role}: {next(iter(pending.values())).name} slow, hedging to {remaining[0].name}")
+                    launch(remaining.pop(0))
+                    continue
+
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        ms = (time.perf_counter() - start) * 1000
+                        stats._latency_ms.append(ms)
+                        stats.served_by[provider.name] = stats.served_by.get(provider.name, 0) + 1
+                        if hedged and provider is not order[0]:
+                            stats.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+                    logger.warning(f"⚠️ {role}: {provider.name} failed: {error}")
+
+                if not pending and remaining:
+                    stats.failovers += 1
+                    logger.info(f"🔁 {role}: failing over to {remaining[0].name}")
+                    launch(remaining.pop(0))
+        finally:
+            for task in pending:
+                task.cancel()
+
+        stats.errors += 1
+        raise error
+
+    async def astream(self, role: str, llms: dict[str, object], messages, **kwargs):
+        """Stream a reply, failing over to the next provider only until the first chunk.
+
+        Streams aren't hedged: once text has reached the caller it can't be
+        replaced by another provider's reply.
+        """
+        stats = self._roles.setdefault(role, RoleStats())
+        stats.calls += 1
+        start = time.perf_counter()
+        error: Exception | None = None
+        for i, provider in enumerate(self.route(role)):
+            if i:
+                stats.failovers += 1
+                logger.info(f"🔁 {role}: failing over to {provider.name}")
+            started = False
+            try:
+                async for chunk in provider.astream(llms[provider.name], messages, **kwargs):
+                    if not started:
+                        started = True
+                        stats._first_token_ms.append((time.perf_counter() - start) * 1000)
+                    yield chunk
+            except (asyncio.CancelledError, GeneratorExit):
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ {role}: {provider.name} failed while streaming: {e}")
+                if started:
+                    stats.errors += 1
+                    raise
+                error = e
+                continue
+            stats._latency_ms.append((time.perf_counter() - start) * 1000)
+            stats.served_by[provider.name] = stats.served_by.get(provider.name, 0) + 1
+            return
+
+        stats.errors += 1
+        raise error
+
+    def stats(self) -> dict:
+        return {
+            "hedge_delay_ms": self.hedge_delay_ms,
+            "providers": {name: provider.stats() for name, provider in self.providers.items()},
+            "roles": {role: stats.stats() for role, stats in self._roles.items()},
+        }
+
+    async def aclose(self):
+        for provider in self.providers.values():
+            if provider.http_client is not None:
+                await provider.http_client.aclose()
+
+
+class GatewayChat:
+    """Chat model handle for one role, used like a ChatOpenAI (ainvoke, bind_tools)."""
+
+    def __init__(self, gateway: LLMGateway, role: str, llms: dict[str, object] | None = None):
+        self.gateway = gateway
+        self.role = role
+        self.llms = llms or {name: provider.llm for name, provider in gateway.providers.items()}
+
+    def bind_tools(self, tools) -> "GatewayChat":
+        return GatewayChat(self.gateway, self.role, {name: llm.bind_tools(tools) for name, llm in self.llms.items()})
+
+    async def ainvoke(self, messages, **kwargs):
+        return await self.gateway.ainvoke(self.role, self.llms, messages, **kwargs)
+
+    def astream(self, messages, **kwargs):
+        return self.gateway.astream(self.role, self.llms, messages, **kwargs)
+
+
+def make_provider(name: str, model: str, base_url: str, api_key_env: str) -> Provider:
+    # One keep-alive pool per provider, shared by every role
+    http_client = httpx.AsyncClient(
+        proxy=os.getenv("OPENAI_PROXY") or None,
+        timeout=LLM_TIMEOUT_SECONDS,
+        limits=httpx.Limits(max_connections=LLM_MAX_CONCURRENCY, max_keepalive_connections=LLM_MAX_CONCURRENCY),
+    )
+    llm = ChatOpenAI(
+        model=model,
+        base_url=base_url,
+        api_key=os.getenv(api_key_env),
+        http_async_client=http_client,
+        # Failover and hedging replace the client's own retries
+        max_retries=0,
+    )
+    return Provider(name, llm, http_client=http_client)
+
+
+llm_gateway = LLMGateway({name: make_provider(name, **config) for name, config in PROVIDERS.items()})
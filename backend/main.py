@@ -1,17 +1,31 @@
 import asyncio
-import os
+import json
 import logging
-import io
-from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, WebSocket
+from fastapi.responses import StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-import torch
-import torchaudio
 
-from scheduler import handle_user_command, schedule_task, init_db, scheduler_loop, get_all_device_statuses
-from assistant import VoiceAssistant
+# First, so the offline/cache settings apply to every model library imported below
+from model_registry import models, AUDIO_ENABLED
+from scheduler import handle_user_command, stream_user_command, Scheduler
+from task_db import TaskStore, TASK_STATUSES
+from device_state import DeviceStates
+from conditional_agent import close_http_client, headline_index
+from llm_gateway import llm_gateway
+from context_cache import context_cache
+from condition_cache import condition_cache
+from intent_cache import intent_cache
+from fast_path import fast_path
+from response_agent import response_stats
+from tts import stream_speech, tts_stats
+
+if AUDIO_ENABLED:
+    # torch, torchaudio and whisper are only imported by deployments that take voice
+    from assistant import VoiceAssistant, AudioDecodeError
+    from asr_worker import ASRQueueFull
+    from voice_stream import run_voice_session, stream_stats
 
 # --- Setup Logging ---
 logging.basicConfig(
@@ -39,84 +53,122 @@ app.add_middleware(
 class CommandRequest(BaseModel):
     command: str
     response_type: str = "text"
+    # Have the LLM word the reply even for plain device actions (default: RESPONSE_MODE)
+    llm_response: bool | None = None
 
-# --- Startup Events ---
-@app.on_event("startup")
-async def startup_event():
-    logger.info("🚀 Starting up: initializing DB and assistant.")
-    await init_db()
+def get_assistant() -> "VoiceAssistant":
+    """The VoiceAssistant, a 503 while its models load (or when audio is disabled), or a 500 if they failed to."""
+    assistant = getattr(app.state, "assistant", None)
+    if assistant is None:
+        error = getattr(app.state, "assistant_error", None)
+        if error is not None:
+            raise HTTPException(status_code=500, detail=f"Voice input failed to start: {error}")
+        detail = "Voice input is disabled on this server." if not AUDIO_ENABLED else "Speech models are still loading, try again shortly."
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
+    return assistant
 
+async def init_assistant():
     try:
-        app.state.assistant = VoiceAssistant()
+        vad, asr_backend, stream_vads = await asyncio.gather(models.wait("vad"), models.wait("asr"), models.wait("stream_vad"))
+        app.state.assistant = VoiceAssistant(vad, asr_backend, stream_vads)
         logger.info("🧠 VoiceAssistant initialized.")
     except Exception as e:
+        # Reported by get_assistant instead of "still loading" forever
+        app.state.assistant_error = f"{type(e).__name__}: {e}"
         logger.exception("❌ Failed to initialize VoiceAssistant.")
 
-    asyncio.create_task(scheduler_loop())
+# --- Startup Events ---
+@app.on_event("startup")
+async def startup_event():
+    logger.info("🚀 Starting up: initializing DB, loading models in the background.")
+    # Returns immediately; text commands are served while the models load
+    models.start()
+    app.state.store = await TaskStore().open()
+    app.state.devices = await DeviceStates(app.state.store).load()
+    app.state.devices.start()
+
+    if AUDIO_ENABLED:
+        app.state.assistant_task = asyncio.create_task(init_assistant())
+
+    context_cache.start()
+
+    app.state.scheduler = Scheduler(app.state.store, app.state.devices)
+    app.state.scheduler_task = asyncio.create_task(app.state.scheduler.run())
     logger.info("📡 Scheduler loop started.")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.scheduler_task.cancel()
+    await asyncio.gather(app.state.scheduler_task, return_exceptions=True)
+    await context_cache.stop()
+    await close_http_client()
+    await llm_gateway.aclose()
+    await app.state.devices.stop()
+    if hasattr(app.state, "assistant_task"):
+        app.state.assistant_task.cancel()
+    if getattr(app.state, "assistant", None) is not None:
+        await app.state.assistant.asr.stop()
+    models.shutdown()
+    await app.state.store.close()
+    logger.info("👋 Shut down: scheduler and context refresh stopped, device statuses flushed, HTTP clients and DB closed.")
+
 @app.post("/upload-audio/")
-async def upload_audio(file: UploadFile = File(...), response_type: str = "text"):
+async def upload_audio(http_response: Response, file: UploadFile = File(...), response_type: str = "text", llm_response: bool | None = None):
     logger.info(f"📥 Received audio upload: {file.filename}")
-    
-    contents = await file.read()
-    os.makedirs("temp", exist_ok=True)
-    audio_path = os.path.join("temp", file.filename)
-    with open(audio_path, "wb") as f:
-        f.write(contents)
-    logger.info(f"💾 Saved uploaded audio to: {audio_path}")
-
-    # Load and resample before VAD
-    wav, sr = torchaudio.load(audio_path)
-    if sr != 16000:
-        logger.info(f"🔄 Resampling from {sr}Hz to 16000Hz before VAD")
-        resampler = torchaudio.transforms.Resample(orig_freq=sr, new_freq=16000)
-        wav = resampler(wav)
-        sr = 16000
-
-        # Save resampled wav for VAD input
-        resampled_path = os.path.join("temp", f"resampled_{file.filename}")
-        torchaudio.save(resampled_path, wav, sample_rate=sr)
-    else:
-        resampled_path = audio_path
-
-    # Now run VAD on the 16kHz resampled audio file
-    logger.info("🧠 Running VAD preprocessing...")
-    speech_segments = await app.state.assistant.async_vad_detect(resampled_path)
-    
-    if not speech_segments:
-        logger.warning("⚠️ No speech segments detected.")
-        return {"response": "No speech detected in the audio."}
+    assistant = get_assistant()
 
-    # Concatenate detected speech parts (already 16kHz)
-    speech_parts = [wav[:, seg['start']:seg['end']] for seg in speech_segments]
-    speech_audio = torch.cat(speech_parts, dim=1)
+    contents = await file.read()
+    try:
+        command, timings = await assistant.process_audio(contents, file.filename)
+    except ASRQueueFull as e:
+        logger.warning(f"⚠️ Rejecting {file.filename}: {e}")
+        raise HTTPException(status_code=503, detail="Too many voice commands in progress, try again shortly.", headers={"Retry-After": "1"})
+    except AudioDecodeError as e:
+        logger.warning(f"⚠️ {e}")
+        raise HTTPException(status_code=400, detail="Could not decode the uploaded audio.")
+    except Exception as e:
+        logger.exception(f"❌ Transcription of {file.filename} failed: {e}")
+        raise HTTPException(status_code=500, detail="Transcription failed.")
 
-    vad_audio_path = os.path.join("temp", f"vad_{file.filename}")
-    torchaudio.save(vad_audio_path, speech_audio, sample_rate=sr)
-    logger.info(f"✅ VAD-processed audio saved to: {vad_audio_path}")
+    # Per-stage timings, readable in the browser's network panel
+    http_response.headers["Server-Timing"] = ", ".join(f"{stage};dur={ms:.1f}" for stage, ms in timings.items())
 
-    # Transcribe and handle the rest...
-    command = await asyncio.to_thread(app.state.assistant.transcribe_command, vad_audio_path)
+    if command is None:
+        logger.warning("⚠️ No speech segments detected.")
+        return {"response": "No speech detected in the audio."}
     logger.info(f"🗣️ Transcribed command: {command}")
 
-    response = await handle_user_command(command.lower())
+    response = await handle_user_command(command.lower(), app.state.scheduler, use_llm=llm_response)
     logger.info(f"✅ Response: {response}")
 
     if response_type.lower() == "voice":
-        logger.info("🔊 Returning audio response")
-        audio_stream = await app.state.assistant.text_to_speech(response)
-        audio_stream.seek(0)
+        logger.info("🔊 Streaming audio response")
+        return StreamingResponse(stream_speech(response), media_type="audio/mpeg", headers={"Server-Timing": http_response.headers["Server-Timing"]})
 
-        output_path = os.path.join("output", "output.mp3")
-        os.makedirs("output", exist_ok=True)
-        with open(output_path, "wb") as f:
-            f.write(audio_stream.read())
-        audio_stream.seek(0)
+    return {"response": response}
 
-        return StreamingResponse(audio_stream, media_type="audio/mpeg")
 
-    return {"response": response}
+# --- Streaming Voice Commands ---
+@app.websocket("/ws/voice")
+async def voice_websocket(websocket: WebSocket, sample_rate: int = 16000, partials: bool = False, response_type: str = "text"):
+    # Accept first: closing before the handshake is answered is an HTTP 403, not a close code
+    await websocket.accept()
+    try:
+        get_assistant()
+    except HTTPException as e:
+        # 1013: try again later; 1011: server error
+        await websocket.close(code=1013 if e.status_code == 503 else 1011, reason=e.detail[:120])
+        return
+    logger.info(f"🎙️ Voice stream opened ({sample_rate} Hz, partials={partials})")
+    await run_voice_session(
+        websocket,
+        app.state.assistant,
+        lambda text: handle_user_command(text.lower(), app.state.scheduler),
+        sample_rate=sample_rate,
+        partials=partials,
+        response_type=response_type.lower(),
+    )
+    logger.info("🎙️ Voice stream closed")
 
 
 # --- Send Command via JSON ---
@@ -124,30 +176,100 @@ async def upload_audio(file: UploadFile = File(...), response_type: str = "text"
 async def send_command(request: CommandRequest):
     logger.info(f"✉️ Received text command: {request.command}")
     
-    response = await handle_user_command(request.command.lower())
+    response = await handle_user_command(request.command.lower(), app.state.scheduler, use_llm=request.llm_response)
     logger.info(f"✅ Response: {response}")
 
     if request.response_type.lower() == "voice":
-        logger.info("🔊 Returning audio response")
-        audio_stream = app.state.assistant.text_to_speech(response)
-        if isinstance(audio_stream, bytes):
-            audio_stream = io.BytesIO(audio_stream)
-        audio_stream.seek(0)
-
-        output_path = os.path.join("output", "output.mp3")
-        os.makedirs("output", exist_ok=True)
-        with open(output_path, "wb") as f:
-            f.write(audio_stream.read())
-
-        audio_stream.seek(0)
-        return StreamingResponse(audio_stream, media_type="audio/mpeg")
+        logger.info("🔊 Streaming audio response")
+        return StreamingResponse(stream_speech(response), media_type="audio/mpeg")
 
     logger.info("💬 Returning text response")
     return {"response": response}
 
+@app.post("/send-command/stream")
+async def send_command_stream(request: CommandRequest):
+    """Text command as JSON lines: the scheduled actions as soon as they are known, then the reply as it is written."""
+    logger.info(f"✉️ Received streamed text command: {request.command}")
+
+    async def events():
+        try:
+            async for event in stream_user_command(request.command.lower(), app.state.scheduler, use_llm=request.llm_response):
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            logger.exception(f"❌ Streamed command failed: {e}")
+            yield json.dumps({"type": "error", "detail": "Could not complete the command."}) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # --- Get Device Statuses ---
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check: '*' or any tag in the list, compared weakly (W/ prefix ignored)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag.removeprefix("W/") in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
 @app.get("/device-statuses/")
-async def device_statuses():
-    statuses = await get_all_device_statuses()
-    logger.info(f"📊 Fetched all device statuses: {statuses}")
+async def device_statuses(request: Request, response: Response):
+    devices = app.state.devices
+    etag = devices.etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        devices.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    statuses = devices.all()
+    logger.info(f"📊 Fetched all device statuses (version {devices.version}): {statuses}")
     return statuses
+
+@app.get("/device-statuses/stream")
+async def device_status_stream(request: Request, cursor: str | None = None):
+    # Browsers resend the last event id on reconnect; other clients can pass ?cursor=
+    last_event_id = request.headers.get("last-event-id") or cursor
+    return StreamingResponse(
+        app.state.devices.stream(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Scheduled Tasks ---
+@app.get("/tasks/")
+async def list_tasks(status: str | None = "pending", device: str | None = None, room: str | None = None, limit: int = 100):
+    if status and status not in TASK_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status '{status}', expected one of {TASK_STATUSES}")
+    return await app.state.store.list_tasks(status=status, device=device, room=room, limit=limit)
+
+@app.delete("/tasks/")
+async def cancel_tasks(device: str | None = None, room: str | None = None):
+    if not device and not room:
+        raise HTTPException(status_code=400, detail="Specify a device and/or room to cancel tasks for.")
+    cancelled = await app.state.scheduler.cancel(device=device, room=room)
+    logger.info(f"🚫 Cancelled tasks {cancelled} (device={device}, room={room})")
+    return {"cancelled": cancelled}
+
+# --- Model Readiness ---
+@app.get("/models/")
+async def model_status(response: Response):
+    status = models.status()
+    if any(model["state"] != "ready" for model in status.values()):
+        response.status_code = 503
+    return {"audio_enabled": AUDIO_ENABLED, "models": status}
+
+# --- Runtime Metrics ---
+@app.get("/metrics/")
+async def metrics():
+    return {
+        "context_cache": context_cache.stats(),
+        "headline_index": headline_index.stats(),
+        "condition_cache": condition_cache.stats(),
+        "fast_path": fast_path.stats(),
+        "intent_cache": intent_cache.stats(),
+        "responses": response_stats.stats(),
+        "llm": llm_gateway.stats(),
+        "scheduler": app.state.scheduler.stats(),
+        "device_states": app.state.devices.stats(),
+        "models": models.status(),
+        "audio_pipeline": app.state.assistant.stats() if getattr(app.state, "assistant", None) else None,
+        "voice_streams": stream_stats.stats() if AUDIO_ENABLED else None,
+        "tts": tts_stats.stats(),
+    }
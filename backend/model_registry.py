@@ -0,0 +1,131 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# All model files live under one directory so a deployment can ship or mount them
+MODEL_CACHE_DIR = os.path.expanduser(os.getenv("MODEL_CACHE_DIR", "~/.cache/zarinf-models"))
+# Never touch the network for models; everything must already be in MODEL_CACHE_DIR
+MODELS_OFFLINE = os.getenv("MODELS_OFFLINE", "false").lower() == "true"
+# Text-only deployments set this to false and never import torch/whisper
+AUDIO_ENABLED = os.getenv("AUDIO_ENABLED", "true").lower() == "true"
+# Models loaded at once; 1 loads them one after another
+MODEL_LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", "4"))
+
+if MODELS_OFFLINE:
+    # Read by huggingface_hub/transformers when they are first imported
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/model_registry.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def cache_path(*parts: str) -> str:
+    return os.path.join(MODEL_CACHE_DIR, *parts)
+
+
+class ModelRegistry:
+    """Named models loaded in the background, in parallel, on first need.
+
+    Modules register a loader at import time, which costs nothing. start()
+    submits every registered loader to a thread pool and returns at once;
+    get() blocks until one model is ready, loading it then if nobody has
+    started it yet. Each model reports its own state so readiness can be
+    checked per model.
+    """
+
+    def __init__(self, workers: int = MODEL_LOAD_WORKERS):
+        self._loaders: dict[str, Callable[[], object]] = {}
+        self._futures: dict[str, Future] = {}
+        self._started_at: dict[str, float] = {}
+        self._seconds: dict[str, float] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="model-load")
+
+    def register(self, name: str, loader: Callable[[], object]):
+        self._loaders[name] = loader
+
+    def _load(self, name: str):
+        logger.info(f"📦 Loading model '{name}'...")
+        start = time.perf_counter()
+        try:
+            return self._loaders[name]()
+        except Exception as e:
+            logger.exception(f"❌ Loading model '{name}' failed: {e}")
+            raise
+        finally:
+            self._seconds[name] = time.perf_counter() - start
+            logger.info(f"📦 Model '{name}' finished loading in {self._seconds[name]:.1f}s")
+
+    def _future(self, name: str) -> Future:
+        if name not in self._futures:
+            if name not in self._loaders:
+                raise KeyError(f"No model registered as '{name}'")
+            self._started_at[name] = time.time()
+            self._futures[name] = self._executor.submit(self._load, name)
+        return self._futures[name]
+
+    def start(self, names=None):
+        for name in names or list(self._loaders):
+            self._future(name)
+
+    def get(self, name: str):
+        return self._future(name).result()
+
+    async def wait(self, name: str):
+        return await asyncio.wrap_future(self._future(name))
+
+    def ready(self, name: str) -> bool:
+        future = self._futures.get(name)
+        return future is not None and future.done() and future.exception() is None
+
+    def status(self) -> dict:
+        status = {}
+        for name in self._loaders:
+            future = self._futures.get(name)
+            if future is None:
+                state = "not loaded"
+            elif not future.done():
+                state = "loading"
+            elif future.exception() is not None:
+                state = "failed"
+            else:
+                state = "ready"
+            status[name] = {
+                "state": state,
+                "seconds": round(self._seconds[name], 2) if name in self._seconds else None,
+                "error": str(future.exception()) if state == "failed" else None,
+            }
+        return status
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+models = ModelRegistry()
+
+
+if __name__ == "__main__":
+    # Fill MODEL_CACHE_DIR so later starts can run with MODELS_OFFLINE=true
+    import model_registry
+    import conditional_agent  # noqa: F401 - registers the embedding model
+    if AUDIO_ENABLED:
+        import assistant  # noqa: F401 - registers the VAD and ASR models
+
+    model_registry.models.start()
+    for name in list(model_registry.models.status()):
+        model_registry.models.get(name)
+    print(f"Models cached in {MODEL_CACHE_DIR}: {model_registry.models.status()}")
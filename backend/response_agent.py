@@ -1,11 +1,14 @@
 import os
+import time
 import logging
 import json
 from datetime import datetime
 
-from langchain_openai import ChatOpenAI
 from langchain.schema import SystemMessage, HumanMessage
 
+from llm_gateway import llm_gateway
+from response_templates import INFO_FUNCTIONS, render_device_actions
+
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -19,21 +22,91 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-tg_llm  = ChatOpenAI(
-    model="meta-llama/Llama-3.3-70B-Instruct-Turbo-Free",
-    base_url="https://api.together.xyz/v1",
-    api_key=os.getenv("TOGETHER_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
+response_llm = llm_gateway.chat("response")
+
+# "template" renders device actions without the LLM; "llm" sends every reply through it
+RESPONSE_MODE = os.getenv("RESPONSE_MODE", "template").lower()
+
+
+class ResponseStats:
+    def __init__(self):
+        self.template = 0
+        self.llm = 0
+        self.template_ms = 0.0
+        self.llm_ms = 0.0
+
+    def stats(self) -> dict:
+        return {
+            "mode": RESPONSE_MODE,
+            "template": self.template,
+            "llm": self.llm,
+            "avg_template_ms": round(self.template_ms / self.template, 3) if self.template else None,
+            "avg_llm_ms": round(self.llm_ms / self.llm, 1) if self.llm else None,
+        }
+
+
+response_stats = ResponseStats()
+
+
+def plan_response(actions: list[dict], use_llm: bool | None = None) -> tuple[str, list[dict] | None]:
+    """Split a reply into its template text and the actions the LLM still has to word (None: no LLM call).
+
+    Device actions are rendered from templates; the LLM only summarizes
+    news/weather results, answers when there are no actions at all, or
+    writes the whole reply when use_llm (default: RESPONSE_MODE == "llm").
+    """
+    if use_llm is None:
+        use_llm = RESPONSE_MODE == "llm"
+    if use_llm or not actions:
+        return "", actions
+
+    start = time.perf_counter()
+    devices = [action for action in actions if action["function"] not in INFO_FUNCTIONS]
+    text = render_device_actions(devices) if devices else ""
+    response_stats.template += 1
+    response_stats.template_ms += (time.perf_counter() - start) * 1000
+    info = [action for action in actions if action["function"] in INFO_FUNCTIONS]
+    return text, info or None
+
+
+async def make_response(actions: list[dict], use_llm: bool | None = None) -> str:
+    """Reply for the actions of one command (see plan_response)."""
+    text, llm_actions = plan_response(actions, use_llm)
+    if llm_actions is None:
+        logger.info(f"Rendered response: {text}")
+        return text
+    parts = [text] if text else []
+    parts.append(await llm_response(llm_actions))
+    return " ".join(parts)
+
+
+async def stream_response(actions: list[dict], use_llm: bool | None = None):
+    """make_response, yielded piece by piece: template text at once, LLM text token by token."""
+    text, llm_actions = plan_response(actions, use_llm)
+    if text:
+        yield text + (" " if llm_actions is not None else "")
+    if llm_actions is None:
+        return
+
+    start = time.perf_counter()
+    async for chunk in response_llm.astream(llm_messages(llm_actions)):
+        if chunk.content:
+            yield chunk.content
+    response_stats.llm += 1
+    response_stats.llm_ms += (time.perf_counter() - start) * 1000
+
+
+async def llm_response(actions: list[dict]) -> str:
+    start = time.perf_counter()
+    response = await response_llm.ainvoke(llm_messages(actions))
+    response_stats.llm += 1
+    response_stats.llm_ms += (time.perf_counter() - start) * 1000
+    logger.info(f"LLM response: {response.content}")
 
-groq_llm = ChatOpenAI(
-    model="llama3-70b-8192",
-    base_url="https://api.groq.com/openai/v1",
-    api_key=os.getenv("GROQ_API_KEY"),
-    openai_proxy=os.getenv('OPENAI_PROXY')
-)
+    return response.content
 
-def make_response(actions: list[dict]) -> str:
+
+def llm_messages(actions: list[dict]) -> list:
     system_content = """
 You are a friendly and concise Smart Home Assistant.
 
@@ -94,12 +167,7 @@ Output:
 Now generate the response.
 """
 
-    messages = [
+    return [
         SystemMessage(content=system_content),
         HumanMessage(content=prompt)
     ]
-
-    response = (groq_llm if os.getenv('API_RES') == 'GROQ' else tg_llm).invoke(messages)
-    logger.info(f"LLM response with {os.getenv('API_AGENT')}: {response.content}")
-
-    return response.content
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+from fast_path import LAMP_ROOMS, AC_ROOMS
+
+# Answered from their result, which only the LLM can summarize
+INFO_FUNCTIONS = {"get_news", "get_weather"}
+
+DEVICE_ORDER = ["control_lamp", "control_ac", "control_tv", "control_cooler"]
+DEVICE_NOUNS = {
+    "control_lamp": ("lamp", "lamps"),
+    "control_ac": ("AC", "ACs"),
+    "control_tv": ("TV", "TVs"),
+    "control_cooler": ("cooler", "coolers"),
+}
+DEVICE_ROOMS = {"control_lamp": LAMP_ROOMS, "control_ac": AC_ROOMS}
+# Every device in the house, for "Everything will turn off"
+ALL_DEVICES = {("control_lamp", room) for room in LAMP_ROOMS} | {("control_ac", room) for room in AC_ROOMS} \
+    | {("control_tv", None), ("control_cooler", None)}
+
+# Up to this far ahead times are relative ("in 2 hours"), beyond it clock times ("at 3 PM")
+RELATIVE_TIME_HOURS = 6
+
+
+def to_datetime(scheduled_for) -> datetime | None:
+    if isinstance(scheduled_for, datetime):
+        return scheduled_for
+    try:
+        return datetime.fromisoformat(str(scheduled_for))
+    except ValueError:
+        return None
+
+
+def humanize_time(run_at: datetime | None, now: datetime) -> str:
+    """'' for now, otherwise e.g. 'in 45 minutes', 'in 2 hours', 'tomorrow at 7 AM'."""
+    if run_at is None:
+        return ""
+    seconds = (run_at - now).total_seconds()
+    if seconds < 60:
+        return ""
+    minutes = round(seconds / 60)
+    if minutes < 60:
+        return f"in {minutes} minute{'s' * (minutes != 1)}"
+    if minutes < RELATIVE_TIME_HOURS * 60:
+        hours, minutes = divmod(minutes, 60)
+        phrase = f"in {hours} hour{'s' * (hours != 1)}"
+        return phrase + (f" and {minutes} minute{'s' * (minutes != 1)}" if minutes else "")
+
+    clock = run_at.strftime("%I:%M %p").lstrip("0").replace(":00", "")
+    days = (run_at.date() - now.date()).days
+    if days == 0:
+        return f"at {clock}"
+    if days == 1:
+        return f"tomorrow at {clock}"
+    if days < 7:
+        return f"on {run_at.strftime('%A')} at {clock}"
+    return f"on {run_at.strftime('%B')} {run_at.day} at {clock}"
+
+
+def join_words(words: list[str]) -> str:
+    return words[0] if len(words) == 1 else ", ".join(words[:-1]) + " and " + words[-1]
+
+
+def room_phrase(room: str) -> str:
+    return f"room {room[4:]}" if room.startswith("room") else f"the {room}"
+
+
+def device_phrase(function: str, rooms: list[str]) -> tuple[str, bool]:
+    """Subject for one device type and the rooms it acts in, and whether it is plural."""
+    singular, plural = DEVICE_NOUNS[function]
+    valid = DEVICE_ROOMS.get(function)
+    if not valid or not rooms:
+        return f"the {singular}", False
+    if len(rooms) == 1:
+        return f"the {singular} in {room_phrase(rooms[0])}", False
+    if set(rooms) == set(valid):
+        return f"all {plural}" if len(valid) > 2 else f"both {plural}", True
+    return f"the {plural} in {join_words([room_phrase(room) for room in rooms])}", True
+
+
+def render_device_actions(actions: list[dict], now: datetime | None = None) -> str:
+    """One sentence per (action, time, condition), devices grouped by type.
+
+    E.g. "All lamps and the cooler will turn off at 3 PM." or "The lamp in
+    the kitchen is now on." Actions the scheduler rejected are reported
+    with their reason.
+    """
+    now = now or datetime.now()
+    groups: dict[tuple[str, str, str], list[tuple[str, str | None]]] = {}
+    failures = []
+    for action in actions:
+        function, args = action["function"], action.get("args", {})
+        room = args.get("room") or None
+        if str(action.get("result", "")).startswith("Not scheduled"):
+            subject, _ = device_phrase(function, [room] if room else [])
+            failures.append(f"I couldn't schedule {subject}: {action['result'][len('Not scheduled: '):]}.")
+            continue
+        conditions = [desc for desc in (args.get("weather_description", ""), args.get("news_description", "")) if desc.strip()]
+        key = (args.get("action", "").lower(), humanize_time(to_datetime(action.get("scheduled_for")), now), " and ".join(conditions))
+        groups.setdefault(key, []).append((function, room))
+
+    sentences = []
+    for (state, when, condition), devices in groups.items():
+        if set(devices) == ALL_DEVICES:
+            subject, plural = "everything", False
+        else:
+            subjects = []
+            for function in sorted({f for f, _ in devices}, key=lambda f: DEVICE_ORDER.index(f) if f in DEVICE_ORDER else len(DEVICE_ORDER)):
+                rooms = list(dict.fromkeys(room for f, room in devices if f == function and room))
+                subjects.append(device_phrase(function, rooms))
+            subject = join_words([phrase for phrase, _ in subjects])
+            plural = len(subjects) > 1 or subjects[0][1]
+
+        if when:
+            sentence = f"{subject} will turn {state} {when}"
+        else:
+            sentence = f"{subject} {'are' if plural else 'is'} now {state}"
+        if condition:
+            sentence += f", since the condition '{condition}' is met"
+        sentences.append(sentence[0].upper() + sentence[1:] + ".")
+
+    return " ".join(sentences + failures)
@@ -1,11 +1,19 @@
+import os
+import sys
+import time
+import heapq
 import asyncio
 import logging
+from collections import deque
 from datetime import datetime
 from agent import control_tv, control_cooler, control_ac, control_lamp, handle_user_request
-from response_agent import make_response
-from task_db import ScheduledTaskDBItem, get_due_tasks, delete_task, add_task, init_db, set_device_status, get_device_status
-from assistant import VoiceAssistant
-import aiosqlite
+from response_agent import make_response, stream_response
+from task_db import ScheduledTaskDBItem, TaskStore, DUE_TASK_LIMIT, TASK_RETENTION_DAYS, to_epoch_ms, get_device_name, normalize_task_args
+from device_state import DeviceStates
+from typing import TYPE_CHECKING
+if TYPE_CHECKING:
+    # Importing it loads torch; text-only deployments never do
+    from assistant import VoiceAssistant
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -20,6 +28,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Only tasks due within this window are held in memory; later ones stay in SQLite
+SCHEDULER_HORIZON_SECONDS = float(os.getenv("SCHEDULER_HORIZON_SECONDS", "3600"))
+# Max tasks executing at once; tasks for the same device always run one after another
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "4"))
+# How often finished tasks older than TASK_RETENTION_DAYS are purged
+TASK_PURGE_INTERVAL_SECONDS = 3600
+
 FUNCTION_MAP = {
     "control_tv": control_tv,
     "control_cooler": control_cooler,
@@ -31,11 +46,11 @@ class ScheduledTask:
     def __init__(self, db_item: ScheduledTaskDBItem):
         self.db_item = db_item
 
-    async def run(self):
+    async def run(self) -> bool:
         func = FUNCTION_MAP.get(self.db_item.function_name)
         if not func:
             logger.error(f"❌ Unknown function name: {self.db_item.function_name}")
-            return
+            return False
 
         try:
             logger.info(f"Running task {self.db_item.id} → {self.db_item.function_name} at {datetime.now()} with args={self.db_item.args} kwargs={self.db_item.kwargs}")
@@ -46,53 +61,258 @@ class ScheduledTask:
                 if asyncio.iscoroutine(result):
                     await result
             logger.info(f"✅ Task {self.db_item.id} executed successfully.")
+            return True
         except Exception as e:
             logger.exception(f"❌ Error running task {self.db_item.id}: {e}")
+            return False
+
+
+class Scheduler:
+    """Event-driven task scheduler.
+
+    Tasks due within the next SCHEDULER_HORIZON_SECONDS live in an in-memory
+    min-heap keyed on run_at, and the loop sleeps exactly until the earliest
+    deadline. Scheduling a task that is due sooner wakes it up early. SQLite
+    stays the durable journal: every task is written before it enters the
+    heap, and the window is paged in from it with the bounded due-task query.
+
+    Tasks that fall due together are dispatched as one batch in the
+    background: they run concurrently on up to DISPATCH_WORKERS workers, in
+    order per device (also across batches still running), and their claims
+    and results are each committed in a single transaction.
+    The resulting device statuses go to the in-memory DeviceStates, which
+    writes them back to SQLite on its own schedule. Finished tasks are
+    purged from SQLite once they are older than TASK_RETENTION_DAYS.
+    """
+
+    def __init__(self, store: TaskStore, devices: DeviceStates, horizon: float = SCHEDULER_HORIZON_SECONDS, batch_size: int = DUE_TASK_LIMIT, workers: int = DISPATCH_WORKERS):
+        self.store = store
+        self.devices = devices
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self.workers = workers
+        self._heap: list[tuple[float, int, ScheduledTaskDBItem]] = []
+        self._queued: set[int] = set()
+        self._wakeup = asyncio.Event()
+        # Held while paging in the window and while schedule() writes and pushes a task,
+        # so a task is never both loaded from SQLite and pushed by schedule()
+        self._load_lock = asyncio.Lock()
+        self._next_purge = 0.0
+        self._worker_slots = asyncio.Semaphore(workers)
+        # Batches still running, and the latest queued run for each device
+        self._batches: set[asyncio.Task] = set()
+        self._device_tails: dict[str, asyncio.Task] = {}
+        # Every pending task ordered at or before this (run_at epoch ms, id) is in the heap
+        self._loaded: tuple[int, int] = (-1, -1)
+
+        self.dispatched = 0
+        self.failed = 0
+        self.skipped = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self._lags_ms: deque[float] = deque(maxlen=1000)
+
+    def _push(self, db_item: ScheduledTaskDBItem):
+        if db_item.id in self._queued:
+            return
+        self._queued.add(db_item.id)
+        heapq.heappush(self._heap, (db_item.run_at.timestamp(), db_item.id, db_item))
+        if self._heap[0][2] is db_item:
+            self._wakeup.set()
+
+    async def _load_window(self):
+        async with self._load_lock:
+            until = datetime.fromtimestamp(time.time() + self.horizon)
+            tasks = await self.store.get_due_tasks(until=until, limit=self.batch_size, after=self._loaded)
+            for db_item in tasks:
+                self._push(db_item)
+            if len(tasks) == self.batch_size:
+                # More are due inside the window; continue from the last row once the heap drains
+                self._loaded = (to_epoch_ms(tasks[-1].run_at), tasks[-1].id)
+            else:
+                self._loaded = (to_epoch_ms(until), sys.maxsize)
+
+    def _needs_load(self, now: float) -> bool:
+        return len(self._heap) < self.batch_size and self._loaded[0] / 1000 - now < self.horizon / 2
+
+    async def schedule(self, function_name: str, run_at: datetime, kwargs=None) -> int:
+        logger.info(f"📝 Scheduling task: {function_name} at {run_at} with kwargs={kwargs}")
+        kwargs = normalize_task_args(function_name, kwargs or {})
+        async with self._load_lock:
+            task_id = await self.store.add_task(function_name, run_at, kwargs=kwargs)
+            if (to_epoch_ms(run_at), task_id) <= self._loaded:
+                self._push(ScheduledTaskDBItem(task_id, function_name, run_at, kwargs=kwargs))
+        return task_id
+
+    async def _purge(self, now: float):
+        self._next_purge = now + TASK_PURGE_INTERVAL_SECONDS
+        try:
+            await self.store.purge_tasks(datetime.fromtimestamp(now - TASK_RETENTION_DAYS * 86400))
+        except Exception as e:
+            logger.exception(f"❌ Failed to purge finished tasks: {e}")
+
+    async def cancel(self, device: str | None = None, room: str | None = None) -> list[int]:
+        task_ids = set(await self.store.cancel_tasks(device=device, room=room))
+        if task_ids & self._queued:
+            self._heap = [entry for entry in self._heap if entry[1] not in task_ids]
+            heapq.heapify(self._heap)
+            self._queued -= task_ids
+        return sorted(task_ids)
+
+    async def _run_device_queue(self, queue: list[ScheduledTaskDBItem], claim: asyncio.Task, previous: asyncio.Task | None) -> list[bool | None]:
+        """Run one device's tasks in order, after that device's tasks from earlier batches.
+
+        None marks a task that was no longer pending when the batch was claimed.
+        """
+        if previous is not None:
+            await asyncio.wait([previous])
+        claimed = await claim
+        results = []
+        for db_task in queue:
+            if db_task.id not in claimed:
+                results.append(None)
+                continue
+            async with self._worker_slots:
+                lag_ms = (time.time() - db_task.run_at.timestamp()) * 1000
+                self._lags_ms.append(lag_ms)
+                logger.debug(f"Task {db_task.id} dispatched {lag_ms:.1f} ms after its scheduled time")
+                results.append(await ScheduledTask(db_task).run())
+        return results
+
+    def _start_batch(self, batch: list[ScheduledTaskDBItem]):
+        """Dispatch a batch in the background, so a slow task doesn't hold up later deadlines."""
+        claim = asyncio.create_task(self.store.claim_tasks([db_task.id for db_task in batch]))
+
+        # One queue per device, in heap order, so on/off commands for a device keep their order,
+        # chained after the same device's queue from any batch still running
+        queues: dict[str, list[ScheduledTaskDBItem]] = {}
+        for db_task in batch:
+            device = get_device_name(db_task.function_name, db_task.kwargs) or f"task-{db_task.id}"
+            queues.setdefault(device, []).append(db_task)
+        runs: dict[str, asyncio.Task] = {}
+        for device, queue in queues.items():
+            runs[device] = asyncio.create_task(self._run_device_queue(queue, claim, self._device_tails.get(device)))
+            self._device_tails[device] = runs[device]
+            runs[device].add_done_callback(lambda run, device=device: self._forget_tail(device, run))
 
+        batch_task = asyncio.create_task(self._finish_batch(claim, queues, runs))
+        self._batches.add(batch_task)
+        batch_task.add_done_callback(self._batches.discard)
 
-def get_device_name(function_name: str, kwargs: dict) -> str:
-    device_map = {
-        'control_tv': lambda kw: "TV",
-        'control_cooler': lambda kw: "Cooler",
-        'control_ac': lambda kw: {
-            'room1': "AC_room1",
-            'kitchen': "AC_kitchen"
-        }.get(kw.get('room'), ""),
-        'control_lamp': lambda kw: {
-            'kitchen': "lamp_kitchen",
-            'bathroom': "lamp_bathroom",
-            'room1': "lamp_room1",
-            'room2': "lamp_room2"
-        }.get(kw.get('room'), ""),
-    }
-    return device_map.get(function_name, lambda _: "")(kwargs)
-
-
-async def scheduler_loop():
-    logger.info("🕒 Scheduler loop started.")
-    while True:
-        due_db_tasks = await get_due_tasks()
-        for db_task in due_db_tasks:
-            task = ScheduledTask(db_task)
-            await task.run()
-
-            action = db_task.kwargs.get('action', '')
-            device_name = get_device_name(db_task.function_name, db_task.kwargs)
-
-            if device_name:
-                await set_device_status(device_name, action)
-
-            await delete_task(db_task.id)
-            logger.info(f"🗑️ Task {db_task.id} deleted after execution.")
-        await asyncio.sleep(1)
-
-async def schedule_task(function_name: str, run_at: datetime, args=None, kwargs=None):
-    logger.info(f"📝 Scheduling task: {function_name} at {run_at} with args={args}, kwargs={kwargs}")
-    await add_task(function_name, run_at, args=args, kwargs=kwargs)
-
-async def handle_user_command(user_input: str):
+    def _forget_tail(self, device: str, run: asyncio.Task):
+        if self._device_tails.get(device) is run:
+            del self._device_tails[device]
+
+    async def _finish_batch(self, claim: asyncio.Task, queues: dict[str, list[ScheduledTaskDBItem]], runs: dict[str, asyncio.Task]):
+        claimed: set[int] = set()
+        try:
+            claimed = await claim
+            results = await asyncio.gather(*runs.values(), return_exceptions=True)
+
+            outcomes, statuses = [], {}
+            for (device, queue), queue_results in zip(queues.items(), results):
+                if isinstance(queue_results, BaseException):
+                    logger.error(f"❌ Tasks for {device} failed: {queue_results!r}")
+                    queue_results = [False if db_task.id in claimed else None for db_task in queue]
+                for db_task, ok in zip(queue, queue_results):
+                    if ok is None:
+                        continue
+                    outcomes.append((db_task.id, "done" if ok else "failed"))
+                    if ok and not device.startswith("task-"):
+                        statuses[device] = db_task.kwargs.get('action', '')
+            self.devices.update(statuses)
+            await self.store.finish_tasks(outcomes)
+        except asyncio.CancelledError:
+            for run in runs.values():
+                run.cancel()
+            raise
+        except Exception as e:
+            # Don't leave claimed tasks 'running'; they would only be retried on the next start
+            logger.exception(f"❌ Failed to dispatch {sum(map(len, queues.values()))} task(s): {e}")
+            for run in runs.values():
+                run.cancel()
+            await asyncio.gather(*runs.values(), return_exceptions=True)
+            self.failed += len(claimed)
+            if claimed:
+                try:
+                    await self.store.finish_tasks([(task_id, "failed") for task_id in claimed])
+                except Exception as e:
+                    logger.exception(f"❌ Could not mark {len(claimed)} task(s) failed: {e}")
+            return
+
+        self.batches += 1
+        self.largest_batch = max(self.largest_batch, len(outcomes))
+        self.skipped += sum(map(len, queues.values())) - len(outcomes)
+        self.dispatched += len(outcomes)
+        self.failed += sum(status == "failed" for _, status in outcomes)
+        logger.info(f"🚚 Dispatched {len(outcomes)} task(s) across {len(queues)} device(s).")
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags_ms)
+        return {
+            "queued": len(self._heap),
+            "batches_in_flight": len(self._batches),
+            "workers": self.workers,
+            "dispatched": self.dispatched,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "largest_batch": self.largest_batch,
+            "lag_ms": {
+                "avg": round(sum(lags) / len(lags), 1),
+                "p50": round(lags[len(lags) // 2], 1),
+                "p95": round(lags[int(len(lags) * 0.95)], 1),
+                "max": round(lags[-1], 1),
+            } if lags else None,
+        }
+
+    async def run(self):
+        try:
+            await self._loop()
+        finally:
+            # Tasks cut off here stay 'running' and are re-queued on the next start
+            for batch_task in self._batches:
+                batch_task.cancel()
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+    async def _loop(self):
+        await self._load_window()
+        logger.info(f"🕒 Scheduler loop started with {len(self._heap)} task(s) due within {self.horizon:.0f}s.")
+
+        while True:
+            now = time.time()
+            if self._needs_load(now):
+                await self._load_window()
+            if TASK_RETENTION_DAYS > 0 and now >= self._next_purge:
+                await self._purge(now)
+
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[2])
+
+            if due:
+                self._queued.difference_update(db_task.id for db_task in due)
+                self._start_batch(due)
+                continue
+
+            # Nothing due: sleep until the next deadline, the next window load, or an earlier task
+            deadlines = [self._heap[0][0]] if self._heap else []
+            if len(self._heap) < self.batch_size:
+                deadlines.append(self._loaded[0] / 1000 - self.horizon / 2)
+            if TASK_RETENTION_DAYS > 0:
+                deadlines.append(self._next_purge)
+            timeout = max(0.0, min(deadlines) - now) if deadlines else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def resolve_user_command(user_input: str, scheduler: Scheduler) -> list[dict]:
+    """Parse a command, schedule its device actions and return them, ready for JSON."""
     logger.info(f"🧠 Handling user input: '{user_input}'")
-    commands = handle_user_request(user_input)
+    commands = await handle_user_request(user_input)
     logger.info(f"Parsed commands: {commands}")
 
     for command in commands:
@@ -103,7 +323,12 @@ async def handle_user_command(user_input: str):
         if fn_name in ['get_news', 'get_weather']:
             continue
 
-        await schedule_task(fn_name, run_at, kwargs=args)
+        try:
+            await scheduler.schedule(fn_name, run_at, kwargs=args)
+        except ValueError as e:
+            logger.warning(f"⚠️ Not scheduling {fn_name}: {e}")
+            command['result'] = f"Not scheduled: {e}"
+            continue
         logger.info(f"📅 Scheduled: {fn_name} at {run_at} with args={args}")
 
     logger.info(f"Commands: {commands}")
@@ -114,12 +339,31 @@ async def handle_user_command(user_input: str):
             command['scheduled_for'] = run_at.isoformat()
         else:
             command['scheduled_for'] = str(run_at)
+    return commands
 
-    response = make_response(commands)
+async def handle_user_command(user_input: str, scheduler: Scheduler, use_llm: bool | None = None):
+    commands = await resolve_user_command(user_input, scheduler)
+    response = await make_response(commands, use_llm=use_llm)
     logger.info(f"Response: {response}")
     return response
 
-async def async_listen_for_command(assistant: VoiceAssistant):
+async def stream_user_command(user_input: str, scheduler: Scheduler, use_llm: bool | None = None):
+    """handle_user_command as events: the actions once scheduled, then the reply piece by piece.
+
+    Yields {"type": "actions", "actions": [...]}, any number of
+    {"type": "token", "text": ...} and finally {"type": "done", "response": ...}.
+    """
+    commands = await resolve_user_command(user_input, scheduler)
+    yield {"type": "actions", "actions": commands}
+    pieces = []
+    async for text in stream_response(commands, use_llm=use_llm):
+        pieces.append(text)
+        yield {"type": "token", "text": text}
+    response = "".join(pieces)
+    logger.info(f"Response: {response}")
+    yield {"type": "done", "response": response}
+
+async def async_listen_for_command(assistant: "VoiceAssistant"):
     logger.info("👂 Listening for wake word...")
     detected = await asyncio.to_thread(assistant.listen_for_wake_word)
     if detected:
@@ -130,9 +374,3 @@ async def async_listen_for_command(assistant: VoiceAssistant):
         return command
     logger.info("🔇 No wake word detected.")
     return None
-
-async def get_all_device_statuses() -> dict:
-    async with aiosqlite.connect('async_task_queue.db') as db:
-        cursor = await db.execute('SELECT device_name, status FROM device_status')
-        rows = await cursor.fetchall()
-        return {device_name: status for device_name, status in rows}
@@ -1,3 +1,6 @@
+import os
+import json
+import asyncio
 import aiosqlite
 import pickle
 import logging
@@ -7,6 +10,24 @@ from dotenv import load_dotenv
 load_dotenv()
 
 DB_PATH = "async_task_queue.db"
+# Upper bound on rows returned by a single due-task query
+DUE_TASK_LIMIT = int(os.getenv("DUE_TASK_LIMIT", "500"))
+# Finished tasks (done, failed, cancelled) are deleted this long after their run time; 0 keeps them forever
+TASK_RETENTION_DAYS = float(os.getenv("TASK_RETENTION_DAYS", "7"))
+
+TASK_STATUSES = ("pending", "running", "done", "failed", "cancelled")
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+TASK_ACTIONS = ("on", "off")
+
+# Arguments each schedulable tool accepts; anything else is rejected before it reaches the table
+TASK_ARGS = {
+    "control_tv": {"action", "weather_description", "news_description", "time_description"},
+    "control_cooler": {"action", "weather_description", "news_description", "time_description"},
+    "control_ac": {"room", "action", "time_description"},
+    "control_lamp": {"room", "action", "time_description"},
+}
+# Devices that are not addressed by room but still live in one
+TASK_ROOMS = {"control_tv": "livingroom"}
 
 # --- Setup Logging ---
 logging.basicConfig(
@@ -19,6 +40,68 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def to_epoch_ms(dt: datetime) -> int:
+    return round(dt.timestamp() * 1000)
+
+
+def from_epoch_ms(ms: int) -> datetime:
+    return datetime.fromtimestamp(ms / 1000)
+
+
+def get_device_name(function_name: str, kwargs: dict) -> str:
+    device_map = {
+        'control_tv': lambda kw: "TV",
+        'control_cooler': lambda kw: "Cooler",
+        'control_ac': lambda kw: {
+            'room1': "AC_room1",
+            'kitchen': "AC_kitchen"
+        }.get(kw.get('room'), ""),
+        'control_lamp': lambda kw: {
+            'kitchen': "lamp_kitchen",
+            'bathroom': "lamp_bathroom",
+            'room1': "lamp_room1",
+            'room2': "lamp_room2"
+        }.get(kw.get('room'), ""),
+    }
+    return device_map.get(function_name, lambda _: "")(kwargs)
+
+
+def task_columns(function_name: str, kwargs: dict) -> tuple[str | None, str | None, str | None]:
+    """The (device, room, action) columns a task is filtered by."""
+    device = get_device_name(function_name, kwargs) or None
+    room = kwargs.get('room') or TASK_ROOMS.get(function_name)
+    return device, room, kwargs.get('action')
+
+
+def normalize_task_args(function_name: str, kwargs: dict) -> dict:
+    """The arguments a task is stored and run with: only the ones its tool accepts, action lower-cased."""
+    allowed = TASK_ARGS.get(function_name, set())
+    unknown = set(kwargs) - allowed
+    if unknown:
+        logger.debug(f"Ignoring unexpected arguments for {function_name}: {sorted(unknown)}")
+    kwargs = {key: value for key, value in kwargs.items() if key in allowed}
+    if isinstance(kwargs.get('action'), str):
+        kwargs['action'] = kwargs['action'].strip().lower()
+    return kwargs
+
+
+def encode_task(function_name: str, kwargs: dict) -> tuple[str, str, str, str]:
+    """Validate task arguments and encode them as (device, room, action, kwargs_json)."""
+    if function_name not in TASK_ARGS:
+        raise ValueError(f"Unknown task function: {function_name}")
+    kwargs = normalize_task_args(function_name, kwargs)
+    if not all(isinstance(value, str) for value in kwargs.values()):
+        raise ValueError(f"Arguments for {function_name} must be strings")
+    if kwargs.get('action') not in TASK_ACTIONS:
+        raise ValueError(f"Action must be one of {TASK_ACTIONS}, got {kwargs.get('action')!r}")
+
+    device, room, action = task_columns(function_name, kwargs)
+    if device is None:
+        raise ValueError(f"No {function_name.removeprefix('control_')} in room {kwargs.get('room')!r}")
+    return device, room, action, json.dumps(kwargs, separators=(",", ":"))
+
+
 class ScheduledTaskDBItem:
     def __init__(self, id_, function_name: str, run_at: datetime, args=None, kwargs=None):
         self.id = id_
@@ -27,109 +110,349 @@ class ScheduledTaskDBItem:
         self.args = args or []
         self.kwargs = kwargs or {}
 
-# --- Database Initialization ---
-async def init_db():
-    logger.info("🛠️ Initializing database...")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS tasks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                run_at TEXT,
-                function_name TEXT,
-                args_blob BLOB,
-                kwargs_blob BLOB
-            )
-        ''')
 
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS device_status (
-                device_name TEXT PRIMARY KEY,
-                status TEXT
-            )
-        ''')
+class TaskStore:
+    """Shared access layer over one long-lived SQLite connection.
 
-        # Initialize all devices with 'off' status if not already in table
-        devices = [
-            "lamp_kitchen", "lamp_bathroom", "lamp_room1", "lamp_room2",
-            "AC_room1", "AC_kitchen", "Cooler", "TV"
-        ]
-        for device in devices:
-            await db.execute('''
+    Opened once at startup and closed on shutdown. WAL mode lets readers
+    proceed while a write is committing, and sqlite3's per-connection
+    statement cache keeps the fixed SQL below compiled between calls.
+    Writes are serialized with a lock so multi-statement updates stay atomic.
+    """
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self._db: aiosqlite.Connection | None = None
+        self._write_lock = asyncio.Lock()
+
+    async def open(self):
+        logger.info(f"🔌 Opening task database at {self.path}")
+        self._db = await aiosqlite.connect(self.path)
+        await self._db.execute("PRAGMA journal_mode=WAL")
+        await self._db.execute("PRAGMA synchronous=NORMAL")
+        await self.init_db()
+        return self
+
+    async def close(self):
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+            logger.info("🔌 Task database closed.")
+
+    # --- Database Initialization ---
+    async def init_db(self):
+        logger.info("🛠️ Initializing database...")
+        async with self._write_lock:
+            await self._migrate()
+
+            await self._db.execute('''
+                CREATE TABLE IF NOT EXISTS device_status (
+                    device_name TEXT PRIMARY KEY,
+                    status TEXT
+                )
+            ''')
+
+            # Initialize all devices with 'off' status if not already in table
+            devices = [
+                "lamp_kitchen", "lamp_bathroom", "lamp_room1", "lamp_room2",
+                "AC_room1", "AC_kitchen", "Cooler", "TV"
+            ]
+            await self._db.executemany('''
                 INSERT OR IGNORE INTO device_status (device_name, status)
                 VALUES (?, ?)
-            ''', (device, 'off'))
-
-        await db.commit()
-    logger.info("✅ Database initialized or already exists.")
-
-# --- Task Management ---
-async def add_task(function_name: str, run_at: datetime, args=None, kwargs=None):
-    args = args or []
-    kwargs = kwargs or {}
-    logger.info(f"➕ Adding task: {function_name} at {run_at} with args={args}, kwargs={kwargs}")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            'INSERT INTO tasks (run_at, function_name, args_blob, kwargs_blob) VALUES (?, ?, ?, ?)',
-            (
-                run_at.isoformat(),
-                function_name,
-                pickle.dumps(args),
-                pickle.dumps(kwargs),
+            ''', [(device, 'off') for device in devices])
+
+            # Tasks left 'running' were interrupted by a crash or restart; run them again
+            cursor = await self._db.execute("UPDATE tasks SET status = 'pending' WHERE status = 'running'")
+            if cursor.rowcount:
+                logger.warning(f"⚠️ Re-queued {cursor.rowcount} interrupted task(s).")
+            await cursor.close()
+
+            await self._db.commit()
+        logger.info("✅ Database initialized or already exists.")
+
+    async def _migrate(self):
+        cursor = await self._db.execute("PRAGMA user_version")
+        (version,) = await cursor.fetchone()
+        await cursor.close()
+
+        for target, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            logger.info(f"🧱 Migrating task database to schema version {target}...")
+            # DDL would otherwise autocommit statement by statement
+            await self._db.execute("BEGIN")
+            await migration(self._db)
+            await self._db.execute(f"PRAGMA user_version = {target}")
+            await self._db.commit()
+
+    # --- Task Management ---
+    async def add_task(self, function_name: str, run_at: datetime, kwargs=None):
+        kwargs = kwargs or {}
+        device, room, action, kwargs_json = encode_task(function_name, kwargs)
+        logger.info(f"➕ Adding task: {function_name} at {run_at} with kwargs={kwargs}")
+        async with self._write_lock:
+            cursor = await self._db.execute(
+                '''
+                INSERT INTO tasks (run_at, status, function_name, device, room, action, kwargs_json)
+                VALUES (?, 'pending', ?, ?, ?, ?, ?)
+                ''',
+                (to_epoch_ms(run_at), function_name, device, room, action, kwargs_json)
             )
-        )
-        await db.commit()
-    logger.info("✅ Task added to the database.")
-
-async def get_due_tasks():
-    now_iso = datetime.now().isoformat()
-    logger.debug(f"⏰ Checking for tasks due at or before {now_iso}")
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            'SELECT id, run_at, function_name, args_blob, kwargs_blob FROM tasks WHERE run_at <= ?',
-            (now_iso,)
+            task_id = cursor.lastrowid
+            await cursor.close()
+            await self._db.commit()
+        logger.info(f"✅ Task {task_id} added to the database.")
+        return task_id
+
+    async def get_due_tasks(self, until: datetime | None = None, limit: int = DUE_TASK_LIMIT, after: tuple[int, int] | None = None):
+        """Pending tasks due at or before `until` (default: now), earliest first.
+
+        `after` is an exclusive (run_at epoch ms, id) cursor for paging through
+        more than `limit` due tasks.
+        """
+        until_ms = to_epoch_ms(until or datetime.now())
+        after_ms, after_id = after or (-1, -1)
+        logger.debug(f"⏰ Checking for tasks due at or before {from_epoch_ms(until_ms)}")
+        cursor = await self._db.execute(
+            '''
+            SELECT id, run_at, function_name, kwargs_json FROM tasks
+            WHERE status = 'pending' AND run_at <= ? AND (run_at, id) > (?, ?)
+            ORDER BY run_at, id
+            LIMIT ?
+            ''',
+            (until_ms, after_ms, after_id, limit)
         )
         rows = await cursor.fetchall()
-        tasks = []
-        for row in rows:
-            id_, run_at, fn_name, args_blob, kwargs_blob = row
-            task = ScheduledTaskDBItem(
-                id_=id_,
-                function_name=fn_name,
-                run_at=datetime.fromisoformat(run_at),
-                args=pickle.loads(args_blob),
-                kwargs=pickle.loads(kwargs_blob),
-            )
-            tasks.append(task)
+        await cursor.close()
+        tasks = [
+            ScheduledTaskDBItem(id_, fn_name, from_epoch_ms(run_at), kwargs=json.loads(kwargs_json))
+            for id_, run_at, fn_name, kwargs_json in rows
+        ]
         if tasks:
             logger.info(f"📋 Retrieved {len(tasks)} due task(s).")
         return tasks
 
-async def delete_task(task_id: int):
-    logger.info(f"🗑️ Deleting task with ID: {task_id}")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
-        await db.commit()
-    logger.info(f"✅ Task {task_id} deleted.")
-
-# --- Device Status Management ---
-async def set_device_status(device_name: str, new_status: str):
-    logger.info(f"🔧 Setting device '{device_name}' to '{new_status}'")
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute(
-            'UPDATE device_status SET status = ? WHERE device_name = ?',
-            (new_status, device_name)
+    @staticmethod
+    def _task_filter(status: str | None, device: str | None, room: str | None) -> tuple[str, list]:
+        clauses, params = [], []
+        for column, value in (("status", status), ("device", device), ("room", room)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    async def list_tasks(self, status: str | None = "pending", device: str | None = None, room: str | None = None, limit: int = 100) -> list[dict]:
+        where, params = self._task_filter(status, device, room)
+        cursor = await self._db.execute(
+            f"SELECT id, run_at, status, function_name, device, room, action, kwargs_json FROM tasks{where} ORDER BY run_at, id LIMIT ?",
+            (*params, limit)
         )
-        await db.commit()
-    logger.info(f"✅ Device '{device_name}' status updated to '{new_status}'")
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return [
+            {
+                "id": id_,
+                "run_at": from_epoch_ms(run_at).isoformat(),
+                "status": task_status,
+                "function": fn_name,
+                "device": task_device,
+                "room": task_room,
+                "action": action,
+                "args": json.loads(kwargs_json),
+            }
+            for id_, run_at, task_status, fn_name, task_device, task_room, action, kwargs_json in rows
+        ]
+
+    async def cancel_tasks(self, device: str | None = None, room: str | None = None) -> list[int]:
+        """Cancel pending tasks matching the filters and return their ids."""
+        where, params = self._task_filter("pending", device, room)
+        async with self._write_lock:
+            cursor = await self._db.execute(f"UPDATE tasks SET status = 'cancelled'{where} RETURNING id", params)
+            task_ids = [row[0] for row in await cursor.fetchall()]
+            await cursor.close()
+            await self._db.commit()
+        logger.info(f"🚫 Cancelled {len(task_ids)} pending task(s) (device={device}, room={room}).")
+        return task_ids
+
+    async def claim_tasks(self, task_ids: list[int]) -> set[int]:
+        """Mark pending tasks running in one transaction. Returns the ids that were still pending."""
+        if not task_ids:
+            return set()
+        placeholders = ", ".join("?" * len(task_ids))
+        async with self._write_lock:
+            cursor = await self._db.execute(
+                f"UPDATE tasks SET status = 'running' WHERE status = 'pending' AND id IN ({placeholders}) RETURNING id",
+                task_ids
+            )
+            claimed = {row[0] for row in await cursor.fetchall()}
+            await cursor.close()
+            await self._db.commit()
+        return claimed
+
+    async def finish_tasks(self, outcomes: list[tuple[int, str]]):
+        """Record the results of a dispatched batch in one transaction."""
+        async with self._write_lock:
+            await self._db.executemany('UPDATE tasks SET status = ? WHERE id = ?', [(status, task_id) for task_id, status in outcomes])
+            await self._db.commit()
+        logger.info(f"✅ Recorded {len(outcomes)} task result(s).")
+
+    async def set_task_status(self, task_id: int, status: str):
+        if status not in TASK_STATUSES:
+            raise ValueError(f"Unknown task status: {status}")
+        async with self._write_lock:
+            await self._db.execute('UPDATE tasks SET status = ? WHERE id = ?', (status, task_id))
+            await self._db.commit()
+        logger.info(f"✅ Task {task_id} marked {status}.")
 
-async def get_device_status(device_name: str) -> str:
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
+    async def purge_tasks(self, before: datetime) -> int:
+        """Delete finished tasks that were due before `before`. Returns how many were deleted."""
+        placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+        async with self._write_lock:
+            cursor = await self._db.execute(
+                f"DELETE FROM tasks WHERE status IN ({placeholders}) AND run_at < ?",
+                (*FINISHED_STATUSES, to_epoch_ms(before))
+            )
+            deleted = cursor.rowcount
+            await cursor.close()
+            await self._db.commit()
+        if deleted:
+            logger.info(f"🧹 Purged {deleted} finished task(s) due before {before}.")
+        return deleted
+
+    async def delete_task(self, task_id: int):
+        logger.info(f"🗑️ Deleting task with ID: {task_id}")
+        async with self._write_lock:
+            await self._db.execute('DELETE FROM tasks WHERE id = ?', (task_id,))
+            await self._db.commit()
+        logger.info(f"✅ Task {task_id} deleted.")
+
+    # --- Device Status Management ---
+    async def set_device_status(self, device_name: str, new_status: str):
+        logger.info(f"🔧 Setting device '{device_name}' to '{new_status}'")
+        async with self._write_lock:
+            await self._db.execute(
+                'UPDATE device_status SET status = ? WHERE device_name = ?',
+                (new_status, device_name)
+            )
+            await self._db.commit()
+        logger.info(f"✅ Device '{device_name}' status updated to '{new_status}'")
+
+    async def get_device_status(self, device_name: str) -> str:
+        cursor = await self._db.execute(
             'SELECT status FROM device_status WHERE device_name = ?',
             (device_name,)
         )
         row = await cursor.fetchone()
+        await cursor.close()
         if row:
             return row[0]
         logger.warning(f"⚠️ Device '{device_name}' not found.")
-        return "unknown"
\ No newline at end of file
+        return "unknown"
+
+    async def set_device_statuses(self, statuses: dict[str, str]):
+        """Write several device statuses in one transaction."""
+        async with self._write_lock:
+            await self._db.executemany(
+                'UPDATE device_status SET status = ? WHERE device_name = ?',
+                [(status, device_name) for device_name, status in statuses.items()]
+            )
+            await self._db.commit()
+        logger.info(f"✅ Wrote {len(statuses)} device status change(s).")
+
+    async def get_all_device_statuses(self) -> dict:
+        cursor = await self._db.execute('SELECT device_name, status FROM device_status')
+        rows = await cursor.fetchall()
+        await cursor.close()
+        return {device_name: status for device_name, status in rows}
+
+
+# --- Schema Migrations ---
+# Each entry upgrades the schema by one version; PRAGMA user_version records how far a database got.
+async def _create_tasks_v1(db: aiosqlite.Connection):
+    """Epoch-millisecond run_at, a status column, and an index for the due-task query.
+
+    Databases from before versioning have run_at as ISO text and delete tasks
+    once they ran, so every existing row is carried over as pending.
+    """
+    cursor = await db.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'tasks'")
+    legacy = await cursor.fetchone() is not None
+    await cursor.close()
+    if legacy:
+        await db.execute("ALTER TABLE tasks RENAME TO tasks_legacy")
+
+    await db.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'done', 'failed')),
+            function_name TEXT,
+            args_blob BLOB,
+            kwargs_blob BLOB
+        )
+    ''')
+    await db.execute("CREATE INDEX idx_tasks_status_run_at ON tasks (status, run_at)")
+
+    if legacy:
+        cursor = await db.execute("SELECT id, run_at, function_name, args_blob, kwargs_blob FROM tasks_legacy")
+        rows = await cursor.fetchall()
+        await cursor.close()
+        await db.executemany(
+            "INSERT INTO tasks (id, run_at, status, function_name, args_blob, kwargs_blob) VALUES (?, ?, 'pending', ?, ?, ?)",
+            [(id_, to_epoch_ms(datetime.fromisoformat(run_at)), fn_name, args_blob, kwargs_blob)
+             for id_, run_at, fn_name, args_blob, kwargs_blob in rows]
+        )
+        await db.execute("DROP TABLE tasks_legacy")
+        logger.info(f"🧱 Converted {len(rows)} task(s) to epoch run_at.")
+
+
+async def _typed_task_args_v2(db: aiosqlite.Connection):
+    """Replace the pickled args/kwargs blobs with typed device/room/action columns and JSON kwargs.
+
+    Rows whose arguments no longer validate are carried over as failed
+    rather than dropped, so they stay visible in the task list.
+    """
+    await db.execute("ALTER TABLE tasks RENAME TO tasks_v1")
+    await db.execute('''
+        CREATE TABLE tasks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_at INTEGER NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending'
+                CHECK (status IN ('pending', 'running', 'done', 'failed', 'cancelled')),
+            function_name TEXT NOT NULL,
+            device TEXT,
+            room TEXT,
+            action TEXT,
+            kwargs_json TEXT NOT NULL DEFAULT '{}'
+        )
+    ''')
+
+    cursor = await db.execute("SELECT id, run_at, status, function_name, args_blob, kwargs_blob FROM tasks_v1")
+    rows = await cursor.fetchall()
+    await cursor.close()
+    converted, rejected = [], 0
+    for id_, run_at, status, fn_name, args_blob, kwargs_blob in rows:
+        kwargs = pickle.loads(kwargs_blob) or {}
+        try:
+            if pickle.loads(args_blob):
+                raise ValueError("positional arguments are not supported")
+            device, room, action, kwargs_json = encode_task(fn_name, kwargs)
+        except Exception as e:
+            logger.warning(f"⚠️ Task {id_} ({fn_name}) has invalid arguments, marking failed: {e}")
+            device, room, action = task_columns(fn_name, kwargs) if isinstance(kwargs, dict) else (None, None, None)
+            kwargs_json = json.dumps(kwargs, separators=(",", ":"), default=str)
+            status = "failed" if status == "pending" else status
+            rejected += 1
+        converted.append((id_, run_at, status, fn_name, device, room, action, kwargs_json))
+
+    await db.executemany(
+        "INSERT INTO tasks (id, run_at, status, function_name, device, room, action, kwargs_json) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        converted
+    )
+    await db.execute("DROP TABLE tasks_v1")
+    await db.execute("CREATE INDEX idx_tasks_status_run_at ON tasks (status, run_at)")
+    await db.execute("CREATE INDEX idx_tasks_device ON tasks (device, status)")
+    await db.execute("CREATE INDEX idx_tasks_room ON tasks (room, status)")
+    logger.info(f"🧱 Converted {len(converted)} pickled task(s) to typed columns ({rejected} rejected).")
+
+
+MIGRATIONS = [_create_tasks_v1, _typed_task_args_v2]
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Backend modules import each other by bare name and log to log/<name>.log
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import agent
+import conditional_agent
+
+WAR_NEWS = {
+    "action": "on",
+    "weather_description": "",
+    "news_description": "if there is important war news",
+    "time_description": "now",
+}
+
+
+@pytest.fixture
+def no_headlines(monkeypatch):
+    """NewsAPI is down: the context cache falls back to no headlines."""
+    async def get_headlines():
+        return []
+
+    async def get_similar(query, headlines, k=5):
+        return []
+
+    monkeypatch.setattr(agent.context_cache, "get_headlines", get_headlines)
+    monkeypatch.setattr(conditional_agent, "get_similar", get_similar)
+
+
+@pytest.fixture
+def evaluator_calls(monkeypatch):
+    calls = []
+
+    async def evaluate_conditions(conditions, relevant_news, weather):
+        calls.append(conditions)
+        return {condition: (True, True) for condition in conditions}
+
+    monkeypatch.setattr(conditional_agent, "evaluate_conditions", evaluate_conditions)
+    return calls
+
+
+def test_news_condition_without_headlines_is_not_met(no_headlines, evaluator_calls):
+    results = asyncio.run(conditional_agent.handle_conditions([("", "important war news")], [], ""))
+    assert results == {("", "important war news"): (True, False)}
+    assert evaluator_calls == []
+
+
+def test_news_conditioned_action_is_skipped_without_headlines(no_headlines, evaluator_calls):
+    assert asyncio.run(agent.run_tool_calls([("control_tv", dict(WAR_NEWS))])) == []
+    assert evaluator_calls == []
+
+
+def test_weather_part_is_still_unmet_without_headlines(no_headlines, evaluator_calls):
+    results = asyncio.run(conditional_agent.handle_conditions([("if it rains", "war news")], [], "12:00: 14°C, light rain"))
+    assert results == {("if it rains", "war news"): (False, False)}
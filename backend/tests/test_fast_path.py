@@ -0,0 +1,62 @@
+import pytest
+
+from fast_path import parse_command
+
+
+def call(name, **args):
+    return {"name": name, "args": args}
+
+
+def lamp(room, action, time="now"):
+    return call("control_lamp", room=room, action=action, time_description=time)
+
+
+@pytest.mark.parametrize("prompt, expected", [
+    ("turn on the kitchen lamp", [lamp("kitchen", "on")]),
+    ("Switch off the lights in room 1", [lamp("room1", "off")]),
+    ("turn on the kitchen and bathroom lamps", [lamp("kitchen", "on"), lamp("bathroom", "on")]),
+    ("turn off all lamps", [lamp(room, "off") for room in ("kitchen", "bathroom", "room1", "room2")]),
+    ("turn on the kitchen lamp and turn off the AC in room 1",
+     [lamp("kitchen", "on"), call("control_ac", room="room1", action="off", time_description="now")]),
+    ("turn on the TV in the living room",
+     [call("control_tv", action="on", weather_description="", news_description="", time_description="now")]),
+])
+def test_accepts_unambiguous_commands(prompt, expected):
+    assert parse_command(prompt) == expected
+
+
+@pytest.mark.parametrize("prompt, time", [
+    ("turn on the kitchen lamp in two hours", "in 2 hours"),
+    ("turn on the kitchen lamp in 1 minute", "in 1 minute"),
+    ("turn on the kitchen lamp at 7 pm", "at 7 pm"),
+    ("turn on the kitchen lamp at 12 am", "at 12 am"),
+    ("turn on the kitchen lamp tomorrow at 7:30 am", "tomorrow at 7:30 am"),
+    ("turn on the kitchen lamp at 23:15", "at 23:15"),
+    ("turn on the kitchen lamp at 0:00", "at 0:00"),
+])
+def test_accepts_valid_times(prompt, time):
+    assert parse_command(prompt) == [lamp("kitchen", "on", time)]
+
+
+@pytest.mark.parametrize("prompt", [
+    # Needs the LLM: conditions, questions, unknown devices or rooms
+    "turn on the kitchen lamp if it rains",
+    "what's the weather like",
+    "turn on the lamp",
+    "turn on the AC in the bathroom",
+    "turn on the heater in the kitchen",
+    # No action, or conflicting actions in one clause
+    "the kitchen lamp",
+    "turn on off the kitchen lamp",
+    "turn the kitchen lamp on and off",
+    # Ambiguous or impossible times
+    "turn on the kitchen lamp at 9",
+    "turn on the kitchen lamp at 13 pm",
+    "turn on the kitchen lamp at 0 am",
+    "turn on the kitchen lamp at 25:00",
+    "turn on the kitchen lamp at 7:75 pm",
+    "turn on the kitchen lamp in 0 hours",
+    "turn on the kitchen lamp in 2 hours at 7 pm",
+])
+def test_falls_back_to_llm(prompt):
+    assert parse_command(prompt) is None
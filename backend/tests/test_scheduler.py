@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import scheduler
+from device_state import DeviceStates
+from task_db import TaskStore
+
+
+class Recorder:
+    """Stands in for a device tool; records (room, action) in the order tasks ran."""
+
+    def __init__(self, delays: dict[str, float] | None = None):
+        self.calls = []
+        self.delays = delays or {}
+
+    async def __call__(self, **kwargs):
+        # A slow "on" would let a later "off" overtake it if per-device order weren't kept
+        await asyncio.sleep(self.delays.get(kwargs["action"], 0))
+        self.calls.append((kwargs.get("room", ""), kwargs["action"]))
+
+
+@pytest.fixture
+def lamp(monkeypatch):
+    recorder = Recorder({"on": 0.05})
+    monkeypatch.setitem(scheduler.FUNCTION_MAP, "control_lamp", recorder)
+    return recorder
+
+
+def run_with_scheduler(tmp_path, test):
+    async def main():
+        store = await TaskStore(str(tmp_path / "tasks.db")).open()
+        devices = await DeviceStates(store).load()
+        sched = scheduler.Scheduler(store, devices, horizon=60)
+        loop = asyncio.create_task(sched.run())
+        try:
+            await test(sched, store, devices)
+        finally:
+            loop.cancel()
+            await asyncio.gather(loop, return_exceptions=True)
+            await store.close()
+
+    asyncio.run(main())
+
+
+async def wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_immediate_task_dispatches(tmp_path, lamp):
+    async def test(sched, store, devices):
+        task_id = await sched.schedule("control_lamp", datetime.now(), {"room": "kitchen", "action": "on"})
+        await wait_for(lambda: lamp.calls)
+        assert lamp.calls == [("kitchen", "on")]
+        await wait_for(lambda: sched.dispatched == 1)
+        assert [task["id"] for task in await store.list_tasks(status="done")] == [task_id]
+        assert devices.all()["lamp_kitchen"] == "on"
+
+    run_with_scheduler(tmp_path, test)
+
+
+def test_device_keeps_on_off_order(tmp_path, lamp):
+    async def test(sched, store, devices):
+        run_at = datetime.now()
+        for action in ("on", "off", "on", "off"):
+            await sched.schedule("control_lamp", run_at, {"room": "kitchen", "action": action})
+        # A later batch for the same device waits for the one still running
+        await sched.schedule("control_lamp", run_at + timedelta(milliseconds=20), {"room": "kitchen", "action": "on"})
+        await wait_for(lambda: len(lamp.calls) == 5)
+        assert [action for _, action in lamp.calls] == ["on", "off", "on", "off", "on"]
+        await wait_for(lambda: sched.dispatched == 5)
+        assert devices.all()["lamp_kitchen"] == "on"
+
+    run_with_scheduler(tmp_path, test)
+
+
+def test_cancelled_task_never_dispatches(tmp_path, lamp):
+    async def test(sched, store, devices):
+        task_id = await sched.schedule("control_lamp", datetime.now() + timedelta(milliseconds=200), {"room": "kitchen", "action": "on"})
+        assert await sched.cancel(device="lamp_kitchen") == [task_id]
+        await asyncio.sleep(0.4)
+        assert lamp.calls == []
+        assert sched.dispatched == 0
+        assert [task["id"] for task in await store.list_tasks(status="cancelled")] == [task_id]
+
+    run_with_scheduler(tmp_path, test)
+
+
+def test_invalid_room_is_rejected(tmp_path, lamp):
+    async def test(sched, store, devices):
+        with pytest.raises(ValueError):
+            await sched.schedule("control_lamp", datetime.now(), {"room": "garage", "action": "on"})
+        assert await store.list_tasks(status=None) == []
+
+    run_with_scheduler(tmp_path, test)
@@ -0,0 +1,164 @@
+import io
+import os
+import re
+import time
+import base64
+import asyncio
+import logging
+import threading
+from collections import deque
+
+import requests
+from gtts import gTTS, gTTSError
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/tts.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Sentences synthesized at once for one reply
+TTS_CONCURRENCY = int(os.getenv("TTS_CONCURRENCY", "4"))
+# Shorter sentences are joined to the next one; each synthesis is a round trip
+TTS_MIN_SENTENCE_CHARS = int(os.getenv("TTS_MIN_SENTENCE_CHARS", "20"))
+TTS_PROXY = os.getenv("TTS_PROXY", "socks5h://127.0.0.1:2080")
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_AUDIO_LINE = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+# requests.Session isn't thread-safe, so each synthesis thread keeps its
+# own; the thread pool is reused, so sentences still reuse the proxy's
+# keep-alive connections
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+        session.proxies = {"http": TTS_PROXY, "https": TTS_PROXY}
+    return session
+
+
+class ProxiedTTS(gTTS):
+    """gTTS that sends its requests through TTS_PROXY on a per-thread session.
+
+    gTTS opens a new session for every request and takes its proxy from
+    the environment, with no way to pass either in, and patching requests
+    would affect every thread in the process. This sends the requests gTTS
+    prepares itself and reads the audio out of the reply the way gTTS does.
+    """
+
+    def stream(self):
+        session = _session()
+        for request in self._prepare_requests():
+            try:
+                response = session.send(request, proxies=session.proxies, timeout=self.timeout)
+                response.raise_for_status()
+            except requests.exceptions.HTTPError:
+                raise gTTSError(tts=self, response=response)
+            except requests.exceptions.RequestException:
+                raise gTTSError(tts=self)
+
+            for line in response.iter_lines(chunk_size=1024):
+                line = line.decode("utf-8")
+                if "jQ1olc" in line:
+                    audio = _AUDIO_LINE.search(line)
+                    if not audio:
+                        raise gTTSError(tts=self, response=response)
+                    yield base64.b64decode(audio.group(1).encode("ascii"))
+
+
+def split_sentences(text: str, min_chars: int = TTS_MIN_SENTENCE_CHARS) -> list[str]:
+    sentences = []
+    for sentence in _SENTENCE_END.split(text.strip()):
+        if sentences and len(sentences[-1]) < min_chars:
+            sentences[-1] += " " + sentence
+        elif sentence:
+            sentences.append(sentence)
+    return sentences
+
+
+def synthesize(text: str, lang: str = "en") -> bytes:
+    """MP3 for one piece of text (blocking); empty for blank text."""
+    if not text.strip():
+        return b""
+    audio = io.BytesIO()
+    ProxiedTTS(text=text, lang=lang).write_to_fp(audio)
+    return audio.getvalue()
+
+
+class TTSStats:
+    def __init__(self):
+        self.replies = 0
+        self.sentences = 0
+        self.errors = 0
+        self._first_byte_ms: deque[float] = deque(maxlen=1000)
+        self._total_ms: deque[float] = deque(maxlen=1000)
+
+    def record(self, sentences: int, first_byte_ms: float, total_ms: float):
+        self.replies += 1
+        self.sentences += sentences
+        self._first_byte_ms.append(first_byte_ms)
+        self._total_ms.append(total_ms)
+
+    def stats(self) -> dict:
+        def avg(values):
+            return round(sum(values) / len(values), 1) if values else None
+
+        return {
+            "replies": self.replies,
+            "sentences": self.sentences,
+            "errors": self.errors,
+            "avg_first_byte_ms": avg(self._first_byte_ms),
+            "avg_total_ms": avg(self._total_ms),
+        }
+
+
+tts_stats = TTSStats()
+
+
+async def stream_speech(text: str, lang: str = "en", concurrency: int = TTS_CONCURRENCY):
+    """MP3 of `text`, one sentence at a time, in order.
+
+    Sentences are synthesized concurrently in threads; each is yielded as
+    soon as it and every sentence before it are done, so playback can
+    start after the first sentence rather than the whole reply.
+    """
+    sentences = split_sentences(text)
+    if not sentences:
+        return
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(sentence: str) -> bytes:
+        async with semaphore:
+            return await asyncio.to_thread(synthesize, sentence, lang)
+
+    start = time.perf_counter()
+    first_byte_ms = None
+    tasks = [asyncio.create_task(one(sentence)) for sentence in sentences]
+    try:
+        for task in tasks:
+            audio = await task
+            if first_byte_ms is None:
+                first_byte_ms = (time.perf_counter() - start) * 1000
+            yield audio
+    except Exception as e:
+        tts_stats.errors += 1
+        logger.exception(f"❌ Speech synthesis failed: {e}")
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    total_ms = (time.perf_counter() - start) * 1000
+    tts_stats.record(len(sentences), first_byte_ms, total_ms)
+    logger.info(f"🔊 {len(sentences)} sentence(s): first audio after {first_byte_ms:.0f} ms, all after {total_ms:.0f} ms")
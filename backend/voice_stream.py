@@ -0,0 +1,311 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+
+import numpy as np
+import torch
+from fastapi import WebSocket, WebSocketDisconnect
+
+from assistant import VoiceAssistant, VADPoolExhausted, SAMPLE_RATE, audio_normalizer
+from asr_worker import ASRQueueFull
+from tts import stream_speech
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Setup logger
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    handlers=[
+        logging.FileHandler("log/voice_stream.log"),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Silence that ends a command
+STREAM_VAD_SILENCE_MS = int(os.getenv("STREAM_VAD_SILENCE_MS", "500"))
+# New speech between two partial transcripts
+STREAM_PARTIAL_INTERVAL_MS = float(os.getenv("STREAM_PARTIAL_INTERVAL_MS", "1000"))
+# Speech longer than this is cut and transcribed as one command
+STREAM_MAX_SPEECH_SECONDS = float(os.getenv("STREAM_MAX_SPEECH_SECONDS", "30"))
+
+# Silero VAD scores 512-sample windows at 16 kHz
+VAD_WINDOW = 512
+# Audio kept before a speech start, enough for the VAD's start padding
+PRE_SPEECH_SAMPLES = SAMPLE_RATE
+
+
+class StreamResampler:
+    """Resamples a PCM stream chunk by chunk as if it were one signal.
+
+    Resampling each chunk on its own zero-pads both of its edges, which
+    clicks at every chunk boundary. Instead, each call filters whole
+    resampling periods of new input together with `context` samples kept
+    from before them and held back after them, and emits only the output
+    for those new samples.
+    """
+
+    def __init__(self, orig_freq: int, new_freq: int = SAMPLE_RATE, context: int = 64):
+        gcd = math.gcd(orig_freq, new_freq)
+        self.in_step, self.out_step = orig_freq // gcd, new_freq // gcd
+        # Wider than the resampling kernel's reach, in whole periods so output samples stay aligned
+        self.context = self.in_step * math.ceil(context / self.in_step)
+        self._resample = audio_normalizer.resampler(orig_freq)
+        self._history = np.zeros(self.context, dtype=np.float32)
+        self._pending = np.zeros(0, dtype=np.float32)
+
+    def _emit(self, count: int, lookahead: np.ndarray) -> np.ndarray:
+        window = np.concatenate([self._history, self._pending[:count], lookahead])
+        with torch.inference_mode():
+            out = self._resample(torch.from_numpy(window).unsqueeze(0)).squeeze(0).numpy()
+        self._history = window[count:count + self.context]
+        self._pending = self._pending[count:]
+        start = self.context // self.in_step * self.out_step
+        return out[start:start + count // self.in_step * self.out_step]
+
+    def __call__(self, samples: np.ndarray) -> np.ndarray:
+        self._pending = np.concatenate([self._pending, samples])
+        count = (len(self._pending) - self.context) // self.in_step * self.in_step
+        if count <= 0:
+            return np.zeros(0, dtype=np.float32)
+        return self._emit(count, self._pending[count:count + self.context])
+
+    def flush(self) -> np.ndarray:
+        """The rest of the input, as if the stream ended in silence."""
+        count = math.ceil(len(self._pending) / self.in_step) * self.in_step
+        self._pending = np.concatenate([self._pending, np.zeros(count - len(self._pending), dtype=np.float32)])
+        return self._emit(count, np.zeros(self.context, dtype=np.float32)) if count else np.zeros(0, dtype=np.float32)
+
+
+class SpeechSegmenter:
+    """Cuts a stream of PCM chunks into speech segments with Silero's VADIterator.
+
+    Audio is scored window by window as it arrives. Outside speech only the
+    last second is retained; during speech everything since its start is.
+    """
+
+    def __init__(self, vad_iterator, sample_rate: int = SAMPLE_RATE):
+        self.vad = vad_iterator
+        self.sample_rate = sample_rate
+        self._audio = np.zeros(0, dtype=np.float32)
+        self._offset = 0  # stream position of self._audio[0]
+        self._scored = 0  # stream position up to which the VAD has seen audio
+        self._vad_origin = 0  # stream position the VAD counts its samples from
+        self.speech_start: int | None = None
+        self._resampler = StreamResampler(sample_rate) if sample_rate != SAMPLE_RATE else None
+
+    @property
+    def position(self) -> int:
+        return self._offset + len(self._audio)
+
+    def _segment(self, start: int, end: int) -> np.ndarray:
+        return self._audio[max(0, start - self._offset):max(0, end - self._offset)].copy()
+
+    def speech_so_far(self) -> np.ndarray | None:
+        return None if self.speech_start is None else self._segment(self.speech_start, self.position)
+
+    def feed(self, pcm: bytes) -> list[tuple[str, np.ndarray | None]]:
+        """Add little-endian int16 mono PCM; returns ("start", None) and ("end", speech) events."""
+        samples = np.frombuffer(pcm, dtype="<i2").astype(np.float32) / 32768
+        if self._resampler is not None:
+            samples = self._resampler(samples)
+        return self._add(samples)
+
+    def _add(self, samples: np.ndarray) -> list[tuple[str, np.ndarray | None]]:
+        self._audio = np.concatenate([self._audio, samples])
+
+        events = []
+        while self.position - self._scored >= VAD_WINDOW:
+            i = self._scored - self._offset
+            result = self.vad(torch.from_numpy(self._audio[i:i + VAD_WINDOW]))
+            self._scored += VAD_WINDOW
+            if result and "start" in result and self.speech_start is None:
+                self.speech_start = self._vad_origin + result["start"]
+                events.append(("start", None))
+            elif result and "end" in result and self.speech_start is not None:
+                events.append(("end", self._segment(self.speech_start, self._vad_origin + result["end"])))
+                self.speech_start = None
+            elif self.speech_start is not None and self._scored - self.speech_start >= STREAM_MAX_SPEECH_SECONDS * SAMPLE_RATE:
+                events.append(("end", self._segment(self.speech_start, self._scored)))
+                self.speech_start = self._scored
+
+        keep_from = self.speech_start if self.speech_start is not None else self._scored - PRE_SPEECH_SAMPLES
+        if keep_from > self._offset:
+            self._audio = self._audio[keep_from - self._offset:]
+            self._offset = keep_from
+        return events
+
+    def flush(self) -> np.ndarray | None:
+        """End of input: whatever speech is in progress, as a final segment."""
+        ended = []
+        if self._resampler is not None:
+            # Audio the resampler still holds back belongs to this utterance
+            ended = [speech for kind, speech in self._add(self._resampler.flush()) if kind == "end"]
+        speech = self.speech_so_far()
+        if speech is None and ended:
+            speech = ended[-1]
+        self.speech_start = None
+        self.vad.reset_states()
+        self._vad_origin = self._scored
+        return speech
+
+
+class VoiceStreamStats:
+    def __init__(self):
+        self.sessions = 0
+        self.active = 0
+        self.commands = 0
+        self.partials = 0
+        self.errors = 0
+        self._transcript_ms: deque[float] = deque(maxlen=1000)
+        self._response_ms: deque[float] = deque(maxlen=1000)
+
+    def record(self, transcript_ms: float, response_ms: float):
+        self.commands += 1
+        self._transcript_ms.append(transcript_ms)
+        self._response_ms.append(response_ms)
+
+    def stats(self) -> dict:
+        def avg(values):
+            return round(sum(values) / len(values), 1) if values else None
+
+        return {
+            "sessions": self.sessions,
+            "active": self.active,
+            "commands": self.commands,
+            "partials": self.partials,
+            "errors": self.errors,
+            # Measured from the VAD detecting end of speech
+            "avg_transcript_ms": avg(self._transcript_ms),
+            "avg_response_ms": avg(self._response_ms),
+        }
+
+
+stream_stats = VoiceStreamStats()
+
+
+async def run_voice_session(websocket: WebSocket, assistant: VoiceAssistant, handle_command, sample_rate: int = SAMPLE_RATE, partials: bool = False, response_type: str = "text"):
+    """Serve one /ws/voice connection.
+
+    The client sends binary frames of 16-bit mono PCM at `sample_rate` and
+    may send the text frame "end" to finish the current utterance. The
+    server answers with JSON events: speech_start, partial (optional),
+    speech_end, transcript and response, the last two carrying the time in
+    ms since end of speech. With response_type=voice the response is also
+    sent as mp3 binary frames, one per sentence as soon as it is
+    synthesized. Commands are handled in the background so audio keeps
+    being segmented meanwhile.
+    """
+    send_lock = asyncio.Lock()
+    tasks: set[asyncio.Task] = set()
+    partial_task: asyncio.Task | None = None
+    partial_from = 0
+
+    async def send(message):
+        async with send_lock:
+            if isinstance(message, bytes):
+                await websocket.send_bytes(message)
+            else:
+                await websocket.send_json(message)
+
+    async def partial(speech: np.ndarray):
+        try:
+            text = await assistant.asr.transcribe(speech)
+        except ASRQueueFull:
+            return
+        stream_stats.partials += 1
+        await send({"type": "partial", "text": text})
+
+    async def command(speech: np.ndarray, ended_at: float):
+        try:
+            text = await assistant.asr.transcribe(speech)
+        except ASRQueueFull as e:
+            await send({"type": "error", "detail": f"Too many voice commands in progress: {e}"})
+            return
+        except Exception as e:
+            stream_stats.errors += 1
+            logger.exception(f"❌ Transcription failed: {e}")
+            await send({"type": "error", "detail": "Transcription failed."})
+            return
+        transcript_ms = (time.perf_counter() - ended_at) * 1000
+        await send({"type": "transcript", "text": text, "ms": round(transcript_ms, 1)})
+        if not text:
+            return
+
+        try:
+            response = await handle_command(text)
+        except Exception as e:
+            stream_stats.errors += 1
+            logger.exception(f"❌ Command '{text}' failed: {e}")
+            await send({"type": "error", "detail": "Could not handle the command."})
+            return
+        response_ms = (time.perf_counter() - ended_at) * 1000
+        stream_stats.record(transcript_ms, response_ms)
+        logger.info(f"🗣️ '{text}' transcribed {transcript_ms:.0f} ms and answered {response_ms:.0f} ms after end of speech")
+        await send({"type": "response", "response": response, "ms": round(response_ms, 1)})
+        if response_type == "voice":
+            try:
+                async for audio in stream_speech(response):
+                    await send(audio)
+            except WebSocketDisconnect:
+                raise
+            except Exception:
+                stream_stats.errors += 1
+                # stream_speech has logged it; the text response already went out
+                await send({"type": "error", "detail": "Could not synthesize the spoken response."})
+
+    def spawn(coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        return task
+
+    stream_stats.sessions += 1
+    stream_stats.active += 1
+    try:
+        with assistant.streaming_vad(STREAM_VAD_SILENCE_MS) as vad:
+            segmenter = SpeechSegmenter(vad, sample_rate)
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes"):
+                    events = await asyncio.to_thread(segmenter.feed, message["bytes"])
+                elif message.get("text") == "end":
+                    speech = await asyncio.to_thread(segmenter.flush)
+                    events = [("end", speech)] if speech is not None and len(speech) else []
+                else:
+                    continue
+
+                for kind, speech in events:
+                    if kind == "start":
+                        partial_from = segmenter.speech_start
+                        await send({"type": "speech_start"})
+                    else:
+                        if partial_task is not None:
+                            partial_task.cancel()
+                        await send({"type": "speech_end", "seconds": round(len(speech) / SAMPLE_RATE, 2)})
+                        spawn(command(speech, time.perf_counter()))
+
+                if (partials and segmenter.speech_start is not None
+                        and segmenter.position - partial_from >= STREAM_PARTIAL_INTERVAL_MS / 1000 * SAMPLE_RATE
+                        and (partial_task is None or partial_task.done())):
+                    partial_from = segmenter.position
+                    partial_task = spawn(partial(segmenter.speech_so_far()))
+            # Let commands already spoken finish before the socket goes away
+            await asyncio.gather(*tasks, return_exceptions=True)
+    except VADPoolExhausted as e:
+        logger.warning(f"⚠️ Refusing voice stream: {e}")
+        # 1013: try again later
+        await websocket.close(code=1013, reason=str(e))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        stream_stats.active -= 1
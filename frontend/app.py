@@ -5,12 +5,93 @@ import struct
 import requests
 from audio_recorder_streamlit import audio_recorder
 import os
+import json
+import threading
+import time
 
 from dotenv import load_dotenv
 load_dotenv()
 
 API_BASE = "http://localhost:8000"
 
+# -----------------------
+# Device status subscription
+# -----------------------
+class DeviceStatusFeed:
+    """Follows /device-statuses/stream in a background thread.
+
+    One subscription per Streamlit server, shared by every browser session;
+    reruns read the latest statuses from memory instead of calling the API.
+    Reconnects resume from the last event id, so no change is missed.
+    """
+
+    def __init__(self):
+        self.statuses = {}
+        self.connected = False
+        self.last_event_id = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.statuses)
+
+    def _apply(self, event, data):
+        payload = json.loads(data)
+        with self._lock:
+            if event == "snapshot":
+                self.statuses = payload
+            else:
+                self.statuses.update(payload)
+
+    def _run(self):
+        while True:
+            try:
+                headers = {"Last-Event-ID": self.last_event_id} if self.last_event_id else {}
+                with requests.get(f"{API_BASE}/device-statuses/stream", headers=headers, stream=True, timeout=(5, 60)) as res:
+                    res.raise_for_status()
+                    self.connected = True
+                    event, data = "message", ""
+                    for line in res.iter_lines(decode_unicode=True):
+                        if line.startswith("id:"):
+                            self.last_event_id = line[3:].strip()
+                        elif line.startswith("event:"):
+                            event = line[6:].strip()
+                        elif line.startswith("data:"):
+                            data = line[5:].strip()
+                        elif not line and data:
+                            self._apply(event, data)
+                            event, data = "message", ""
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(2)
+
+
+@st.cache_resource
+def device_status_feed():
+    return DeviceStatusFeed()
+
+# -----------------------
+# Streamed text commands
+# -----------------------
+def stream_command(command_text):
+    """Events of /send-command/stream as they arrive: actions, reply tokens, done."""
+    with requests.post(f"{API_BASE}/send-command/stream", json={"command": command_text}, stream=True, timeout=(5, 120)) as res:
+        res.raise_for_status()
+        for line in res.iter_lines():
+            if line:
+                yield json.loads(line)
+
+
+def format_actions(actions):
+    lines = []
+    for action in actions:
+        args = action.get("args", {})
+        target = " ".join(str(args[key]) for key in ("room", "action", "filter", "description") if args.get(key))
+        lines.append(f"- `{action['function']}` {target} · {action.get('scheduled_for', '')}")
+    return "\n".join(lines) or "_No actions._"
+
 # -----------------------
 # Initialize session state
 # -----------------------
@@ -63,16 +144,17 @@ else:
     # --- Show some status and button here ---
     st.subheader("Device Status Overview")
 
-    if st.button("Refresh Status"):
-        with st.spinner("Fetching statuses..."):
-            res = requests.get(f"{API_BASE}/device-statuses/")
-            if res.status_code == 200:
-                statuses = res.json()
-                st.success("Device statuses:")
-                for device, status in statuses.items():
-                    st.markdown(f"- **{device}**: `{status}`")
-            else:
-                st.error("Failed to get device statuses.")
+    @st.fragment(run_every=1)
+    def device_status_overview():
+        feed = device_status_feed()
+        statuses = feed.snapshot()
+        if statuses:
+            for device, status in statuses.items():
+                st.markdown(f"- **{device}**: `{status}`")
+        if not feed.connected:
+            st.warning("Not connected to the device status stream, retrying...")
+
+    device_status_overview()
 
     # -----------------------
     # Tabs become available
@@ -86,23 +168,37 @@ else:
         response_type = st.radio("Response type", ["text", "voice"], horizontal=True)
 
         if st.button("Send Command"):
-            if command_text.strip():
+            if command_text.strip() and response_type == "text":
+                # Actions show up as soon as they are scheduled, the reply as it is written
+                actions_box = st.empty()
+                actions_box.info("Processing...")
+
+                def reply_tokens():
+                    try:
+                        for event in stream_command(command_text):
+                            if event["type"] == "actions":
+                                actions_box.markdown(format_actions(event["actions"]))
+                            elif event["type"] == "token":
+                                yield event["text"]
+                            elif event["type"] == "error":
+                                st.error(event["detail"])
+                    except requests.RequestException as e:
+                        st.error(f"Failed to get a response: {e}")
+
+                st.success("Response:")
+                st.write_stream(reply_tokens())
+            elif command_text.strip():
                 with st.spinner("Processing..."):
                     res = requests.post(f"{API_BASE}/send-command/", json={
                         "command": command_text,
                         "response_type": response_type
                     })
 
-                    if response_type == "voice":
-                        if res.status_code == 200:
-                            st.success("Audio response received:")
-                            st.audio(res.content, format="audio/mpeg")
-                        else:
-                            st.error("Failed to get voice response.")
+                    if res.status_code == 200:
+                        st.success("Audio response received:")
+                        st.audio(res.content, format="audio/mpeg")
                     else:
-                        result = res.json()
-                        st.success("Response:")
-                        st.write(result.get("response", "No response"))
+                        st.error("Failed to get voice response.")
 
     # --- Audio Upload Tab ---
     with tab2: